@@ -0,0 +1,254 @@
+#
+# Tests of trackerData that run without maya:
+#
+#   python -m unittest test_trackerData
+
+import multiprocessing
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+import trackerData
+from trackerData import FORMAT_NUKE, FORMAT_BOUJOU, FORMAT_SYNTHEYES, FORMAT_3DE, FORMAT_PFTRACK
+from trackerData import LOADERS, CACHE_EXTENSION, AmbiguousFormatError, loadTrackingFile, poolContext, sniffFormat, trimCache
+
+# a tiny file per format and what the loaders before the streaming
+# parser made of it on a 2000 x 1000 plate, with a frame offset of 10
+# and offsets of 0.25, 0.5 (only syntheyes and 3de apply the offsets,
+# nuke ignores the frame offset)
+LOADER_FIXTURES = {
+    FORMAT_PFTRACK: (
+        '# pftrack export\n'
+        '"A"\n1\n2\n1 500 250 0.9\n2 1500 750 0.8\n\n'
+        '"B"\n1\n1\n3 1000 500\n',
+        [ [ 'A', [ (11, -0.5, 0.5), (12, 0.5, -0.5) ] ],
+          [ 'B', [ (13, 0.0, 0.0) ] ] ] ),
+    FORMAT_NUKE: (
+        '500 250\n\n# comment\n1500 750\n',
+        [ [ 'NukeTracker#', [ (1, -0.5, 0.5), (2, 0.5, -0.5) ] ] ] ),
+    FORMAT_SYNTHEYES: (
+        'T1 1 0.5 -0.25 0.9\nT1 2 0.75 0.0\n\nT2 5 -1.0 1.0\n',
+        [ [ 'T1', [ (11, 0.25, -0.75), (12, 0.5, -0.5) ] ],
+          [ 'T2', [ (15, -1.25, 0.5) ] ] ] ),
+    FORMAT_3DE: (
+        '3\n1tr\n0\n2\n1 500 250\n2 1500 750\nB\n0\n1\n4 1000 500\nC\n0\n0\n',
+        [ [ '_1tr', [ (11, -0.75, 0.0), (12, 0.25, -1.0) ] ],
+          [ 'B', [ (14, -0.25, -0.5) ] ] ] ),
+    FORMAT_BOUJOU: (
+        '# boujou export\nT1 1 500 250\nT1 2 1500 750\nT2 3 1000 500\n',
+        [ [ 'T1', [ (11, -0.5, -0.5), (12, 0.5, 0.5) ] ],
+          [ 'T2', [ (13, 0.0, 0.0) ] ] ] ),
+}
+
+
+class SniffFormatTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree( self.dir )
+
+    def sniff(self, text):
+        path = os.path.join( self.dir, 'tracks.txt' )
+        with open( path, 'w' ) as f:
+            f.write( text )
+        return sniffFormat( path )
+
+    def testSyntheyes(self):
+        self.assertEqual( self.sniff( 'T1 1 0.1 -0.4\nT1 2 0.12 -0.41\n' ), FORMAT_SYNTHEYES )
+
+    def testSyntheyesOffThePlate(self):
+        # a tracker leaving the frame is a little outside -1 to 1
+        self.assertEqual( self.sniff( 'T1 2 1.2 0.4\n' ), FORMAT_SYNTHEYES )
+        rows = [ 'T1 %d %f 0.4' % ( f, 0.5 + f * 0.05 ) for f in range(20) ]
+        self.assertEqual( self.sniff( '\n'.join( rows ) + '\n' ), FORMAT_SYNTHEYES )
+
+    def testBoujouPixels(self):
+        self.assertEqual( self.sniff( 'T1 1 960.5 540.25\nT1 2 961.0 541.5\n' ), FORMAT_BOUJOU )
+
+    def testBoujouHeader(self):
+        # centered boujou data is only told apart by its header
+        self.assertEqual( self.sniff( '# boujou 2d tracks export\nT1 1 0.1 -0.4\n' ), FORMAT_BOUJOU )
+
+    def testAmbiguous(self):
+        rows = [ 'T1 %d 0.5 0.4' % f for f in range(10) ] + [ 'T2 %d 1.5 2.5' % f for f in range(3) ]
+        with self.assertRaises( AmbiguousFormatError ) as context:
+            self.sniff( '\n'.join( rows ) + '\n' )
+        self.assertEqual( set( context.exception.formats ), set( [FORMAT_SYNTHEYES, FORMAT_BOUJOU] ) )
+        # it comes back whole from a worker process
+        copy = pickle.loads( pickle.dumps( context.exception ) )
+        self.assertEqual( copy.formats, context.exception.formats )
+        self.assertEqual( str(copy), str(context.exception) )
+
+
+class LoaderTest(unittest.TestCase):
+    """ The streaming loaders give what the loaders reading the whole file did """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree( self.dir )
+
+    def load(self, format):
+        path = os.path.join( self.dir, 'tracks_%d.txt' % format )
+        with open( path, 'w' ) as f:
+            f.write( LOADER_FIXTURES[format][0] )
+        return LOADERS[format]( path, 2000, 1000, 0.25, 0.5, 10 )
+
+    def testFormats(self):
+        for format, ( text, expected ) in sorted( LOADER_FIXTURES.items() ):
+            self.assertEqual( self.load( format ).toList(), expected, 'format %d' % format )
+
+    def testQuality(self):
+        # the similarity and quality columns are kept, 1 without them
+        self.assertEqual( list( self.load( FORMAT_PFTRACK ).quality ), [ 0.9, 0.8, 1.0 ] )
+        self.assertEqual( list( self.load( FORMAT_SYNTHEYES ).quality ), [ 0.9, 1.0, 1.0 ] )
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cacheDir = os.path.join( self.dir, 'cache' )
+        self.path = os.path.join( self.dir, 'tracks.txt' )
+        with open( self.path, 'w' ) as f:
+            f.write( LOADER_FIXTURES[FORMAT_SYNTHEYES][0] )
+        # count the parses, a cache hit does not parse
+        self.loader = LOADERS[FORMAT_SYNTHEYES]
+        self.parses = 0
+        def loader( *args ):
+            self.parses += 1
+            return self.loader( *args )
+        LOADERS[FORMAT_SYNTHEYES] = loader
+
+    def tearDown(self):
+        LOADERS[FORMAT_SYNTHEYES] = self.loader
+        shutil.rmtree( self.dir )
+
+    def load(self, plateResX=2000, plateResY=1000, offsetX=0.25, offsetY=0.5, frameOffset=10):
+        return loadTrackingFile( self.path, FORMAT_SYNTHEYES, plateResX, plateResY, offsetX, offsetY, frameOffset,
+                                 cacheDir=self.cacheDir ).toList()
+
+    def testHit(self):
+        first = self.load()
+        self.assertEqual( self.load(), first )
+        self.assertEqual( self.parses, 1 )
+        self.assertEqual( first, LOADER_FIXTURES[FORMAT_SYNTHEYES][1] )
+
+    def testParameters(self):
+        self.load()
+        self.load( plateResX=1920 )
+        self.load( plateResY=1080 )
+        self.load( offsetX=0.0 )
+        self.load( offsetY=0.0 )
+        self.load( frameOffset=0 )
+        self.assertEqual( self.parses, 6 )
+        self.assertEqual( self.load( offsetX=0.0 )[0][1][0], (11, 0.5, -0.75) )
+        self.assertEqual( self.parses, 6 )
+
+    def testFileChanges(self):
+        self.load()
+        # new modification time
+        stat = os.stat( self.path )
+        os.utime( self.path, ( stat.st_atime, stat.st_mtime - 100 ) )
+        self.load()
+        self.assertEqual( self.parses, 2 )
+        # new size, same modification time
+        with open( self.path, 'a' ) as f:
+            f.write( 'T3 7 0.0 0.0\n' )
+        os.utime( self.path, ( stat.st_atime, stat.st_mtime - 100 ) )
+        self.assertEqual( self.load()[-1], [ 'T3', [ (17, -0.25, -0.5) ] ] )
+        self.assertEqual( self.parses, 3 )
+
+    def testTrim(self):
+        os.makedirs( self.cacheDir )
+        now = time.time()
+        for i in range(5):
+            path = os.path.join( self.cacheDir, 'entry%d%s' % ( i, CACHE_EXTENSION ) )
+            with open( path, 'wb' ) as f:
+                f.write( b'x' * 100 )
+            os.utime( path, ( now - 100 * ( 5 - i ), now - 100 * ( 5 - i ) ) )
+        # other files are left alone
+        with open( os.path.join( self.cacheDir, 'other.txt' ), 'wb' ) as f:
+            f.write( b'x' * 1000 )
+        trimCache( self.cacheDir, 250 )
+        self.assertEqual( sorted( os.listdir( self.cacheDir ) ),
+                          [ 'entry3' + CACHE_EXTENSION, 'entry4' + CACHE_EXTENSION, 'other.txt' ] )
+
+    def testTrimOnWrite(self):
+        self.load()
+        self.load( frameOffset=0 )
+        self.assertEqual( len( os.listdir( self.cacheDir ) ), 2 )
+        # a cache smaller than an entry keeps none
+        loadTrackingFile( self.path, FORMAT_SYNTHEYES, 2000, 1000, 0.0, 0.0, 0, cacheDir=self.cacheDir, cacheMaxBytes=0 )
+        self.assertEqual( os.listdir( self.cacheDir ), [ ] )
+
+
+class PoolContextTest(unittest.TestCase):
+    """ Which processes may fork, spawn from mayapy or not start workers at all """
+
+    def setUp(self):
+        self.executable = trackerData.sys.executable
+        self.mayaLocation = os.environ.get( 'MAYA_LOCATION' )
+        # spawn starts workers with the executable of the last context
+        # setting it, it is set back for the other tests
+        self.spawn = None
+        if hasattr( multiprocessing, 'get_context' ):
+            from multiprocessing import spawn
+            self.spawn = spawn
+            self.spawnExecutable = spawn.get_executable()
+        self.dir = tempfile.mkdtemp()
+        os.makedirs( os.path.join( self.dir, 'bin' ) )
+        self.mayapy = os.path.join( self.dir, 'bin', 'mayapy.exe' if sys.platform == 'win32' else 'mayapy' )
+        with open( self.mayapy, 'w' ) as f:
+            f.write( '' )
+
+    def tearDown(self):
+        trackerData.sys.executable = self.executable
+        if self.mayaLocation is None:
+            os.environ.pop( 'MAYA_LOCATION', None )
+        else:
+            os.environ['MAYA_LOCATION'] = self.mayaLocation
+        if self.spawn is not None:
+            self.spawn.set_executable( self.spawnExecutable )
+        shutil.rmtree( self.dir )
+
+    def context(self, executable, mayaLocation):
+        trackerData.sys.executable = executable
+        if mayaLocation is None:
+            os.environ.pop( 'MAYA_LOCATION', None )
+        else:
+            os.environ['MAYA_LOCATION'] = mayaLocation
+        return poolContext()
+
+    def testOutsideMaya(self):
+        self.assertTrue( self.context( '/usr/bin/python3', None ) is multiprocessing )
+        self.assertTrue( self.context( '/usr/bin/maya', None ) is multiprocessing )
+
+    def testBatch(self):
+        # mayapy and plain pythons have no GUI to copy
+        for name in ( 'mayapy', 'mayapy2', 'mayapy.exe', 'python', 'python3.11', 'Python.exe' ):
+            self.assertTrue( self.context( os.path.join( self.dir, 'bin', name ), self.dir ) is multiprocessing, name )
+
+    def testInteractive(self):
+        context = self.context( os.path.join( self.dir, 'bin', 'maya' ), self.dir )
+        if not hasattr( multiprocessing, 'get_context' ):
+            # python 2 maya, the work stays in this process
+            self.assertTrue( context is None )
+            return
+        self.assertEqual( context.get_start_method(), 'spawn' )
+        self.assertEqual( os.fsdecode( self.spawn.get_executable() ), self.mayapy )
+
+    def testInteractiveWithoutMayapy(self):
+        os.remove( self.mayapy )
+        self.assertTrue( self.context( os.path.join( self.dir, 'bin', 'maya' ), self.dir ) is None )
+
+
+if __name__ == '__main__':
+    unittest.main()
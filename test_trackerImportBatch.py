@@ -0,0 +1,61 @@
+#
+# Tests of trackerImportBatch that run without maya:
+#
+#   python -m unittest test_trackerImportBatch
+
+import unittest
+
+from trackerData import FORMAT_3DE, FORMAT_AUTO
+from trackerImportBatch import SETTINGS, jobArguments
+from trackerLens import LensDistortion
+
+# stands in for trackerImport.DEFAULTS, which needs maya
+DEFAULTS = dict( ( key, 'default %s' % key ) for key in SETTINGS.values() )
+
+
+class JobArgumentsTest(unittest.TestCase):
+
+    def job(self, **settings):
+        job = { 'scene': '/shots/a.ma', 'camera': 'shotCamShape', 'file': '/shots/a.txt' }
+        job.update( settings )
+        return job
+
+    def testDefaults(self):
+        arguments = jobArguments( self.job(), DEFAULTS )
+        self.assertEqual( arguments['z'], 'default z' )
+        self.assertEqual( arguments['locatorDisplayScale'], 'default displayScale' )
+        self.assertEqual( arguments['formats'], FORMAT_AUTO )
+        self.assertEqual( arguments['pointCloud'], False )
+        self.assertTrue( 'lensDistortion' not in arguments and 'resolutionX' not in arguments )
+
+    def testSettings(self):
+        job = self.job( output='/shots/b.ma', files=[ '/shots/b.txt' ], format='3DE', resolution=[ 2048, 858 ],
+                        pointCloud=1, processes=4, lens={ 'k1': -0.05 }, profile='/shots/profile.json',
+                        z=25, displayScale=0.5, raycastBackend='cache' )
+        arguments = jobArguments( job, DEFAULTS )
+        self.assertEqual( arguments['formats'], FORMAT_3DE )
+        self.assertEqual( ( arguments['resolutionX'], arguments['resolutionY'] ), ( 2048, 858 ) )
+        self.assertEqual( ( arguments['pointCloud'], arguments['processes'] ), ( True, 4 ) )
+        self.assertEqual( arguments['profilePath'], '/shots/profile.json' )
+        self.assertEqual( ( arguments['z'], arguments['locatorDisplayScale'] ), ( 25, 0.5 ) )
+        self.assertEqual( arguments['raycastBackend'], 'cache' )
+        self.assertTrue( isinstance( arguments['lensDistortion'], LensDistortion ) )
+
+    def testMissing(self):
+        for key in ( 'scene', 'camera', 'file' ):
+            job = self.job()
+            del job[key]
+            self.assertRaises( ValueError, jobArguments, job, DEFAULTS )
+
+    def testUnknownFormat(self):
+        self.assertRaises( ValueError, jobArguments, self.job( format='matchmover' ), DEFAULTS )
+
+    def testUnknownSettings(self):
+        # the importTrackers argument names are not job keys either
+        with self.assertRaises( ValueError ) as context:
+            jobArguments( self.job( frameOfset=10, locatorDisplayScale=0.5 ), DEFAULTS )
+        self.assertTrue( 'frameOfset, locatorDisplayScale' in str(context.exception) )
+
+
+if __name__ == '__main__':
+    unittest.main()
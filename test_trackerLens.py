@@ -0,0 +1,188 @@
+#
+# Tests of trackerLens that run without maya:
+#
+#   python -m unittest test_trackerLens
+#
+# The numpy and the pure python paths are both checked, the latter by
+# hiding numpy from the module for the duration of a test.
+
+import math
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from array import array
+
+import trackerLens
+from trackerLens import LensDistortion
+from trackerData import FORMAT_NUKE, FORMAT_SYNTHEYES, loadTrackingFiles
+
+
+class LensTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.numpy = trackerLens.numpy
+
+    def tearDown(self):
+        trackerLens.numpy = self.numpy
+
+    def paths(self):
+        """ The numpy modules to run a test with, None for the pure python path """
+        return [ self.numpy, None ] if self.numpy is not None else [ None ]
+
+    def assertSamplesEqual(self, got, expected, places=9):
+        self.assertEqual( len(got), len(expected) )
+        for i in range(len(expected)):
+            self.assertAlmostEqual( float(got[i]), expected[i], places=places,
+                                    msg='sample %d: %r != %r' % ( i, float(got[i]), expected[i] ) )
+
+
+class DistortTest(LensTestCase):
+    """ The forward model against values worked out by hand """
+
+    def distort(self, lens, u, v, plateResX, plateResY):
+        results = [ ]
+        for module in self.paths():
+            trackerLens.numpy = module
+            results.append( lens.distort( u, v, plateResX, plateResY ) )
+        return results
+
+    def testRadial(self):
+        # square plate, half diagonal sqrt(2): u = 0.5 * sqrt(2) is x = 0.5,
+        # r2 = 0.25 and the radial factor 1 + 0.1 * 0.25
+        lens = LensDistortion( k1=0.1 )
+        root2 = math.sqrt( 2.0 )
+        for du, dv in self.distort( lens, [ 0.5 * root2, 0.0 ], [ 0.0, -0.5 * root2 ], 1000, 1000 ):
+            self.assertSamplesEqual( du, [ 0.5125 * root2, 0.0 ] )
+            self.assertSamplesEqual( dv, [ 0.0, -0.5125 * root2 ] )
+
+    def testCorner(self):
+        # the corners of any plate are at r = 1, k1 moves them by k1
+        lens = LensDistortion( k1=0.1, k2=0.02, k3=-0.01 )
+        for du, dv in self.distort( lens, [ 1.0, -1.0 ], [ 1.0, 1.0 ], 1920, 1080 ):
+            self.assertSamplesEqual( du, [ 1.11, -1.11 ] )
+            self.assertSamplesEqual( dv, [ 1.11, 1.11 ] )
+
+    def testTangential(self):
+        # x, y = 0.3, 0.4: r2 = 0.25, xy = 0.12
+        #   xd = 0.3 + 2 * 0.01 * 0.12 + 0.02 * ( 0.25 + 0.18 ) = 0.311
+        #   yd = 0.4 + 0.01 * ( 0.25 + 0.32 ) + 2 * 0.02 * 0.12 = 0.4105
+        lens = LensDistortion( p1=0.01, p2=0.02 )
+        root2 = math.sqrt( 2.0 )
+        for du, dv in self.distort( lens, [ 0.3 * root2 ], [ 0.4 * root2 ], 1000, 1000 ):
+            self.assertSamplesEqual( du, [ 0.311 * root2 ] )
+            self.assertSamplesEqual( dv, [ 0.4105 * root2 ] )
+
+    def testSqueeze(self):
+        # a square plate of squeeze 2 is 2 by 1 on the sensor, its half
+        # diagonal sqrt(5): u = 0.6 * sqrt(5) / 2 is x = 0.6, r2 = 0.36
+        # and xd = 0.6 * ( 1 - 0.2 * 0.36 ) = 0.5568
+        lens = LensDistortion( k1=-0.2, squeeze=2.0 )
+        scale = math.sqrt( 5.0 ) / 2.0
+        for du, dv in self.distort( lens, [ 0.6 * scale ], [ 0.0 ], 1000, 1000 ):
+            self.assertSamplesEqual( du, [ 0.5568 * scale ] )
+            self.assertSamplesEqual( dv, [ 0.0 ] )
+
+    def testCenter(self):
+        # the distortion center does not move
+        lens = LensDistortion( k1=0.3, p1=0.01, centerX=0.2, centerY=-0.1 )
+        for du, dv in self.distort( lens, [ 0.2 ], [ -0.1 ], 1920, 1080 ):
+            self.assertSamplesEqual( du, [ 0.2 ] )
+            self.assertSamplesEqual( dv, [ -0.1 ] )
+
+
+class UndistortTest(LensTestCase):
+
+    def setUp(self):
+        LensTestCase.setUp( self )
+        rand = random.Random( 25 )
+        # the whole plate and a little outside of it
+        self.u = [ rand.uniform( -1.1, 1.1 ) for i in range(500) ]
+        self.v = [ rand.uniform( -1.1, 1.1 ) for i in range(500) ]
+        self.lenses = [
+            LensDistortion( k1=-0.05, k2=0.01 ),
+            LensDistortion( k1=0.08, k2=-0.02, k3=0.005, p1=0.002, p2=-0.001 ),
+            LensDistortion( k1=-0.12, k2=0.03, p1=-0.003, squeeze=2.0, centerX=0.02, centerY=-0.01 ),
+        ]
+
+    def testRoundTrip(self):
+        for module in self.paths():
+            trackerLens.numpy = module
+            for lens in self.lenses:
+                du, dv = lens.distort( self.u, self.v, 1920, 1080 )
+                uu, uv = lens.undistort( du, dv, 1920, 1080 )
+                if module is None:
+                    self.assertTrue( isinstance( uu, array ) and isinstance( uv, array ) )
+                self.assertSamplesEqual( uu, self.u )
+                self.assertSamplesEqual( uv, self.v )
+
+    def testPathsAgree(self):
+        if self.numpy is None:
+            self.skipTest( 'numpy is not installed' )
+        lens = self.lenses[2]
+        withNumpy = lens.undistort( self.u, self.v, 1920, 1080 )
+        trackerLens.numpy = None
+        withoutNumpy = lens.undistort( self.u, self.v, 1920, 1080 )
+        for got, expected in zip( withNumpy, withoutNumpy ):
+            self.assertSamplesEqual( got, list( expected ), places=12 )
+
+    def testEmpty(self):
+        for module in self.paths():
+            trackerLens.numpy = module
+            uu, uv = self.lenses[1].undistort( [ ], [ ], 1920, 1080 )
+            self.assertEqual( ( len(uu), len(uv) ), ( 0, 0 ) )
+
+    def testOffset(self):
+        # the samples of a lens moved by the import offsets undistort to
+        # the same place, moved by the offsets
+        lens = self.lenses[2]
+        for module in self.paths():
+            trackerLens.numpy = module
+            uu, uv = lens.undistort( self.u, self.v, 1920, 1080 )
+            moved = lens.withOffset( 0.1, -0.05 )
+            mu, mv = moved.undistort( [ u - 0.1 for u in self.u ], [ v + 0.05 for v in self.v ], 1920, 1080 )
+            self.assertSamplesEqual( mu, [ u - 0.1 for u in uu ] )
+            self.assertSamplesEqual( mv, [ v + 0.05 for v in uv ] )
+
+
+class LoadUndistortedTest(LensTestCase):
+    """ loadTrackingFiles undistorts where the samples were on the plate, before the offsets """
+
+    def setUp(self):
+        LensTestCase.setUp( self )
+        self.dir = tempfile.mkdtemp()
+        self.syntheyesPath = os.path.join( self.dir, 'tracks.txt' )
+        with open( self.syntheyesPath, 'w' ) as f:
+            f.write( 'T1 1 0.8 -0.6\nT1 2 0.75 -0.55\n' )
+        self.nukePath = os.path.join( self.dir, 'nuke.txt' )
+        with open( self.nukePath, 'w' ) as f:
+            f.write( '1728 108\n1680 135\n' )
+        self.lens = LensDistortion( k1=-0.1, k2=0.02 )
+
+    def tearDown(self):
+        LensTestCase.tearDown( self )
+        shutil.rmtree( self.dir )
+
+    def load(self, path, format, offsetX, offsetY, lensDistortion):
+        return loadTrackingFiles( [ path ], format, 1920, 1080, offsetX, offsetY, 0, processes=1, useCache=False,
+                                  lensDistortion=lensDistortion )
+
+    def testOffsetFormat(self):
+        raw = self.load( self.syntheyesPath, FORMAT_SYNTHEYES, 0.0, 0.0, None )
+        uu, uv = self.lens.undistort( raw.u, raw.v, 1920, 1080 )
+        got = self.load( self.syntheyesPath, FORMAT_SYNTHEYES, 0.1, -0.2, self.lens )
+        self.assertSamplesEqual( got.u, [ u - 0.1 for u in uu ] )
+        self.assertSamplesEqual( got.v, [ v + 0.2 for v in uv ] )
+
+    def testFormatWithoutOffsets(self):
+        # nuke files ignore the offsets, the lens center stays put
+        raw = self.load( self.nukePath, FORMAT_NUKE, 0.0, 0.0, None )
+        uu, uv = self.lens.undistort( raw.u, raw.v, 1920, 1080 )
+        got = self.load( self.nukePath, FORMAT_NUKE, 0.1, -0.2, self.lens )
+        self.assertSamplesEqual( got.u, list( uu ) )
+        self.assertSamplesEqual( got.v, list( uv ) )
+
+
+if __name__ == '__main__':
+    unittest.main()
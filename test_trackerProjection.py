@@ -0,0 +1,326 @@
+#
+# Tests of trackerProjection that run without maya:
+#
+#   python -m unittest test_trackerProjection
+#
+# The numpy and the pure python paths are both checked, the latter by
+# hiding numpy from the module for the duration of a test.
+
+import math
+import random
+import unittest
+
+import trackerProjection
+from trackerProjection import TriangleBVH, MISS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def rotationMatrix( rx, ry, rz, translation ):
+    """ A camera world matrix as 16 floats, rotated x then y then z (in radians) and moved to translation """
+    cx, sx = math.cos(rx), math.sin(rx)
+    cy, sy = math.cos(ry), math.sin(ry)
+    cz, sz = math.cos(rz), math.sin(rz)
+    # rows are the camera axes in world space, maya's row vector convention
+    rotX = [ [1.0, 0.0, 0.0], [0.0, cx, sx], [0.0, -sx, cx] ]
+    rotY = [ [cy, 0.0, -sy], [0.0, 1.0, 0.0], [sy, 0.0, cy] ]
+    rotZ = [ [cz, sz, 0.0], [-sz, cz, 0.0], [0.0, 0.0, 1.0] ]
+    def multiply( a, b ):
+        return [ [ sum( a[i][k] * b[k][j] for k in range(3) ) for j in range(3) ] for i in range(3) ]
+    rotation = multiply( multiply( rotX, rotY ), rotZ )
+    matrix = [ ]
+    for row in rotation:
+        matrix.extend( row + [0.0] )
+    matrix.extend( list( translation ) + [1.0] )
+    return matrix
+
+
+def referenceSample( u, v, xmin, xmax, ymin, ymax, zmax, matrix, camPos ):
+    """
+        One sample the way the importer did it before unprojectSamples,
+        the camera space point as an MVector times the world matrix (the
+        rotation part, a vector has no translation) plus the camera position.
+    """
+    xExtent = abs( xmax - xmin ) * 0.5
+    yExtent = abs( ymax - ymin ) * 0.5
+    xCenter = ( xmax + xmin ) * 0.5
+    yCenter = ( ymax + ymin ) * 0.5
+    x = ( u * xExtent ) + xCenter
+    y = ( v * -yExtent ) + yCenter
+    z = -zmax
+    m = matrix
+    return ( x * m[0] + y * m[4] + z * m[8] + camPos[0],
+             x * m[1] + y * m[5] + z * m[9] + camPos[1],
+             x * m[2] + y * m[6] + z * m[10] + camPos[2] )
+
+
+class UnprojectSamplesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.numpy = trackerProjection.numpy
+        rand = random.Random( 5 )
+        # samples inside and a little outside the plate
+        self.u = [ rand.uniform( -1.2, 1.2 ) for i in range(200) ]
+        self.v = [ rand.uniform( -1.2, 1.2 ) for i in range(200) ]
+        self.cameras = [
+            # identity camera at the origin, the frustum centered
+            ( [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0],
+              ( -0.5, 0.5, -0.28125, 0.28125, 10.0 ) ),
+            # rotated and moved camera with a film offset
+            ( rotationMatrix( 0.3, -1.1, 0.2, (12.0, -3.5, 40.0) ),
+              ( -0.41, 0.63, -0.2, 0.36, 250.0 ) ),
+            ( rotationMatrix( -2.0, 0.7, 3.0, (-100.0, 55.0, 0.25) ),
+              ( -1.0, 1.0, -1.0, 1.0, 0.1 ) ),
+        ]
+
+    def tearDown(self):
+        trackerProjection.numpy = self.numpy
+
+    def checkAgainstReference(self):
+        for matrix, ( xmin, xmax, ymin, ymax, zmax ) in self.cameras:
+            camPos = matrix[12:15]
+            xs, ys, zs = trackerProjection.unprojectSamples( self.u, self.v, xmin, xmax, ymin, ymax, zmax, matrix, camPos )
+            self.assertEqual( len(xs), len(self.u) )
+            for i in range(len(self.u)):
+                expected = referenceSample( self.u[i], self.v[i], xmin, xmax, ymin, ymax, zmax, matrix, camPos )
+                got = ( xs[i], ys[i], zs[i] )
+                for axis in range(3):
+                    self.assertAlmostEqual( got[axis], expected[axis], places=9,
+                                            msg='sample %d axis %d: %r != %r' % ( i, axis, got, expected ) )
+
+    @unittest.skipIf( numpy is None, 'numpy is not installed' )
+    def testNumpyPath(self):
+        self.checkAgainstReference()
+
+    def testLoopPath(self):
+        trackerProjection.numpy = None
+        self.checkAgainstReference()
+
+    def testPlateCorner(self):
+        # the top right corner of the plate seen by a camera turned 90
+        # degrees around y, looking down -x
+        matrix = rotationMatrix( 0.0, math.pi * 0.5, 0.0, (1.0, 2.0, 3.0) )
+        for module in ( self.numpy, None ):
+            trackerProjection.numpy = module
+            xs, ys, zs = trackerProjection.unprojectSamples( [1.0], [-1.0], -0.5, 0.5, -0.25, 0.25, 10.0, matrix, matrix[12:15] )
+            self.assertAlmostEqual( xs[0], 1.0 - 10.0 )
+            self.assertAlmostEqual( ys[0], 2.0 + 0.25 )
+            self.assertAlmostEqual( zs[0], 3.0 - 0.5 )
+
+    def testEmpty(self):
+        matrix, ( xmin, xmax, ymin, ymax, zmax ) = self.cameras[1]
+        for module in ( self.numpy, None ):
+            trackerProjection.numpy = module
+            xs, ys, zs = trackerProjection.unprojectSamples( [ ], [ ], xmin, xmax, ymin, ymax, zmax, matrix, matrix[12:15] )
+            self.assertEqual( ( len(xs), len(ys), len(zs) ), ( 0, 0, 0 ) )
+
+
+def layeredMesh( n=6, size=8.0 ):
+    """
+        Points, triangles, faces and triangle indices of two bumpy grids of
+        n x n quads split in two triangles, one in front of the other, so
+        most rays cross the mesh twice and only the closest hit counts.
+    """
+    points = [ ]
+    triangles = [ ]
+    for layer, depth in enumerate( ( 0.0, -3.0 ) ):
+        first = len(points) // 3
+        for j in range( n+1 ):
+            for i in range( n+1 ):
+                x = size * ( float(i) / n - 0.5 )
+                y = size * ( float(j) / n - 0.5 )
+                points.extend( ( x, y, depth + 0.7 * math.sin( x + layer ) * math.cos( 0.8 * y ) ) )
+        for j in range( n ):
+            for i in range( n ):
+                a = first + j * ( n+1 ) + i
+                b = a + n + 1
+                triangles.extend( ( a, a+1, b+1, a, b+1, b ) )
+    nbrTriangles = len(triangles) // 3
+    # two triangles per polygon, like MFnMesh.getTriangles describes a quad
+    return points, triangles, [ t // 2 for t in range(nbrTriangles) ], [ t % 2 for t in range(nbrTriangles) ]
+
+
+def bruteForceHit( points, triangles, faces, indices, origin, direction, maxParam=trackerProjection.MAX_PARAM ):
+    """
+        The closest hit over every triangle, Moller-Trumbore without a
+        tolerance. Returns (t, face, triangle index, bary1, bary2, ties),
+        ties the number of other triangles hit at the same distance, None
+        on a miss.
+    """
+    def sub( a, b ):
+        return ( a[0]-b[0], a[1]-b[1], a[2]-b[2] )
+    def cross( a, b ):
+        return ( a[1]*b[2] - a[2]*b[1], a[2]*b[0] - a[0]*b[2], a[0]*b[1] - a[1]*b[0] )
+    def dot( a, b ):
+        return a[0]*b[0] + a[1]*b[1] + a[2]*b[2]
+    hits = [ ]
+    for tri in range( len(triangles) // 3 ):
+        p0, p1, p2 = [ points[ 3*triangles[3*tri+k] : 3*triangles[3*tri+k]+3 ] for k in range(3) ]
+        e1 = sub( p1, p0 )
+        e2 = sub( p2, p0 )
+        pvec = cross( direction, e2 )
+        det = dot( e1, pvec )
+        if abs(det) < 1e-12:
+            continue
+        tvec = sub( origin, p0 )
+        u = dot( tvec, pvec ) / det
+        qvec = cross( tvec, e1 )
+        v = dot( direction, qvec ) / det
+        t = dot( e2, qvec ) / det
+        if u >= 0.0 and v >= 0.0 and u + v <= 1.0 and 0.0 <= t <= maxParam:
+            hits.append( ( t, faces[tri], indices[tri], 1.0 - u - v, u ) )
+    if not hits:
+        return None
+    best = min( hits )
+    ties = sum( 1 for hit in hits if abs( hit[0] - best[0] ) < 1e-9 ) - 1
+    return best + ( ties, )
+
+
+class BVHTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.numpy = trackerProjection.numpy
+        self.points, self.triangles, self.faces, self.indices = layeredMesh()
+        rand = random.Random( 8 )
+        self.origins = [ ]
+        self.directions = [ ]
+        for r in range(150):
+            # from in front of the mesh, some aimed past its sides
+            self.origins.append( ( rand.uniform( -6.0, 6.0 ), rand.uniform( -6.0, 6.0 ), 10.0 ) )
+            self.directions.append( ( rand.uniform( -0.3, 0.3 ), rand.uniform( -0.3, 0.3 ), -1.0 ) )
+
+    def tearDown(self):
+        trackerProjection.numpy = self.numpy
+
+    def paths(self):
+        """ The numpy modules to run a test with, None for the pure python path """
+        return [ self.numpy, None ] if self.numpy is not None else [ None ]
+
+    def build(self, points=None):
+        return TriangleBVH( points or self.points, self.triangles, self.faces, self.indices )
+
+    def assertSameHit(self, got, expected, msg=None):
+        self.assertEqual( got[0], expected[0], msg )
+        if not expected[0]:
+            self.assertEqual( got, MISS, msg )
+            return
+        self.assertEqual( got[2][:2], expected[2][:2], msg )
+        for a, b in zip( got[1] + got[2][2:], expected[1] + expected[2][2:] ):
+            self.assertAlmostEqual( a, b, places=9, msg=msg )
+
+
+class TriangleBVHTest(BVHTestCase):
+
+    def testAgainstBruteForce(self):
+        for module in self.paths():
+            trackerProjection.numpy = module
+            bvh = self.build()
+            nbrHits = 0
+            for r, ( origin, direction ) in enumerate( zip( self.origins, self.directions ) ):
+                hit, position, hitInfo = bvh.intersect( origin, direction )
+                expected = bruteForceHit( self.points, self.triangles, self.faces, self.indices, origin, direction )
+                msg = 'ray %d numpy %s' % ( r, module is not None )
+                if expected is None:
+                    self.assertEqual( ( hit, position, hitInfo ), MISS, msg )
+                    continue
+                nbrHits += 1
+                t, face, triangle, bary1, bary2, ties = expected
+                self.assertTrue( hit, msg )
+                for a in range(3):
+                    self.assertAlmostEqual( position[a], origin[a] + direction[a] * t, places=9, msg=msg )
+                if not ties:
+                    self.assertEqual( hitInfo[:2], ( face, triangle ), msg )
+                    self.assertAlmostEqual( hitInfo[2], bary1, places=9, msg=msg )
+                    self.assertAlmostEqual( hitInfo[3], bary2, places=9, msg=msg )
+                # bary1 * p0 + bary2 * p1 + the rest * p2 is the hit position
+                for a, b in zip( bvh.hitPosition( hitInfo ), position ):
+                    self.assertAlmostEqual( a, b, places=9, msg=msg )
+            self.assertTrue( 50 < nbrHits < len(self.origins) )
+
+    def testMiss(self):
+        for module in self.paths():
+            trackerProjection.numpy = module
+            bvh = self.build()
+            # away from the mesh, past its side and stopped short of it
+            self.assertEqual( bvh.intersect( (0.0, 0.0, 10.0), (0.0, 0.0, 1.0) ), MISS )
+            self.assertEqual( bvh.intersect( (20.0, 0.0, 10.0), (0.0, 0.0, -1.0) ), MISS )
+            self.assertEqual( bvh.intersect( (0.0, 0.0, 10.0), (0.0, 0.0, -1.0), maxParam=5.0 ), MISS )
+            self.assertEqual( bvh.intersectMany( [ (20.0, 0.0, 10.0) ], [ (0.0, 0.0, -1.0) ] ), [ MISS ] )
+
+    def testIntersectMany(self):
+        for module in self.paths():
+            trackerProjection.numpy = module
+            bvh = self.build()
+            many = bvh.intersectMany( self.origins, self.directions )
+            self.assertEqual( len(many), len(self.origins) )
+            for r, ( origin, direction ) in enumerate( zip( self.origins, self.directions ) ):
+                self.assertSameHit( many[r], bvh.intersect( origin, direction ), 'ray %d' % r )
+
+    def testRefit(self):
+        # a refit tree on moved points hits like a tree built on them
+        moved = list( self.points )
+        for i in range( 0, len(moved), 3 ):
+            moved[i+2] += 0.8 * math.sin( 2.0 * moved[i] ) + 0.3 * moved[i+1]
+            moved[i] += 0.2 * math.cos( moved[i+1] )
+        for module in self.paths():
+            trackerProjection.numpy = module
+            refit = self.build()
+            refit.refit( moved )
+            fresh = self.build( moved )
+            for r, ( got, expected ) in enumerate( zip( refit.intersectMany( self.origins, self.directions ),
+                                                        fresh.intersectMany( self.origins, self.directions ) ) ):
+                self.assertSameHit( got, expected, 'ray %d' % r )
+            for r in range( 0, len(self.origins), 10 ):
+                self.assertSameHit( refit.intersect( self.origins[r], self.directions[r] ),
+                                    fresh.intersect( self.origins[r], self.directions[r] ), 'ray %d' % r )
+
+
+class HintTest(BVHTestCase):
+    """ A hint only changes how fast a ray is answered, never the answer """
+
+    def hints(self, bvh, unhinted):
+        rand = random.Random( 21 )
+        nbrTriangles = bvh.triangleCount()
+        hints = [ ]
+        for r, ( hit, position, hitInfo ) in enumerate( unhinted ):
+            kind = r % 5
+            if kind == 0:
+                hints.append( bvh.hintTriangle( hitInfo if hit else None ) ) # the right triangle
+            elif kind == 1 and hit:
+                # a neighbour of the right triangle
+                hints.append( bvh.hintTriangle( hitInfo ) ^ 1 )
+            elif kind == 2:
+                hints.append( rand.randrange( nbrTriangles ) ) # a wrong one
+            elif kind == 3:
+                # a stale hit of a polygon the mesh does not have
+                hints.append( bvh.hintTriangle( ( 99999, 0, 0.5, 0.5 ) ) )
+            else:
+                hints.append( -1 )
+        return hints
+
+    def testHintTriangle(self):
+        bvh = self.build()
+        self.assertEqual( bvh.hintTriangle( None ), -1 )
+        self.assertEqual( bvh.hintTriangle( ( 99999, 0, 0.5, 0.5 ) ), -1 )
+        self.assertEqual( bvh.hintTriangle( ( 3, 1, 0.5, 0.5 ) ), 7 )
+
+    def testHintedSameAsFullSearch(self):
+        for module in self.paths():
+            trackerProjection.numpy = module
+            bvh = self.build()
+            unhinted = bvh.intersectMany( self.origins, self.directions )
+            hints = self.hints( bvh, unhinted )
+            self.assertTrue( any( hint == -1 for hint in hints[3::5] ) )
+            hinted = bvh.intersectMany( self.origins, self.directions, hints=hints )
+            for r in range(len(self.origins)):
+                msg = 'ray %d hint %d numpy %s' % ( r, hints[r], module is not None )
+                self.assertSameHit( hinted[r], unhinted[r], msg )
+                self.assertSameHit( bvh.intersect( self.origins[r], self.directions[r], hint=hints[r] ), unhinted[r], msg )
+            self.assertTrue( bvh.stats['hintHits'] > 0 )
+
+
+if __name__ == '__main__':
+    unittest.main()
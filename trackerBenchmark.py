@@ -0,0 +1,591 @@
+#
+# Benchmarks for the tracker import.
+#
+# Runs outside of Maya: python trackerBenchmark.py
+# The benchmarks of MAYA_BENCHMARKS need mayapy and are only run when
+# asked for: mayapy trackerBenchmark.py offsetPlayback --trackers 500
+#
+# The tracking data is made up by trackerSynthetic, with --gaps choosing
+# its gap pattern. The projection benchmark runs the frame loop of
+# trackerImport against the stand-in maya modules of trackerMayaStandIn,
+# so it needs no Maya either.
+#
+# Each benchmark returns a dict of measurements. They are printed as JSON
+# and written to --output, a previous output given to --compare is
+# compared with the new timings:
+#
+#   python trackerBenchmark.py --output before.json
+#   python trackerBenchmark.py --output after.json --compare before.json
+
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import trackerMayaStandIn
+import trackerProfile
+from trackerData import TrackingData, LOADERS, FORMAT_AUTO, loadTrackingFile, sniffFormat
+from trackerImportBatch import FORMATS
+from trackerLens import LensDistortion, undistortTrackingData
+from trackerProjection import CameraTrack, TriangleBVH, unprojectSamples, numpy
+from trackerSynthetic import GAP_PATTERNS, syntheticTrackingData, writeSyntheticFiles
+
+# short name of each format in the results
+FORMAT_KEYS = dict( ( format, name ) for name, format in FORMATS.items() if format != FORMAT_AUTO )
+
+# frames the raycast and projection benchmarks are capped to, they cast
+# a ray per tracker and frame
+RAYCAST_FRAMES = 20
+PROJECTION_FRAMES = 100
+
+
+def syntheticTrackerList( nbrTrackers, nbrFrames, seed=0 ):
+    """
+        Returns random tracking data in the [[name, [(frame, u, v), ...]], ...]
+        list representation the loaders used to return.
+    """
+    r = random.Random(seed)
+    trackers = []
+    for t in range(nbrTrackers):
+        samples = []
+        for f in range(1, nbrFrames+1):
+            samples.append( (f, r.uniform(-1.0, 1.0), r.uniform(-1.0, 1.0)) )
+        trackers.append( ['Tracker%d' % t, samples] )
+    return trackers
+
+
+def deepSizeOf( obj, seen=None ):
+    """ Size in bytes of an object and everything it references (lists, tuples, arrays) """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add( id(obj) )
+    size = sys.getsizeof( obj )
+    if isinstance(obj, (list, tuple)):
+        for item in obj:
+            size += deepSizeOf( item, seen )
+    elif isinstance(obj, TrackingData):
+        size += deepSizeOf( obj.__dict__, seen )
+    elif isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deepSizeOf( key, seen ) + deepSizeOf( value, seen )
+    return size
+
+
+@contextmanager
+def quiet():
+    """ Hides what the importer prints for the time of a with block """
+    stdout = sys.stdout
+    with open( os.devnull, 'w' ) as devnull:
+        sys.stdout = devnull
+        try:
+            yield
+        finally:
+            sys.stdout = stdout
+
+
+def timeIt( function, repeat=3 ):
+    """ Returns the best wall clock time of a few calls of a function """
+    best = None
+    for i in range(repeat):
+        gc.collect()
+        start = time.time()
+        function()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def iterateSamples( trackingData ):
+    """ Walks all the samples the same way createLocators does """
+    total = 0.0
+    for tracker in trackingData:
+        for frameData in tracker[1]:
+            total += frameData[1] + frameData[2]
+    return total
+
+
+def benchmarkTrackingData( nbrTrackers=800, nbrFrames=3000 ):
+    """
+        Compares the memory used by, and the time to build and iterate,
+        the list of tuples representation and TrackingData.
+    """
+    trackers = syntheticTrackerList( nbrTrackers, nbrFrames )
+
+    def buildList():
+        result = []
+        for name, samples in trackers:
+            tuples = []
+            result.append( [name, tuples] )
+            for frame, u, v in samples:
+                tuples.append( (frame, u, v) )
+        return result
+
+    trackingData = TrackingData.fromList( trackers )
+
+    return {
+        'trackers': nbrTrackers,
+        'frames': nbrFrames,
+        'samples': trackingData.sampleCount(),
+        'listBytes': deepSizeOf( trackers ),
+        'trackingDataBytes': deepSizeOf( trackingData ),
+        'listBuildSeconds': timeIt( buildList ),
+        'trackingDataBuildSeconds': timeIt( lambda: TrackingData.fromList( trackers ) ),
+        'listIterateSeconds': timeIt( lambda: iterateSamples( trackers ) ),
+        'trackingDataIterateSeconds': timeIt( lambda: iterateSamples( trackingData ) ),
+    }
+
+
+def linearScanLookup( trackers, frames ):
+    """ The per frame sample search createLocatorsAnimProjectCam used to do """
+    found = 0
+    for f in frames:
+        for tracker in trackers:
+            for frameData in tracker[1]:
+                fnum = frameData[0]
+                if fnum == f:
+                    found += 1
+                    break
+                elif fnum > f:
+                    break
+    return found
+
+
+def frameIndexLookup( trackingData, firstFrame, lastFrame ):
+    """ The per frame sample lookup through a FrameIndex """
+    found = 0
+    frameIndex = trackingData.frameIndex( firstFrame, lastFrame )
+    for f in range(firstFrame, lastFrame+1):
+        for t in range(len(trackingData)):
+            if frameIndex.sampleAt( t, f ) >= 0:
+                found += 1
+    return found
+
+
+def benchmarkFrameIndex( nbrTrackers=500, nbrFrames=2000, scanStep=50 ):
+    """
+        Compares finding every tracker's sample on every frame by walking
+        the samples against the FrameIndex lookup. The linear scan is
+        quadratic in the shot length, so it is only timed on one frame out
+        of scanStep and the result is scaled to the whole range.
+    """
+    trackers = syntheticTrackerList( nbrTrackers, nbrFrames )
+    trackingData = TrackingData.fromList( trackers )
+
+    scanFrames = list(range(1, nbrFrames+1, scanStep))
+    scanSeconds = timeIt( lambda: linearScanLookup( trackers, scanFrames ), repeat=1 )
+
+    return {
+        'trackers': nbrTrackers,
+        'frames': nbrFrames,
+        'linearScanSeconds': scanSeconds * (float(nbrFrames) / len(scanFrames)),
+        'frameIndexBuildSeconds': timeIt( lambda: trackingData.frameIndex( 1, nbrFrames ) ),
+        'frameIndexSeconds': timeIt( lambda: frameIndexLookup( trackingData, 1, nbrFrames ) ),
+    }
+
+
+def benchmarkParsers( nbrTrackers=800, nbrFrames=3000, gaps='none', seed=0 ):
+    """
+        Parse time of the same synthetic tracks written in every format,
+        the time to detect the format, and to read them back from the
+        tracking data cache. Nuke files hold a single tracker.
+    """
+    trackingData = syntheticTrackingData( nbrTrackers, nbrFrames, gaps, seed=seed )
+    directory = tempfile.mkdtemp( prefix='trackerBenchmark' )
+    try:
+        paths = writeSyntheticFiles( directory, trackingData )
+        result = { 'trackers': nbrTrackers, 'frames': nbrFrames, 'gaps': gaps }
+        for format, path in sorted( paths.items() ):
+            cacheDir = os.path.join( directory, 'cache' )
+            parsed = LOADERS[format]( path, 1920, 1080, 0.0, 0.0, 0 )
+            loadTrackingFile( path, format, 1920, 1080, 0.0, 0.0, 0, cacheDir=cacheDir )
+            seconds = timeIt( lambda: LOADERS[format]( path, 1920, 1080, 0.0, 0.0, 0 ) )
+            result[ FORMAT_KEYS[format] ] = {
+                'bytes': os.path.getsize( path ),
+                'samples': parsed.sampleCount(),
+                'parseSeconds': seconds,
+                'samplesPerSecond': parsed.sampleCount() / max( seconds, 1e-9 ),
+                'sniffSeconds': timeIt( lambda: sniffFormat( path ) ),
+                'cachedSeconds': timeIt( lambda: loadTrackingFile( path, format, 1920, 1080, 0.0, 0.0, 0, cacheDir=cacheDir ) ),
+            }
+    finally:
+        shutil.rmtree( directory, ignore_errors=True )
+    return result
+
+
+def staticCameraTrack( frames ):
+    """ A CameraTrack of a 35mm lens on a full aperture back, 20 units away from the origin """
+    cameraTrack = CameraTrack()
+    for f in frames:
+        cameraTrack.addSample( f, 35.0, 36.0, 24.0, 1.0, cameraMatrix( 0.0 ) )
+    return cameraTrack
+
+
+def benchmarkUnprojection( nbrTrackers=800, nbrFrames=3000, gaps='none', seed=0 ):
+    """
+        Time to move the samples onto the image plane, all at once as
+        createLocators does for a static camera, and frame by frame through
+        the FrameIndex as createLocatorsAnimProjectCam does.
+    """
+    trackingData = syntheticTrackingData( nbrTrackers, nbrFrames, gaps, seed=seed )
+    cameraTrack = staticCameraTrack( [ 1 ] )
+    zmax = 10.0
+    xmin, xmax, ymin, ymax = cameraTrack.planeBounds( 0, zmax )
+    matrix = cameraTrack.matrix( 0 )
+    position = cameraTrack.position( 0 )
+    frameIndex = trackingData.frameIndex( 1, nbrFrames )
+
+    def perFrame():
+        for f in range( 1, nbrFrames+1 ):
+            samples = [ s for s in ( frameIndex.sampleAt( t, f ) for t in range( len(trackingData) ) ) if s >= 0 ]
+            if samples:
+                unprojectSamples( [ trackingData.u[s] for s in samples ], [ trackingData.v[s] for s in samples ],
+                                  xmin, xmax, ymin, ymax, zmax, matrix, position )
+
+    samples = trackingData.sampleCount()
+    allSeconds = timeIt( lambda: unprojectSamples( trackingData.u, trackingData.v, xmin, xmax, ymin, ymax, zmax, matrix, position ) )
+    perFrameSeconds = timeIt( perFrame, repeat=1 )
+    return {
+        'trackers': nbrTrackers,
+        'frames': nbrFrames,
+        'gaps': gaps,
+        'samples': samples,
+        'numpy': numpy is not None,
+        'allSamplesSeconds': allSeconds,
+        'allSamplesPerSecond': samples / max( allSeconds, 1e-9 ),
+        'perFrameSeconds': perFrameSeconds,
+        'perFrameSamplesPerSecond': samples / max( perFrameSeconds, 1e-9 ),
+    }
+
+
+def gridMesh( nbrTriangles, size=60.0 ):
+    """
+        Points and triangles of a bumpy square grid facing +z, centered on
+        the origin, of about nbrTriangles triangles.
+    """
+    n = max( 1, int( math.sqrt( nbrTriangles / 2.0 ) ) )
+    points = [ ]
+    for j in range( n+1 ):
+        for i in range( n+1 ):
+            x = size * ( float(i) / n - 0.5 )
+            y = size * ( float(j) / n - 0.5 )
+            points.extend( ( x, y, 0.5 * math.sin( x ) * math.cos( y ) ) )
+    triangles = [ ]
+    for j in range( n ):
+        for i in range( n ):
+            a = j * ( n+1 ) + i
+            b = a + n + 1
+            triangles.extend( ( a, a+1, b+1, a, b+1, b ) )
+    return points, triangles
+
+
+def cameraMatrix( x ):
+    """ World matrix of a camera looking down -z from 20 units away, moved along x """
+    return ( 1.0, 0.0, 0.0, 0.0,
+             0.0, 1.0, 0.0, 0.0,
+             0.0, 0.0, 1.0, 0.0,
+             x, 0.0, 20.0, 1.0 )
+
+
+def cameraX( frame, nbrFrames ):
+    """ The camera trucks 10 units over the range """
+    return -5.0 + 10.0 * ( frame - 1 ) / max( 1, nbrFrames - 1 )
+
+
+def benchmarkUndistortion( nbrTrackers=800, nbrFrames=3000, gaps='none', seed=0 ):
+    """
+        Time to undistort all the samples of the synthetic tracks at once
+        through a lens with radial, tangential and squeeze terms.
+    """
+    trackingData = syntheticTrackingData( nbrTrackers, nbrFrames, gaps, seed=seed )
+    lens = LensDistortion( k1=-0.08, k2=0.02, k3=-0.004, p1=0.001, p2=-0.0015, squeeze=1.3 )
+    u, v = trackingData.u, trackingData.v
+
+    def undistort():
+        trackingData.u, trackingData.v = u, v
+        undistortTrackingData( trackingData, lens, 1920, 1080 )
+
+    seconds = timeIt( undistort )
+    return {
+        'trackers': nbrTrackers,
+        'frames': nbrFrames,
+        'samples': trackingData.sampleCount(),
+        'numpy': numpy is not None,
+        'undistortSeconds': seconds,
+        'samplesPerSecond': trackingData.sampleCount() / max( seconds, 1e-9 ),
+    }
+
+
+def benchmarkRaycast( nbrTrackers=800, nbrFrames=3000, triangles=20000, seed=0 ):
+    """
+        Build and refit time of the TriangleBVH of a grid mesh and the time
+        to intersect a ray per tracker on every frame, all the rays of a frame
+        together and one ray at a time. The frames are capped to
+        RAYCAST_FRAMES, the single rays are timed on the first frame.
+    """
+    points, tris = gridMesh( triangles )
+    r = random.Random( seed )
+    nbrFrames = min( nbrFrames, RAYCAST_FRAMES )
+    rays = [ ]
+    for f in range( 1, nbrFrames+1 ):
+        origin = ( cameraX( f, nbrFrames ), 0.0, 20.0 )
+        directions = [ ]
+        for t in range( nbrTrackers ):
+            target = ( r.uniform( -25.0, 25.0 ), r.uniform( -25.0, 25.0 ), 0.0 )
+            d = [ target[a] - origin[a] for a in range(3) ]
+            length = math.sqrt( sum( c * c for c in d ) )
+            directions.append( tuple( c / length for c in d ) )
+        rays.append( ( [ origin ] * nbrTrackers, directions ) )
+
+    buildSeconds = timeIt( lambda: TriangleBVH( points, tris ), repeat=1 )
+    bvh = TriangleBVH( points, tris )
+    movedPoints = [ c + 0.01 for c in points ]
+    refitSeconds = timeIt( lambda: bvh.refit( movedPoints ), repeat=1 )
+    bvh = TriangleBVH( points, tris )
+    hits = [ 0 ]
+
+    def intersectMany():
+        hits[0] = 0
+        for origins, directions in rays:
+            hits[0] += sum( 1 for hit in bvh.intersectMany( origins, directions ) if hit[0] )
+
+    def intersect():
+        origins, directions = rays[0]
+        for origin, direction in zip( origins, directions ):
+            bvh.intersect( origin, direction )
+
+    nbrRays = nbrTrackers * nbrFrames
+    manySeconds = timeIt( intersectMany, repeat=1 )
+    return {
+        'trackers': nbrTrackers,
+        'frames': nbrFrames,
+        'triangles': bvh.triangleCount(),
+        'numpy': numpy is not None,
+        'rays': nbrRays,
+        'hitRate': float( hits[0] ) / max( 1, nbrRays ),
+        'bvhBuildSeconds': buildSeconds,
+        'bvhRefitSeconds': refitSeconds,
+        'intersectManySeconds': manySeconds,
+        'intersectManyRaysPerSecond': nbrRays / max( manySeconds, 1e-9 ),
+        'intersectSecondsPerRay': timeIt( intersect, repeat=1 ) / max( 1, nbrTrackers ),
+    }
+
+
+def waveMesh( points, nbrFrames ):
+    """ Function of the frame deforming the grid mesh points with a wave going across it once over the range """
+    def deformed( frame ):
+        phase = 2.0 * math.pi * ( frame - 1 ) / max( 1, nbrFrames - 1 )
+        result = list( points )
+        for i in range( 0, len(result), 3 ):
+            result[i+2] += math.sin( 0.2 * result[i] + phase )
+        return result
+    return deformed
+
+
+def standInScene( nbrFrames, triangles, deforming=False ):
+    """
+        trackerMayaStandIn scene with a camera trucking over the grid mesh
+        groundShape, filling most of the frame. A deforming mesh has a
+        deformer on its inMesh making a wave go across it.
+    """
+    scene = trackerMayaStandIn.StandInScene( 1, nbrFrames )
+    scene.addCamera( 'cameraShape1', lambda frame: {
+        'focalLength': 35.0,
+        'horizontalFilmAperture': 36.0 / 25.4,
+        'verticalFilmAperture': 24.0 / 25.4,
+        'lensSqueezeRatio': 1.0,
+        'worldMatrix': cameraMatrix( cameraX( frame, nbrFrames ) ),
+    } )
+    points, tris = gridMesh( triangles )
+    scene.addMesh( 'groundShape', waveMesh( points, nbrFrames ) if deforming else points, tris )
+    return scene
+
+
+def benchmarkProjection( nbrTrackers=800, nbrFrames=3000, gaps='none', triangles=20000, seed=0, backend='bvh', deforming=False, processes=1 ):
+    """
+        Runs the frame loop of createLocatorsAnimProjectCam on a grid mesh,
+        deforming or not, with a raycast backend ('bvh' or 'cache'), stick
+        to last hit and the normals, against the stand-in maya modules,
+        into a PointCloudWriter. Gives the time of every profiled phase.
+        The frames are capped to PROJECTION_FRAMES, the cache backend can
+        project them in a pool of processes.
+    """
+    nbrFrames = min( nbrFrames, PROJECTION_FRAMES )
+    trackingData = syntheticTrackingData( nbrTrackers, nbrFrames, gaps, seed=seed )
+    scene = standInScene( nbrFrames, triangles, deforming )
+    profiler = trackerProfile.Profiler()
+
+    with trackerMayaStandIn.installed( scene ) as mc:
+        import trackerImport
+
+        def project():
+            keyWriter = trackerImport.PointCloudWriter( trackingData.names, 1, nbrFrames )
+            with quiet():
+                with profiler.active( mc ):
+                    trackerImport.createLocatorsAnimProjectCam( trackingData, 10.0, 'cameraShape1', 0.2, False,
+                                                                targetMesh='groundShape', stickToLastHit=True,
+                                                                inheritNormal=True, stickMode=2, keyWriter=keyWriter,
+                                                                raycastBackend=backend, createNodes=False, processes=processes or None )
+            return keyWriter
+
+        seconds = timeIt( project, repeat=1 )
+        keyCount = project().keyCount
+
+    # the profiler added up both runs
+    phases = { }
+    counters = { }
+    for entry in profiler.report()['phases']:
+        phases[ entry['phase'] ] = entry['seconds'] / 2
+        for name, value in entry['counters'].items():
+            counters[name] = counters.get( name, 0 ) + value // 2
+    return {
+        'trackers': nbrTrackers,
+        'frames': nbrFrames,
+        'gaps': gaps,
+        'backend': backend,
+        'deforming': deforming,
+        'processes': processes,
+        'triangles': len( scene.meshes['groundShape'].triangles ) // 3,
+        'samples': trackingData.sampleCount(),
+        'rays': counters.get( 'rays', 0 ),
+        'keys': keyCount,
+        'totalSeconds': seconds,
+        'framesPerSecond': nbrFrames / max( seconds, 1e-9 ),
+        'phaseSeconds': phases,
+        'counters': counters,
+    }
+
+
+def benchmarkOffsetPlayback( nbrTrackers=500, nbrFrames=240 ):
+    """
+        Playback rate of the tracker offset rigs, the MEL expression per
+        tracker against the native math nodes sharing the camera position,
+        on a moving camera. Needs mayapy, the playback is capped at 240
+        frames per rig.
+    """
+    import maya.standalone
+    try:
+        maya.standalone.initialize()
+    except RuntimeError:
+        pass # already running in Maya
+    import maya.cmds as mc
+    import trackerImport
+
+    nbrFrames = min( nbrFrames, 240 )
+    result = { 'trackers': nbrTrackers, 'frames': nbrFrames }
+    for rig in ( 'expression', 'nodes' ):
+        mc.file( new=True, force=True )
+        camera = mc.camera()[0]
+        mc.setKeyframe( camera, attribute='translateX', t=1, v=0.0 )
+        mc.setKeyframe( camera, attribute='translateX', t=nbrFrames, v=10.0 )
+        trackingData = TrackingData.fromList( syntheticTrackerList( nbrTrackers, 1 ) )
+        trackers, joints = trackerImport.createTrackerNodes( trackingData, camera, 0.2, False, offsetRig=rig )
+        for tracker in trackers:
+            mc.setAttr( '%s.offset' % tracker, 1.0 )
+        plugs = [ '%s.translate' % tracker for tracker in trackers ]
+
+        def play():
+            for f in range( 1, nbrFrames+1 ):
+                mc.currentTime( f )
+                mc.dgeval( plugs )
+
+        result[ '%sFPS' % rig ] = nbrFrames / timeIt( play, repeat=1 )
+    return result
+
+
+BENCHMARKS = {
+    'trackingData': benchmarkTrackingData,
+    'frameIndex': benchmarkFrameIndex,
+    'parsers': benchmarkParsers,
+    'unprojection': benchmarkUnprojection,
+    'undistortion': benchmarkUndistortion,
+    'raycast': benchmarkRaycast,
+    'projection': benchmarkProjection,
+    'offsetPlayback': benchmarkOffsetPlayback,
+}
+
+# command line options passed to the benchmarks taking them
+BENCHMARK_OPTIONS = {
+    'parsers': ( 'gaps', 'seed' ),
+    'unprojection': ( 'gaps', 'seed' ),
+    'undistortion': ( 'gaps', 'seed' ),
+    'raycast': ( 'triangles', 'seed' ),
+    'projection': ( 'gaps', 'triangles', 'seed', 'backend', 'deforming', 'processes' ),
+}
+
+# benchmarks left out of the default run, they need mayapy
+MAYA_BENCHMARKS = ( 'offsetPlayback', )
+
+
+def environment():
+    """ What the results depend on besides the code """
+    return {
+        'python': platform.python_version(),
+        'numpy': numpy.__version__ if numpy is not None else None,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+    }
+
+
+def compareResults( previous, current, prefix='', timings=False ):
+    """
+        Lines comparing the timings of two results, the values of the keys
+        ending in Seconds, the ratio is current / previous.
+    """
+    lines = [ ]
+    for key in sorted( current ):
+        if key not in previous:
+            continue
+        if isinstance( current[key], dict ) and isinstance( previous[key], dict ):
+            lines.extend( compareResults( previous[key], current[key], '%s%s.' % ( prefix, key ), key.endswith( 'Seconds' ) ) )
+        elif ( timings or key.endswith( 'Seconds' ) ) and previous[key]:
+            lines.append( '%-60s %10.4f %10.4f %7.2fx' % ( prefix + key, previous[key], current[key], current[key] / previous[key] ) )
+    return lines
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description='Tracker import benchmarks' )
+    parser.add_argument( 'benchmarks', nargs='*', default=sorted( name for name in BENCHMARKS if name not in MAYA_BENCHMARKS ),
+                         help='benchmarks to run: %s' % ', '.join(sorted(BENCHMARKS.keys())) )
+    parser.add_argument( '--trackers', type=int, default=800 )
+    parser.add_argument( '--frames', type=int, default=3000 )
+    parser.add_argument( '--gaps', choices=GAP_PATTERNS, default='none', help='gap pattern of the synthetic tracks' )
+    parser.add_argument( '--triangles', type=int, default=20000, help='triangles of the target mesh' )
+    parser.add_argument( '--seed', type=int, default=0 )
+    parser.add_argument( '--backend', choices=( 'bvh', 'cache' ), default='bvh', help='raycast backend of the projection' )
+    parser.add_argument( '--deforming', action='store_true', help='project on a deforming mesh' )
+    parser.add_argument( '--processes', type=int, default=1, help='projection processes of the cache backend, 0 for one per cpu' )
+    parser.add_argument( '--output', help='JSON file to write the results to' )
+    parser.add_argument( '--compare', help='JSON results of a previous run to compare the timings with' )
+    args = parser.parse_args( argv )
+
+    results = {}
+    for name in args.benchmarks:
+        options = dict( ( option, getattr( args, option ) ) for option in BENCHMARK_OPTIONS.get( name, () ) )
+        results[name] = BENCHMARKS[name]( args.trackers, args.frames, **options )
+    document = { 'environment': environment(), 'benchmarks': results }
+    print( json.dumps( document, indent=4, sort_keys=True ) )
+
+    if args.output:
+        with open( args.output, 'w' ) as f:
+            json.dump( document, f, indent=4, sort_keys=True )
+    if args.compare:
+        with open( args.compare, 'r' ) as f:
+            previous = json.load( f )
+        print( '%-60s %10s %10s %8s' % ( 'timing', 'previous', 'current', 'ratio' ) )
+        print( '\n'.join( compareResults( previous.get( 'benchmarks', { } ), results ) ) )
+    return document
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,875 @@
+#
+# Parsing of the 2D tracker files supported by trackerImport.
+#
+# This module does not import maya so the parsers can be used and
+# timed outside of a Maya session.
+#
+# Every loader goes through the same streaming layer: the file is
+# iterated one line at a time, nothing is read ahead and the lines
+# are never copied into a list. Tracker samples are returned in our
+# internal format: frame, u, v where u and v are centered in the
+# range -1 to 1.
+#
+# The loaders return a TrackingData object. Names are stored once and the
+# samples of all trackers live in contiguous arrays, but iterating over it
+# still gives the [name, [(frame, u, v), ...]] pairs the rest of
+# trackerImport was written against.
+#
+# Parsed files are kept in a binary cache (see loadTrackingFile) so
+# importing the same file again does not parse the text a second time.
+
+import hashlib
+import multiprocessing
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+
+import trackerProfile
+from trackerLens import undistortTrackingData
+
+# quality of the samples of the formats without a quality column
+DEFAULT_QUALITY = 1.0
+
+# tracker formats, in the order of the trackerImport format menu
+FORMAT_NUKE = 1
+FORMAT_BOUJOU = 2
+FORMAT_SYNTHEYES = 3
+FORMAT_3DE = 4
+FORMAT_PFTRACK = 5
+# detect the format from the file content, see sniffFormat
+FORMAT_AUTO = 6
+
+# formats whose loaders subtract offsetX, offsetY from the samples
+OFFSET_FORMATS = ( FORMAT_SYNTHEYES, FORMAT_3DE )
+
+FORMAT_NAMES = {
+    FORMAT_NUKE: 'Nuke 2D Ascii',
+    FORMAT_BOUJOU: 'Boujou 2D Ascii',
+    FORMAT_SYNTHEYES: 'Syntheyes 2D Ascii',
+    FORMAT_3DE: '3DEqualizer 2D Ascii',
+    FORMAT_PFTRACK: 'PFTrack 2D Ascii',
+}
+
+# bytes read from the start of a file to detect its format
+SNIFF_BYTES = 8192
+# name frame u v files: samples further than this from the center are in
+# pixels, the file is boujou when at least PIXEL_MAJORITY of them are and
+# syntheyes when no more than PIXEL_OUTLIERS are (trackers off the plate)
+PIXEL_THRESHOLD = 2.0
+PIXEL_MAJORITY = 0.5
+PIXEL_OUTLIERS = 0.05
+
+CACHE_DIR_ENV = 'TRACKER_IMPORT_CACHE_DIR'
+CACHE_MAX_BYTES = 1024 * 1024 * 1024
+CACHE_EXTENSION = '.trkcache'
+# point caches of the target mesh written for the length of an import
+# (see trackerImport.meshCachePath), the ones left behind by an import
+# that did not finish are removed once they are this old
+MESH_CACHE_EXTENSION = '.trkmesh'
+MESH_CACHE_MAX_AGE = 24 * 3600
+CACHE_MAGIC = b'TRKC'
+CACHE_VERSION = 2
+# magic, version, tracker count, sample count, names byte size
+CACHE_HEADER = struct.Struct('<4sIIII')
+
+
+class TrackerSamples(object):
+    """
+        Read only sequence of the (frame, u, v) tuples of one tracker.
+        The tuples are built on the fly from the TrackingData arrays.
+    """
+
+    __slots__ = ('data', 'start', 'end')
+
+    def __init__(self, data, start, end):
+        self.data = data
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [ self[j] for j in range(*i.indices(len(self))) ]
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError('tracker sample index out of range')
+        i += self.start
+        return ( self.data.frames[i], self.data.u[i], self.data.v[i] )
+
+    def __iter__(self):
+        frames = self.data.frames
+        u = self.data.u
+        v = self.data.v
+        for i in range(self.start, self.end):
+            yield ( frames[i], u[i], v[i] )
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+class Tracker(object):
+    """
+        View on a single tracker of a TrackingData object. It behaves like
+        the old [name, samples] list: tracker[0] is the name and can be
+        assigned to (createSingleLocator renames the trackers), tracker[1]
+        is the sequence of (frame, u, v) samples.
+    """
+
+    __slots__ = ('data', 'index')
+
+    def __init__(self, data, index):
+        self.data = data
+        self.index = index
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, key):
+        if key == 0:
+            return self.data.names[self.index]
+        elif key == 1:
+            start, end = self.data.sampleRange(self.index)
+            return TrackerSamples(self.data, start, end)
+        raise IndexError('tracker index out of range')
+
+    def __setitem__(self, key, value):
+        if key != 0:
+            raise TypeError('only the tracker name can be assigned')
+        self.data.names[self.index] = value
+
+    def __iter__(self):
+        yield self[0]
+        yield self[1]
+
+
+class FrameIndex(object):
+    """
+        Dense frame to sample lookup for a frame range, built once so the
+        sample of a tracker at a given frame is found in constant time.
+        samples holds one row of nbrFrames entries per tracker, -1 meaning
+        the tracker has no data at that frame. Samples on non integer
+        frames can never match a timeline frame and are left out, if a
+        tracker has several samples on the same frame the first one wins.
+    """
+
+    def __init__(self, trackingData, firstFrame, lastFrame):
+        self.firstFrame = int(firstFrame)
+        self.lastFrame = int(lastFrame)
+        self.nbrFrames = max( 0, self.lastFrame - self.firstFrame + 1 )
+        self.samples = array('l', [-1]) * (self.nbrFrames * len(trackingData))
+
+        frames = trackingData.frames
+        for t in range(len(trackingData)):
+            start, end = trackingData.sampleRange(t)
+            row = (t * self.nbrFrames) - self.firstFrame
+            for i in range(start, end):
+                frame = frames[i]
+                f = int(frame)
+                if f != frame or f < self.firstFrame or f > self.lastFrame:
+                    continue
+                if self.samples[row + f] < 0:
+                    self.samples[row + f] = i
+
+    def sampleAt(self, trackerIndex, frame):
+        """ Returns the sample index of a tracker at a frame or -1 if there is none """
+        f = int(frame)
+        if f != frame or f < self.firstFrame or f > self.lastFrame:
+            return -1
+        return self.samples[(trackerIndex * self.nbrFrames) + f - self.firstFrame]
+
+
+class TrackingData(object):
+    """
+        Columnar storage for the samples of all the trackers of a file.
+            names   - one name per tracker
+            offsets - index of the first sample of each tracker
+            frames, u, v - the samples of all trackers, one after the other
+            quality - per sample quality (PFTrack similarity, SynthEyes
+                      quality), DEFAULT_QUALITY for the other formats
+        The samples of tracker i are in [offsets[i], offsets[i+1]), the last
+        tracker ends at the end of the arrays.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.offsets = array('l')
+        self.frames = array('d')
+        self.u = array('d')
+        self.v = array('d')
+        self.quality = array('d')
+
+    @classmethod
+    def fromList(cls, trackers):
+        """ Builds a TrackingData from a [[name, [(frame, u, v), ...]], ...] list """
+        data = cls()
+        for name, samples in trackers:
+            data.addTracker( name )
+            for frame, u, v in samples:
+                data.addSample( frame, u, v )
+        return data
+
+    def toList(self):
+        """ Returns the data as a [[name, [(frame, u, v), ...]], ...] list """
+        return [ [tracker[0], list(tracker[1])] for tracker in self ]
+
+    def addTracker(self, name):
+        """ Starts a new tracker, the following samples are added to it """
+        self.names.append( name )
+        self.offsets.append( len(self.frames) )
+
+    def addSample(self, frame, u, v, quality=DEFAULT_QUALITY):
+        """ Adds a sample to the last tracker """
+        self.frames.append( frame )
+        self.u.append( u )
+        self.v.append( v )
+        self.quality.append( quality )
+
+    def sampleRange(self, index):
+        """ Returns the start and end index of the samples of a tracker """
+        start = self.offsets[index]
+        if index + 1 < len(self.offsets):
+            end = self.offsets[index+1]
+        else:
+            end = len(self.frames)
+        return start, end
+
+    def frameIndex(self, firstFrame, lastFrame):
+        """ Returns a FrameIndex of the trackers over a frame range """
+        return FrameIndex( self, firstFrame, lastFrame )
+
+    def sampleCount(self):
+        return len(self.frames)
+
+    def extend(self, other, prefix=''):
+        """ Appends the trackers of another TrackingData, prefixing their names """
+        base = len(self.frames)
+        for t, name in enumerate( other.names ):
+            self.names.append( prefix + name )
+            self.offsets.append( base + other.offsets[t] )
+        self.frames.extend( other.frames )
+        self.u.extend( other.u )
+        self.v.extend( other.v )
+        self.quality.extend( other.quality )
+
+    def filtered(self, minQuality=None, minLength=None, namePattern=None):
+        """
+            Returns a TrackingData with only the samples and trackers passing
+            the filters, meant to be applied before any Maya node is made:
+                minQuality - samples of a lower quality are dropped
+                minLength - trackers left with fewer samples are dropped
+                namePattern - regular expression searched in the names
+            Filters left to None are not applied.
+        """
+        pattern = re.compile( namePattern ) if namePattern else None
+        result = TrackingData()
+        for t, name in enumerate( self.names ):
+            if pattern is not None and not pattern.search( name ):
+                continue
+            start, end = self.sampleRange( t )
+            if minQuality is None:
+                keep = range( start, end )
+            else:
+                keep = [ i for i in range( start, end ) if self.quality[i] >= minQuality ]
+            if minLength is not None and len(keep) < minLength:
+                continue
+            result.addTracker( name )
+            for i in keep:
+                result.addSample( self.frames[i], self.u[i], self.v[i], self.quality[i] )
+        return result
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.names)
+        if index < 0 or index >= len(self.names):
+            raise IndexError('tracker index out of range')
+        return Tracker(self, index)
+
+    def __iter__(self):
+        for i in range(len(self.names)):
+            yield Tracker(self, i)
+
+
+def iterFileLines( path ):
+    """
+        Yields the lines of a file one at a time without reading the
+        whole file in memory.
+    """
+    with open( path, 'r' ) as f:
+        for line in f:
+            yield line
+
+
+def iterDataWords( lines ):
+    """
+        Skips empty lines and comment lines (starting with a hash) and
+        yields the whitespace separated words of every other line.
+    """
+    for line in lines:
+        if ((line[:1] == '#') or (line.strip() == '')):
+            continue
+        yield line.split()
+
+
+def nextLine( lines, path ):
+    """
+        Returns the next line of a line iterator, raising a ValueError
+        instead of a StopIteration when the file ends prematurely.
+    """
+    try:
+        return next( lines )
+    except StopIteration:
+        raise ValueError('The tracking file ended unexpectedly: {}'.format(path))
+
+
+def pixelToCentered( value, resolution ):
+    """ Converts a pixel value to our centered -1 to 1 range """
+    return ((float(value) / float(resolution)) * 2.0) - 1.0
+
+
+def loadPFTrackAscii2D( path, plateResX, plateResY, frameOffset ):
+    """
+        Comments start with hash, format is:
+        # "Name"
+        # clipNumber
+        # frameCount
+        # frame, xpos, ypos, similarity
+        # blank line
+        The similarity is kept as the sample quality.
+    """
+    trackingData = TrackingData()
+
+    lines = iterFileLines( path )
+    for line in lines:
+
+        # skip empty lines and comment lines
+        if ((line.strip() == '') or (line[0] == '#')):
+            continue
+
+        words = line.split()
+
+        # test to see if we've advanced to a new marker
+        # which in this case starts with a quote
+        if ( words[0][0] == '"' ):
+            trackingData.addTracker( words[0].strip('"') )
+            # skip the clipnumber and frame count
+            next( lines, None )
+            next( lines, None )
+            continue
+
+        # add this frame to the current marker
+        trackingData.addSample(
+            int(words[0])+frameOffset,
+            pixelToCentered( words[1], plateResX ),
+            pixelToCentered( words[2], plateResY ) * -1.0,
+            float(words[3]) if len(words) > 3 else DEFAULT_QUALITY )
+
+    return trackingData
+
+
+def loadNukeASCII2D( path, plateResX, plateResY, frameOffset ):
+    """
+        Format of a line of tracker data (line#, starting at 1, is frame):
+            xPixelFloat yPixelFloat
+    """
+    # only one tracker per file
+    trackingData = TrackingData()
+    trackingData.addTracker( 'NukeTracker#' )
+
+    frame = 1
+    for words in iterDataWords( iterFileLines( path ) ):
+        # we convert from pixel values to center UV in the
+        # range of -1 to 1
+        trackingData.addSample( frame, pixelToCentered( words[0], plateResX ), pixelToCentered( words[1], plateResY ) * -1.0 )
+        frame += 1
+
+    return trackingData
+
+
+def loadSyntheyes2DTrackerPaths( path, offsetX, offsetY, frameOffset ):
+    """
+        Format of a line of tracker data:
+            trackerName frameInt uValue vValue quality
+        Default syntheyes data is centered, so u(x) values should be
+        between -1 and 1. Likewise for v(y). The quality is kept as the
+        sample quality.
+    """
+    if not os.path.isfile(path):
+        raise IOError('The following tracking file is invalid: {}'.format(path))
+
+    trackingData = TrackingData()
+    currentMarker = ''
+
+    for words in iterDataWords( iterFileLines( path ) ):
+        # test to see if we've advanced to a new marker
+        # words[0] = tracker name
+        if ( words[0] != currentMarker ):
+            currentMarker = words[0]
+            trackingData.addTracker( currentMarker )
+
+        # words[1 to 4] = frame, xpos, ypos, quality
+        trackingData.addSample(
+            int(words[1])+frameOffset,
+            float(words[2])-offsetX,
+            float(words[3])-offsetY,
+            float(words[4]) if len(words) > 4 else DEFAULT_QUALITY )
+
+    return trackingData
+
+
+def load3deTrackerPaths( path, plateResX, plateResY, offsetX, offsetY, frameOffset ):
+    """
+        Format of a line of tracker data:
+            frameInt uValue vValue
+        3d data is in pixel space, so the uValues(x)
+        would be between 0 and 1920 for an HD plate. Our internal format is expected
+        to be from -1 to 1 so we have convert to this ratio based on the plate resolution.
+        The Y value is inverted so we have to to 1-Y after normalizing but before the -1 to 1 range.
+    """
+    if not os.path.isfile(path):
+        raise IOError('The following tracking file is invalid: {}'.format(path))
+
+    lines = iterFileLines( path )
+
+    try:
+        nbrTrackers = int( next( lines, '' ).strip() )
+    except ValueError:
+        raise ValueError('The first line of the tracker file must be an integer representing the number of trackers.')
+
+    trackingData = TrackingData()
+    # Loop through all trackers
+    for t in range(nbrTrackers):
+        trackerName = nextLine( lines, path ).strip()
+        if trackerName[0].isdigit(): # Maya does not support a numeric as a first character
+            trackerName = '_{}'.format(trackerName)
+        nextLine( lines, path ) # skip the line following the tracker name
+        nbrFrames = int( nextLine( lines, path ).strip() ) # extract the number of frames
+        if nbrFrames > 0:
+            trackingData.addTracker( trackerName )
+            for f in range(nbrFrames):
+                lineData = nextLine( lines, path ).split()
+                frameNumber = float(lineData[0]) + frameOffset
+                x = pixelToCentered( lineData[1], plateResX ) - offsetX
+                y = (((1.0 - (float(lineData[2]) / float(plateResY))) * 2.0) - 1.0) - offsetY
+                # Add the data to the tracker
+                trackingData.addSample( frameNumber, x, y )
+
+    return trackingData
+
+
+def loadBoujouTracksFile( path, plateResX, plateResY, offsetX, offsetY, frameOffset ):
+    """
+        Format:
+            # comments start with hash
+            trackerName frameInt uValue vValue
+        Default boujou data is in pixel space, so the uValues(x)
+        would be between 0 and 1920 for an HD plate. Synthese would
+        store this as a u value between -1 and 1 by default. Boujou
+        can be setup of output centered data to match syntheyes.
+    """
+    trackingData = TrackingData()
+    currentMarker = ''
+
+    for words in iterDataWords( iterFileLines( path ) ):
+        # test to see if we've advanced to a new marker
+        # words[0] = tracker name
+        if ( words[0] != currentMarker ):
+            currentMarker = words[0]
+            trackingData.addTracker( currentMarker )
+
+        # words[1 to 3] = frame, xpos, ypos
+        trackingData.addSample(
+            int(words[1])+frameOffset,
+            pixelToCentered( words[2], plateResX ),
+            pixelToCentered( words[3], plateResY ) )
+
+    return trackingData
+
+
+class AmbiguousFormatError(ValueError):
+    """ Raised by sniffFormat when a file could be in more than one format, listed in formats """
+    def __init__(self, message, formats):
+        ValueError.__init__( self, message )
+        self.formats = formats
+
+    def __reduce__(self):
+        # keeps the formats when a worker process raises it
+        return ( AmbiguousFormatError, ( self.args[0], self.formats ) )
+
+
+def isNumber( word ):
+    try:
+        float( word )
+        return True
+    except ValueError:
+        return False
+
+
+def isInteger( word ):
+    try:
+        int( word )
+        return True
+    except ValueError:
+        return False
+
+
+def sniffFormat( path, size=SNIFF_BYTES ):
+    """
+        Returns the FORMAT_* of a tracking file from the structure of its
+        first few KB, without parsing the rest of it:
+            PFTrack - a quoted tracker name, clip number, frame count, then
+                      frame x y [similarity] rows
+            3DE - a tracker count on the first line, then per tracker a
+                  name, a line, a frame count and frame x y rows
+            Nuke - x y rows
+            Syntheyes / Boujou - name frame u v [quality] rows, Syntheyes
+                  data is centered in -1 to 1, Boujou's is in pixels or
+                  has boujou in its header comments
+        Raises a ValueError, naming the offending line, when the start of
+        the file matches none of them, and an AmbiguousFormatError when
+        it cannot tell Syntheyes from Boujou data.
+    """
+    if not os.path.isfile( path ):
+        raise IOError('The following tracking file is invalid: {}'.format(path))
+    with open( path, 'r' ) as f:
+        head = f.read( size )
+        complete = not f.read( 1 )
+    lines = head.splitlines()
+    if not complete and lines:
+        lines.pop() # the last line may be cut
+    rows = [ (n+1, line.split()) for n, line in enumerate( lines )
+             if line.strip() and line[:1] != '#' ]
+    if not rows:
+        raise ValueError('The tracking file has no data: {}'.format(path))
+
+    def malformed( lineNumber, format ):
+        return ValueError('Line {} of {} is not valid {} data: {}'.format(
+            lineNumber, path, FORMAT_NAMES[format], lines[lineNumber-1].strip() ))
+
+    firstLine, words = rows[0]
+
+    if words[0][:1] == '"':
+        # name, clip number, frame count, then the frames
+        i = 1
+        while i < len(rows):
+            lineNumber, words = rows[i]
+            if words[0][:1] == '"':
+                if i + 2 >= len(rows):
+                    break
+                for n in (1, 2):
+                    if len(rows[i+n][1]) != 1 or not isInteger( rows[i+n][1][0] ):
+                        raise malformed( rows[i+n][0], FORMAT_PFTRACK )
+                i += 3
+                continue
+            if i < 3 and ( len(words) != 1 or not isInteger( words[0] ) ):
+                raise malformed( lineNumber, FORMAT_PFTRACK )
+            if i >= 3 and ( len(words) < 3 or not isInteger( words[0] ) or not all( isNumber(w) for w in words[1:] ) ):
+                raise malformed( lineNumber, FORMAT_PFTRACK )
+            i += 1
+        return FORMAT_PFTRACK
+
+    if len(words) == 1 and isInteger( words[0] ):
+        # 3de: count, then name, line, frame count and frames per tracker
+        lines3de = [ line.split() for line in lines[1:] ]
+        i = 0
+        while i + 2 < len(lines3de):
+            nbrFrames = lines3de[i+2]
+            if len(nbrFrames) != 1 or not isInteger( nbrFrames[0] ):
+                raise malformed( i + 4, FORMAT_3DE )
+            i += 3
+            for f in range( int( nbrFrames[0] ) ):
+                if i >= len(lines3de):
+                    break
+                row = lines3de[i]
+                if len(row) < 3 or not all( isNumber(w) for w in row[:3] ):
+                    raise malformed( i + 2, FORMAT_3DE )
+                i += 1
+        return FORMAT_3DE
+
+    if len(words) == 2:
+        for lineNumber, words in rows:
+            if len(words) != 2 or not all( isNumber(w) for w in words ):
+                raise malformed( lineNumber, FORMAT_NUKE )
+        return FORMAT_NUKE
+
+    if len(words) >= 4:
+        # boujou writes its name in the header comments
+        boujouHeader = any( 'boujou' in line.lower() for line in lines if line[:1] == '#' )
+        for lineNumber, words in rows:
+            if len(words) < 4 or not isInteger( words[1] ) or not all( isNumber(w) for w in words[2:] ):
+                raise malformed( lineNumber, FORMAT_BOUJOU if boujouHeader else FORMAT_SYNTHEYES )
+        if boujouHeader:
+            return FORMAT_BOUJOU
+        # otherwise tell them apart from the coordinates, a tracker going
+        # off the plate takes syntheyes data a little outside -1 to 1 so
+        # only samples far out of it are taken as pixels
+        nbrPixels = sum( 1 for lineNumber, words in rows
+                         if max( abs( float(words[2]) ), abs( float(words[3]) ) ) > PIXEL_THRESHOLD )
+        if nbrPixels >= len(rows) * PIXEL_MAJORITY:
+            return FORMAT_BOUJOU
+        if nbrPixels <= len(rows) * PIXEL_OUTLIERS:
+            return FORMAT_SYNTHEYES
+        raise AmbiguousFormatError(
+            'Cannot tell if {} is {} or {} data, {} of its first {} samples look like pixels. Choose the format instead of detecting it.'.format(
+                path, FORMAT_NAMES[FORMAT_SYNTHEYES], FORMAT_NAMES[FORMAT_BOUJOU], nbrPixels, len(rows) ),
+            ( FORMAT_SYNTHEYES, FORMAT_BOUJOU ) )
+
+    raise ValueError('Unknown tracking file format, line {} of {}: {}'.format(
+        firstLine, path, lines[firstLine-1].strip() ))
+
+
+LOADERS = {
+    FORMAT_NUKE: lambda path, resX, resY, offsetX, offsetY, frameOffset: loadNukeASCII2D( path, resX, resY, frameOffset ),
+    FORMAT_BOUJOU: loadBoujouTracksFile,
+    FORMAT_SYNTHEYES: lambda path, resX, resY, offsetX, offsetY, frameOffset: loadSyntheyes2DTrackerPaths( path, offsetX, offsetY, frameOffset ),
+    FORMAT_3DE: load3deTrackerPaths,
+    FORMAT_PFTRACK: lambda path, resX, resY, offsetX, offsetY, frameOffset: loadPFTrackAscii2D( path, resX, resY, frameOffset ),
+}
+
+
+def defaultCacheDir():
+    """ The cache lives in the user home unless TRACKER_IMPORT_CACHE_DIR is set """
+    return os.environ.get( CACHE_DIR_ENV, os.path.join( os.path.expanduser('~'), '.trackerImportCache' ) )
+
+
+def cacheKey( path, format, plateResX, plateResY, offsetX, offsetY, frameOffset ):
+    """
+        Returns the cache key of a tracking file. Any change to the file
+        (modification time or size) or to the parameters the samples are
+        normalized with gives a different key, so stale entries are never
+        read back and simply age out of the cache.
+    """
+    stat = os.stat( path )
+    key = repr( (os.path.abspath(path), stat.st_mtime, stat.st_size, format,
+                 float(plateResX), float(plateResY), float(offsetX), float(offsetY), float(frameOffset),
+                 sys.byteorder, CACHE_VERSION) )
+    return hashlib.sha1( key.encode('utf-8') ).hexdigest()
+
+
+def writeTrackingDataFile( trackingData, path ):
+    """
+        Writes the tracking data as a flat binary file:
+        header, tracker names (utf-8, newline separated), offsets (int32),
+        then the frames, u, v and quality columns (float64) one after the other.
+    """
+    names = '\n'.join( trackingData.names ).encode('utf-8')
+    offsets = array( 'i', trackingData.offsets )
+    with open( path, 'wb' ) as f:
+        f.write( CACHE_HEADER.pack( CACHE_MAGIC, CACHE_VERSION, len(trackingData), trackingData.sampleCount(), len(names) ) )
+        f.write( names )
+        offsets.tofile( f )
+        trackingData.frames.tofile( f )
+        trackingData.u.tofile( f )
+        trackingData.v.tofile( f )
+        trackingData.quality.tofile( f )
+
+
+def readTrackingDataFile( path ):
+    """ Reads back a file written by writeTrackingDataFile, the columns are read in bulk """
+    trackingData = TrackingData()
+    with open( path, 'rb' ) as f:
+        magic, version, nbrTrackers, nbrSamples, namesSize = CACHE_HEADER.unpack( f.read( CACHE_HEADER.size ) )
+        if magic != CACHE_MAGIC or version != CACHE_VERSION:
+            raise ValueError('Not a tracking data cache file: {}'.format(path))
+        names = f.read( namesSize ).decode('utf-8')
+        trackingData.names = names.split('\n') if nbrTrackers else []
+        offsets = array('i')
+        offsets.fromfile( f, nbrTrackers )
+        trackingData.offsets = array( 'l', offsets )
+        trackingData.frames.fromfile( f, nbrSamples )
+        trackingData.u.fromfile( f, nbrSamples )
+        trackingData.v.fromfile( f, nbrSamples )
+        trackingData.quality.fromfile( f, nbrSamples )
+    return trackingData
+
+
+def trimCache( cacheDir, maxBytes ):
+    """
+        Deletes the least recently used cache files until the cache fits in
+        maxBytes. Reading an entry touches its modification time so the
+        modification time is the last use. Mesh caches do not count, they
+        are deleted once older than MESH_CACHE_MAX_AGE, an import still
+        running may be using the newer ones.
+    """
+    entries = []
+    now = time.time()
+    for name in os.listdir( cacheDir ):
+        if not name.endswith( CACHE_EXTENSION ) and not name.endswith( MESH_CACHE_EXTENSION ):
+            continue
+        path = os.path.join( cacheDir, name )
+        try:
+            stat = os.stat( path )
+            if name.endswith( MESH_CACHE_EXTENSION ):
+                if now - stat.st_mtime > MESH_CACHE_MAX_AGE:
+                    os.remove( path )
+                continue
+        except OSError:
+            continue
+        entries.append( (stat.st_mtime, stat.st_size, path) )
+
+    total = sum( entry[1] for entry in entries )
+    for mtime, size, path in sorted( entries ):
+        if total <= maxBytes:
+            break
+        try:
+            os.remove( path )
+        except OSError:
+            continue
+        total -= size
+
+
+def loadTrackingFile( path, format, plateResX, plateResY, offsetX, offsetY, frameOffset,
+                      useCache=True, cacheDir=None, cacheMaxBytes=CACHE_MAX_BYTES ):
+    """
+        Loads a tracking file with the loader of its format (FORMAT_*). When
+        useCache is on, the parsed data is stored in a binary cache and a
+        later import of the same unchanged file with the same parameters
+        reads the cache instead of parsing the text.
+        FORMAT_AUTO detects the format with sniffFormat.
+    """
+    if format == FORMAT_AUTO:
+        format = sniffFormat( path )
+    if format not in LOADERS:
+        raise ValueError('Unknown tracker format: {}'.format(format))
+    loader = LOADERS[format]
+    if not useCache:
+        return loader( path, plateResX, plateResY, offsetX, offsetY, frameOffset )
+
+    cacheDir = cacheDir or defaultCacheDir()
+    cachePath = os.path.join( cacheDir, cacheKey( path, format, plateResX, plateResY, offsetX, offsetY, frameOffset ) + CACHE_EXTENSION )
+
+    if os.path.isfile( cachePath ):
+        try:
+            trackingData = readTrackingDataFile( cachePath )
+            os.utime( cachePath, None )
+            return trackingData
+        except (IOError, OSError, ValueError, EOFError, struct.error):
+            # unreadable or truncated entry, parse the file again
+            pass
+
+    trackingData = loader( path, plateResX, plateResY, offsetX, offsetY, frameOffset )
+
+    try:
+        if not os.path.isdir( cacheDir ):
+            os.makedirs( cacheDir )
+        # write under a temporary name so a concurrent import never reads a partial file
+        tempPath = '{}.{}.tmp'.format( cachePath, os.getpid() )
+        writeTrackingDataFile( trackingData, tempPath )
+        if os.path.exists( cachePath ):
+            os.remove( cachePath )
+        os.rename( tempPath, cachePath )
+        trimCache( cacheDir, cacheMaxBytes )
+    except (IOError, OSError) as e:
+        print( 'Could not write the tracking data cache: {}'.format(e) )
+
+    return trackingData
+
+
+def filePrefix( path ):
+    """ Tracker name prefix for a file of a multi file import, a valid Maya name """
+    name = os.path.splitext( os.path.basename( path ) )[0]
+    name = re.sub( r'[^A-Za-z0-9_]', '_', name )
+    if name[:1].isdigit():
+        name = '_' + name
+    return name + '_'
+
+
+def loadTrackingFileJob( job ):
+    """ loadTrackingFile on a tuple of arguments, run in the worker processes """
+    return loadTrackingFile( *job )
+
+
+def poolContext():
+    """
+        The multiprocessing context to start worker processes with, None
+        when they cannot be started safely. Outside of Maya, and in mayapy
+        or another python interpreter of a batch job, there is no GUI and
+        the platform default is fine (fork on Linux). In an interactive
+        Maya session forking would copy the whole application, its Qt GUI
+        included, which can deadlock the workers, so new interpreters are
+        spawned from mayapy instead. Python 2 has no start method to choose
+        from, there the work is done in this process.
+    """
+    mayaLocation = os.environ.get( 'MAYA_LOCATION' )
+    executable = os.path.basename( sys.executable ).lower()
+    if not mayaLocation or executable.startswith( ( 'mayapy', 'python' ) ):
+        return multiprocessing
+    mayapy = os.path.join( mayaLocation, 'bin', 'mayapy.exe' if sys.platform == 'win32' else 'mayapy' )
+    if not hasattr( multiprocessing, 'get_context' ) or not os.path.isfile( mayapy ):
+        return None
+    context = multiprocessing.get_context( 'spawn' )
+    # only read when spawning, the maya executable cannot run the workers
+    context.set_executable( mayapy )
+    return context
+
+
+def processPool( processes ):
+    """
+        A multiprocessing pool for the parsers and the projection, from
+        poolContext. None when worker processes cannot be started safely,
+        the caller does the work itself.
+    """
+    context = poolContext()
+    if context is None:
+        return None
+    return context.Pool( processes )
+
+
+def loadTrackingFiles( paths, formats, plateResX, plateResY, offsetX, offsetY, frameOffset,
+                       prefixes=None, processes=None, useCache=True, cacheDir=None, lensDistortion=None ):
+    """
+        Loads several tracking files at once and merges them into a single
+        TrackingData. The files are parsed concurrently in a process pool,
+        so the time taken is about the one of the slowest file.
+            formats - one FORMAT_* for all files or one per file
+            prefixes - prepended to the tracker names of each file, by
+                       default the file names when there is more than one
+                       file (see filePrefix)
+            processes - size of the pool, by default one per file up to
+                        the number of cpus, 1 parses in this process
+            lensDistortion - a trackerLens.LensDistortion undistorting
+                             the samples of each file, from where they
+                             were on the plate before the offsets. The
+                             parse cache keeps them as they are in the file
+    """
+    paths = list( paths )
+    if not isinstance( formats, (list, tuple) ):
+        formats = [ formats ] * len(paths)
+    if prefixes is None:
+        prefixes = [ filePrefix( path ) for path in paths ] if len(paths) > 1 else [ '' ] * len(paths)
+
+    jobs = [ ( path, format, plateResX, plateResY, offsetX, offsetY, frameOffset, useCache, cacheDir )
+             for path, format in zip( paths, formats ) ]
+    if processes is None:
+        processes = min( len(jobs), multiprocessing.cpu_count() )
+    pool = processPool( processes ) if processes > 1 and len(jobs) > 1 else None
+    if pool is not None:
+        try:
+            results = pool.map( loadTrackingFileJob, jobs )
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [ loadTrackingFileJob( job ) for job in jobs ]
+
+    trackingData = TrackingData()
+    for result, path, format, prefix in zip( results, paths, formats, prefixes ):
+        if lensDistortion is not None:
+            if format == FORMAT_AUTO:
+                format = sniffFormat( path )
+            lens = lensDistortion.withOffset( offsetX, offsetY ) if format in OFFSET_FORMATS else lensDistortion
+            with trackerProfile.phase( 'undistort' ):
+                undistortTrackingData( result, lens, plateResX, plateResY )
+        trackingData.extend( result, prefix )
+    return trackingData
@@ -7,23 +7,32 @@
 #              2*f
 #
 # camera aperature (film gate) should match the aspect of the
-# plate. lens squeeze ratio should be 1.0. Nothing fancy is
-# currently supported.
+# plate. lens squeeze ratio should be 1.0. The lens is a pinhole,
+# a distorted plate can have its tracks undistorted on import by
+# giving the lens distortion (trackerLens.LensDistortion, radial,
+# tangential and anamorphic squeeze).
 
-# Todo: wrong type - for example, loading syntheyes when set to nuke
-#
+# The tracker file format is checked against its content before
+# importing (trackerData.sniffFormat), or detected with Auto Detect.
 
 import math
 import os
-import re
+from array import array
 import maya
 import maya.OpenMaya as om
 import maya.api.OpenMaya as api
+import maya.api.OpenMayaAnim as apiAnim
 import maya.cmds as mc
 import ConsistentCameraExport
-
-UV_SET_NAME = 'tempUVForTrackerProjection'
-TEMP_UV_GEO_NAME = 'temp_uv_geo'
+import trackerUndo
+import trackerPointCloud
+import trackerProfile
+from trackerLens import LensDistortion
+from trackerData import TrackingData, defaultCacheDir, poolContext, trimCache, CACHE_MAX_BYTES, MESH_CACHE_EXTENSION, loadTrackingFile, loadTrackingFiles, loadPFTrackAscii2D, loadNukeASCII2D, loadSyntheyes2DTrackerPaths, load3deTrackerPaths, loadBoujouTracksFile
+from trackerData import FORMAT_NUKE, FORMAT_BOUJOU, FORMAT_SYNTHEYES, FORMAT_3DE, FORMAT_PFTRACK, FORMAT_AUTO, FORMAT_NAMES, AmbiguousFormatError, sniffFormat
+from trackerPointCache import PointCache, PointCacheWriter, emptyPositions, writePointCache, POINT_CACHE_EXTENSION
+from trackerProjection import CameraTrack, unprojectSamples, transformPoints, barycentricPoint, triangleNormal, normalRotation, TriangleBVH, CachedMeshIntersector, MISS
+from trackerProjection import projectFrames, projectFramesInPool
 
 DEFAULTS = {
     'z': 10,
@@ -38,9 +47,22 @@ DEFAULTS = {
     'targetMesh': '',
     'stickToLastHit': True,
     'inheritNormal': True,
-    'stickMode': 2
+    'stickMode': 2,
+    'raycastBackend': 'maya',
+    'processes': 0,
+    'output': 1,
+    'minQuality': 0.0,
+    'minLength': 0,
+    'nameFilter': ''
 }
 
+# output menu of the UI
+OUTPUT_LOCATORS = 1
+OUTPUT_POINT_CLOUD = 2
+
+# raycast backend menu of the UI, in menu order
+RAYCAST_BACKENDS = ( 'maya', 'bvh', 'cache' )
+
 
 def fnMeshFromName( transformNameOrShapeName ):
     # create an instance of MSelectionList and add to the list the mesh
@@ -64,18 +86,18 @@ def fnMeshFromName( transformNameOrShapeName ):
 
 
 
-def closestRayIntersect( fnMesh, accelParams, point, direction, stickToLastHit=False ):
+def closestRayIntersect( fnMesh, accelParams, point, direction, space=api.MSpace.kWorld ):
     """
         Returns a tuple with the bool hit value and the coords (tuple float) along with
         the hitFace, hitTriangle, hitBary1, hitBary2 which will be used to later to find
         the new position of the surface where it was hit:
         (True, (x,y,z), (hitFace, hitTriangle, hitBary1, hitBary2) )
+        space is the space in which point, direction and the returned coords are.
     """
 
     # [in] parameters
     raySource    = api.MFloatPoint( point[0], point[1], point[2], 1.0 )
     rayDirection = api.MFloatVector( direction[0], direction[1], direction[2] )
-    space        = api.MSpace.kWorld # specifies the space in which raySource and rayDirection are specified
     maxParam     = 999999           # specifies the maximum radius within which hits will be considered
     testBothDirections = False      # specifies that hits in the negative rayDirection should also be considered
     tolerance    = 0.0001           # numerical tolerance- it is wise to allow the routine to consider hits that lie a tiny bit outside mesh triangles
@@ -95,23 +117,317 @@ def closestRayIntersect( fnMesh, accelParams, point, direction, stickToLastHit=F
     # it got a valid hit even if it didn't and the hit location is 0,0,0
     if (hit and not (hit[0][0] == 0.0 and hit[0][1] == 0.0 and hit[0][2] == 0.0)):
         tracePoint = (hit[0].x, hit[0].y, hit[0].z)
-
-        if stickToLastHit:
-            try:
-                hitInfo = fnMesh.getUVAtPoint(api.MPoint(tracePoint), space, uvSet='tempUVForTrackerProjection')
-            except RuntimeError as e:
-                if 'kInvalidParameter' in str(e):
-                    mc.warning('Cannot find a nearest uv at world coordinates: %s %s %s on mesh %s' % (hit[0].x, hit[0].y, hit[0].z, fnMesh.fullPathName()))
-                else:
-                    raise e
-        else:
-            hitInfo = (0,0,0,0)
+        hitInfo = (hit[2], hit[3], hit[4], hit[5])
         return (True, tracePoint, hitInfo)
     else:
         #print "Ray missed."
         return (False, (0,0,0), (0,0,0,0) )
 
 
+def timeContext( frame ):
+    """ DG context evaluating at a frame, or at the current time when frame is None """
+    if frame is None:
+        return api.MDGContext()
+    return api.MDGContext( api.MTime( frame, api.MTime.uiUnit() ) )
+
+
+def plugValueAt( plug, getter, context ):
+    """
+        Evaluates a plug in a DG context without changing the current time,
+        getter is the name of the MPlug method reading the value (asDouble,
+        asMObject...). Maya 2018 replaced the context argument of the
+        getters by MDGContextGuard.
+    """
+    if hasattr( api, 'MDGContextGuard' ):
+        with api.MDGContextGuard( context ):
+            return getattr( plug, getter )()
+    return getattr( plug, getter )( context )
+
+
+@trackerProfile.timed( 'camera' )
+def sampleCameraTrack( cameraShape, frames ):
+    """
+        Reads the focal length, film aperture, lens squeeze and world
+        matrix of a camera on every frame of a range by evaluating its
+        plugs in a time context. The current time is never changed, so the
+        scene is not evaluated as a whole on every frame, only what the
+        camera depends on. Returns a trackerProjection.CameraTrack.
+    """
+    sel = api.MSelectionList()
+    sel.add( cameraShape )
+    dagPath = sel.getDagPath( 0 )
+    dagPath.extendToShape()
+    fnCamera = api.MFnDagNode( dagPath )
+    focalLengthPlug = fnCamera.findPlug( 'focalLength', False )
+    horizontalFilmAperturePlug = fnCamera.findPlug( 'horizontalFilmAperture', False )
+    verticalFilmAperturePlug = fnCamera.findPlug( 'verticalFilmAperture', False )
+    lensSqueezeRatioPlug = fnCamera.findPlug( 'lensSqueezeRatio', False )
+    worldMatrixPlug = fnCamera.findPlug( 'worldMatrix', False ).elementByLogicalIndex( dagPath.instanceNumber() )
+
+    cameraTrack = CameraTrack()
+    for f in frames:
+        context = timeContext( f )
+        matrix = api.MFnMatrixData( plugValueAt( worldMatrixPlug, 'asMObject', context ) ).matrix()
+        cameraTrack.addSample( f,
+                               plugValueAt( focalLengthPlug, 'asDouble', context ),
+                               plugValueAt( horizontalFilmAperturePlug, 'asDouble', context ) * 25.4,
+                               plugValueAt( verticalFilmAperturePlug, 'asDouble', context ) * 25.4,
+                               plugValueAt( lensSqueezeRatioPlug, 'asDouble', context ),
+                               matrix )
+    return cameraTrack
+
+
+class MeshIntersector(object):
+    """
+        Keeps the MFnMesh and the acceleration structure of the target mesh
+        alive across frames instead of building them again on every frame.
+        Rays are cast in the object space of the mesh, so when only the
+        transform of the mesh moves (a rigid prop) the rays are moved into
+        object space and the acceleration structure is kept. It is rebuilt
+        on every frame when something is connected to the mesh inMesh (a
+        deformer or an Alembic cache), which changes the points on nearly
+        every frame anyway, comparing them first would cost about as much.
+        The mesh and its transform are evaluated in a time context, the
+        current time does not have to be changed to project on a frame.
+        Hits can be looked up on any frame already updated, the world
+        matrix of each frame is kept and a deforming mesh is evaluated
+        again at the frame asked for.
+    """
+
+    def __init__(self, meshName):
+        self.dagPath = fnMeshFromName( meshName ).dagPath()
+        fnShape = api.MFnDagNode( self.dagPath )
+        self.outMeshPlug = fnShape.findPlug( 'outMesh', False )
+        self.worldMatrixPlug = fnShape.findPlug( 'worldMatrix', False ).elementByLogicalIndex( self.dagPath.instanceNumber() )
+        self.fnMesh = None
+        self.accelParams = None
+        self.worldMatrix = api.MMatrix()
+        self.inverseMatrix = api.MMatrix()
+        self.deforming = bool( mc.listConnections( '%s.inMesh' % self.dagPath.fullPathName(), source=True, destination=False ) )
+        self.frame = None
+        self.frameMatrices = { } # frame -> world matrix of the mesh
+        self.pastFrame = None # the frame of pastMesh, the mesh evaluated for hits on an earlier frame
+        self.pastMesh = None
+        self.frameCount = 0
+        self.rebuildCount = 0
+        self.pastMeshCount = 0
+
+    @trackerProfile.timed( 'raycast' )
+    def update(self, frame=None):
+        """ Call once per frame, with the frame to project on (None for the current time) """
+        self.frameCount += 1
+        self.frame = frame
+        context = timeContext( frame )
+        self.worldMatrix = api.MFnMatrixData( plugValueAt( self.worldMatrixPlug, 'asMObject', context ) ).matrix()
+        self.inverseMatrix = self.worldMatrix.inverse()
+        self.frameMatrices[frame] = self.worldMatrix
+
+        if self.fnMesh is not None and not self.deforming:
+            return
+
+        fnMesh = api.MFnMesh( plugValueAt( self.outMeshPlug, 'asMObject', context ) )
+        self.rebuild( fnMesh )
+        self.fnMesh = fnMesh
+        self.rebuildCount += 1
+
+    def rebuild(self, fnMesh):
+        """ Builds the acceleration structure of the mesh """
+        if self.fnMesh is not None:
+            self.fnMesh.freeCachedIntersectionAccelerator()
+        self.accelParams = fnMesh.autoUniformGridParams() # octree acceleration structure
+
+    def intersect(self, point, direction):
+        """ Same as closestRayIntersect with a world space ray and result """
+        objectPoint = api.MPoint( point[0], point[1], point[2] ) * self.inverseMatrix
+        objectDirection = api.MVector( direction[0], direction[1], direction[2] ) * self.inverseMatrix
+        hit, hitPos, hitInfo = closestRayIntersect( self.fnMesh, self.accelParams, objectPoint, objectDirection, space=api.MSpace.kObject )
+        if hit:
+            hitPos = asTVec( api.MPoint( hitPos[0], hitPos[1], hitPos[2] ) * self.worldMatrix )
+        return hit, hitPos, hitInfo
+
+    def intersectMany(self, points, directions, hints=None):
+        """
+            intersect for a batch of rays, returns one result per ray. hints
+            are the previous hits of the rays (hitInfo or None), the maya
+            backend has no use for them.
+        """
+        return [ self.intersect( point, direction ) for point, direction in zip( points, directions ) ]
+
+    def meshAt(self, frame):
+        """ The mesh and its world matrix at an updated frame, None for the current one """
+        if frame is None or frame == self.frame:
+            return self.fnMesh, self.worldMatrix
+        if not self.deforming:
+            return self.fnMesh, self.frameMatrices[frame]
+        if frame != self.pastFrame:
+            self.pastMesh = api.MFnMesh( plugValueAt( self.outMeshPlug, 'asMObject', timeContext( frame ) ) )
+            self.pastFrame = frame
+            self.pastMeshCount += 1
+        return self.pastMesh, self.frameMatrices[frame]
+
+    def hitTrianglePoints(self, hitInfo, frame=None):
+        """ Returns the world positions at a frame (None for the current one) of the three vertices of the triangle of a hit """
+        face, triangle, bary1, bary2 = hitInfo
+        fnMesh, worldMatrix = self.meshAt( frame )
+        vertices = fnMesh.getPolygonTriangleVertices( face, triangle )
+        return [ asTVec( fnMesh.getPoint( vertex, api.MSpace.kObject ) * worldMatrix ) for vertex in vertices ]
+
+    def hitPosition(self, hitInfo, frame=None):
+        """
+            Returns the world position of a previous hit at a frame, None
+            for the current one. The hit is kept as (hitFace, hitTriangle,
+            hitBary1, hitBary2) so it follows the surface as the mesh moves
+            or deforms.
+        """
+        p0, p1, p2 = self.hitTrianglePoints( hitInfo, frame )
+        return barycentricPoint( p0, p1, p2, hitInfo[2], hitInfo[3] )
+
+    def hitNormal(self, hitInfo, frame=None):
+        """ Returns the world normal of the triangle of a hit at a frame, None for the current one """
+        p0, p1, p2 = self.hitTrianglePoints( hitInfo, frame )
+        return triangleNormal( p0, p1, p2 )
+
+    def release(self):
+        """ Frees the acceleration structure and prints how often it had to be built """
+        if self.fnMesh is not None:
+            self.fnMesh.freeCachedIntersectionAccelerator()
+        print( 'Target mesh acceleration structure built %d times for %d frames' % (self.rebuildCount, self.frameCount) )
+        if self.pastMeshCount:
+            print( 'Target mesh evaluated again on %d frames for the stuck hits' % self.pastMeshCount )
+
+
+class BVHMeshIntersector(MeshIntersector):
+    """
+        MeshIntersector casting the rays through a trackerProjection.TriangleBVH
+        built from the mesh points and triangles instead of
+        MFnMesh.closestIntersection. All the rays of a frame are
+        intersected together by intersectMany, the rays given the previous
+        hit of their tracker as a hint test its triangle and neighbours
+        before walking the tree. The tree of a deforming mesh is refit to
+        the points of each frame, it is only built again when the topology
+        changes.
+    """
+
+    def __init__(self, meshName):
+        self.bvh = None
+        self.topology = None
+        self.refitCount = 0
+        MeshIntersector.__init__( self, meshName )
+
+    def rebuild(self, fnMesh):
+        points = [ c for p in fnMesh.getPoints( api.MSpace.kObject ) for c in (p.x, p.y, p.z) ]
+        topology = ( fnMesh.numVertices, fnMesh.numPolygons, fnMesh.numFaceVertices )
+        if self.bvh is not None and topology == self.topology:
+            # same triangles on moved points, the boxes are refit
+            self.bvh.refit( points )
+            self.refitCount += 1
+            return
+        self.topology = topology
+        triangleVertices, triangleFaces, triangleIndices = meshTriangles( fnMesh )
+        stats = self.bvh.stats if self.bvh is not None else None
+        self.bvh = TriangleBVH( points, triangleVertices, triangleFaces, triangleIndices )
+        if stats is not None:
+            self.bvh.stats = stats # keep counting across the rebuilds of a deforming mesh
+
+    def intersectMany(self, points, directions, hints=None):
+        objectPoints = [ asTVec( api.MPoint( p[0], p[1], p[2] ) * self.inverseMatrix ) for p in points ]
+        objectDirections = [ asTVec( api.MVector( d[0], d[1], d[2] ) * self.inverseMatrix ) for d in directions ]
+        if hints is not None:
+            hints = [ self.bvh.hintTriangle( hint ) for hint in hints ]
+        results = [ ]
+        for hit, hitPos, hitInfo in self.bvh.intersectMany( objectPoints, objectDirections, hints=hints ):
+            if hit:
+                hitPos = asTVec( api.MPoint( hitPos[0], hitPos[1], hitPos[2] ) * self.worldMatrix )
+            results.append( ( hit, hitPos, hitInfo ) )
+        return results
+
+    def intersect(self, point, direction):
+        return self.intersectMany( [point], [direction] )[0]
+
+    def release(self):
+        summary = self.bvh.statsSummary()
+        self.bvh = None
+        print( 'Target mesh BVH built %d times and refit %d times for %d frames' % (self.rebuildCount - self.refitCount, self.refitCount, self.frameCount) )
+        if self.pastMeshCount:
+            print( 'Target mesh evaluated again on %d frames for the stuck hits' % self.pastMeshCount )
+        print( summary )
+
+
+def meshTriangles( fnMesh ):
+    """
+        The triangles of a mesh the way TriangleBVH takes them: the flat
+        vertex ids of the triangles, then the polygon of each triangle and
+        its index inside of the polygon.
+    """
+    triangleCounts, triangleVertices = fnMesh.getTriangles()
+    triangleFaces = [ ]
+    triangleIndices = [ ]
+    for face, count in enumerate( triangleCounts ):
+        triangleFaces.extend( [face] * count )
+        triangleIndices.extend( range( count ) )
+    return triangleVertices, triangleFaces, triangleIndices
+
+
+def meshCachePath( meshName ):
+    """
+        A point cache path for the vertices of a mesh during an import, in
+        the tracking data cache directory. The caches of earlier imports
+        that did not get to remove theirs are trimmed first.
+    """
+    cacheDir = defaultCacheDir()
+    if not os.path.isdir( cacheDir ):
+        os.makedirs( cacheDir )
+    trimCache( cacheDir, CACHE_MAX_BYTES )
+    name = meshName.replace( '|', '_' ).replace( ':', '_' ).strip( '_' )
+    return os.path.join( cacheDir, 'mesh_%s_%d%s' % ( name, os.getpid(), MESH_CACHE_EXTENSION ) )
+
+
+@trackerProfile.timed( 'meshCache' )
+def cacheMeshPoints( meshName, frames, path ):
+    """
+        Writes the world space vertices of a mesh on consecutive frames to
+        a point cache, for trackerProjection.CachedMeshIntersector. The
+        mesh is evaluated once per frame in a time context, or only once
+        when nothing is connected to its inMesh, its world matrix is then
+        the only thing evaluated on the other frames. The cache is written
+        a frame at a time, it is never all in memory.
+        Returns the triangles of the mesh as meshTriangles does, raises a
+        ValueError when the topology changes over the frames.
+    """
+    frames = list( frames )
+    if not frames:
+        raise ValueError('No frame to cache {} on'.format(meshName))
+    dagPath = fnMeshFromName( meshName ).dagPath()
+    fnShape = api.MFnDagNode( dagPath )
+    outMeshPlug = fnShape.findPlug( 'outMesh', False )
+    worldMatrixPlug = fnShape.findPlug( 'worldMatrix', False ).elementByLogicalIndex( dagPath.instanceNumber() )
+    deforming = bool( mc.listConnections( '%s.inMesh' % dagPath.fullPathName(), source=True, destination=False ) )
+
+    writer = None
+    try:
+        for f in frames:
+            context = timeContext( f )
+            if writer is None or deforming:
+                fnMesh = api.MFnMesh( plugValueAt( outMeshPlug, 'asMObject', context ) )
+                topology = ( fnMesh.numVertices, fnMesh.numPolygons, fnMesh.numFaceVertices )
+                if writer is None:
+                    triangles = meshTriangles( fnMesh )
+                    firstTopology = topology
+                    writer = PointCacheWriter( path, frames[0], len(frames), nbrPoints=fnMesh.numVertices )
+                elif topology != firstTopology:
+                    raise ValueError('The topology of {} changes on frame {}, it cannot be cached'.format( meshName, f ))
+                points = [ c for p in fnMesh.getFloatPoints( api.MSpace.kObject ) for c in (p.x, p.y, p.z) ]
+                trackerProfile.count( 'meshEvaluations' )
+            matrix = api.MFnMatrixData( plugValueAt( worldMatrixPlug, 'asMObject', context ) ).matrix()
+            writer.writeFrame( transformPoints( points, matrix ) )
+    except Exception:
+        if writer is not None:
+            writer.abort()
+        raise
+    writer.close()
+    return triangles
+
+
 def radToDeg( x ):
     return ( x * 57.2957795131 ) # 180/pi
 
@@ -137,245 +453,133 @@ def asTVec( x ):
     return ( x[0], x[1], x[2] )
 
 
-def loadPFTrackAscii2D( path, plateResX, plateResY, frameOffset ):
+class AnimCurveWriter(object):
     """
-        Comments start with hash, format is:
-        # "Name"
-        # clipNumber
-        # frameCount
-        # frame, xpos, ypos, similarity
-        # blank line
+        Collects the keys of the tracker attributes and writes them when
+        flushed. With the api backend each attribute gets its anim curve
+        created once and all its keys added with a single
+        MFnAnimCurve.addKeys call, so the cost depends on the number of
+        curves instead of the number of keys. The cmds backend issues one
+        mc.setKeyframe per key like the importer used to.
+        Keys set twice on the same attribute and frame keep the last value,
+        the same as calling setKeyframe again would.
+        The api curves are connected through a modifier committed as one
+        undo step per flush.
     """
-    with open( path, 'r' ) as f:
-        rawData = f.readlines()
-
-    trackingData = []
-    markerCount = 0
-    currentMarker = ''
-
-    i = 0
-    while i < len(rawData):
-
-        line = rawData[i]
 
-        # skip empty lines and comment lines
-        if ((line.strip() != '') and (line[0] != '#')):
-
-            words = re.split( r'\s+', line )
-
-            # test to see if we've advanced to a new marker
-            # which in this case starts with a quote
-            if ( words[0][0] == '"' ):
-                currentMarker = words[0].strip('"')
-                markerCount += 1
-                trackingData.append( [currentMarker,[]] )
-                i += 3 # skip the clipnumber and frame count
-                continue
-
-            # add this frame to the current marker
-            trackingData[markerCount-1][1].append(
-                (int(words[0])+frameOffset,
-                (((float(words[1])/float(plateResX)) * 2.0) - 1.0),
-                ((((float(words[2])/float(plateResY)) * 2.0) - 1.0) * -1.0) ) )
-
-        # next line
-        i += 1
-
-    return trackingData
-
-
-def loadNukeASCII2D( path, plateResX, plateResY, frameOffset ):
+    def __init__(self, useApi=True):
+        self.useApi = useApi
+        self.attributes = [ ]
+        self.keys = { } # attribute -> (times, values)
+        self.keyCount = 0
+        self.curveCount = 0
+        self.callCount = 0
+
+    def addKey(self, attribute, time, value):
+        if attribute not in self.keys:
+            self.attributes.append( attribute )
+            self.keys[attribute] = ( array('d'), array('d') )
+        times, values = self.keys[attribute]
+        times.append( time )
+        values.append( value )
+
+    def addKeys(self, attribute, times, values):
+        if attribute not in self.keys:
+            self.attributes.append( attribute )
+            self.keys[attribute] = ( array('d'), array('d') )
+        self.keys[attribute][0].extend( times )
+        self.keys[attribute][1].extend( values )
+
+    @trackerProfile.timed( 'keying' )
+    def flush(self):
+        """ Writes all the collected keys and prints how many commands were saved """
+        modifier = api.MDGModifier()
+        for attribute in self.attributes:
+            times, values = self.keys[attribute]
+            if any( times[i] >= times[i+1] for i in range(len(times)-1) ):
+                # out of order or repeated frames, the last value set wins
+                keys = dict( zip( times, values ) )
+                times = sorted( keys )
+                values = [ keys[t] for t in times ]
+            if self.useApi:
+                self.writeCurve( attribute, times, values, modifier )
+            else:
+                for t, v in zip( times, values ):
+                    mc.setKeyframe( attribute, t=t, v=v )
+                    self.callCount += 1
+            self.keyCount += len(times)
+            self.curveCount += 1
+        if self.useApi and self.attributes:
+            modifier.doIt()
+            trackerUndo.commit( modifier )
+        self.attributes = [ ]
+        self.keys = { }
+
+        print( 'Keyed %d keys on %d curves with %d calls (%d mc.setKeyframe calls saved)' % (
+            self.keyCount, self.curveCount, self.callCount, self.keyCount - self.callCount) )
+
+    def writeCurve(self, attribute, times, values, modifier):
+        sel = api.MSelectionList()
+        sel.add( attribute )
+        plug = sel.getPlug( 0 )
+
+        unit = api.MTime.uiUnit()
+        timeArray = api.MTimeArray()
+        for t in times:
+            timeArray.append( api.MTime( t, unit ) )
+
+        fnCurve = apiAnim.MFnAnimCurve()
+        fnCurve.create( plug, modifier )
+        if fnCurve.animCurveType in (apiAnim.MFnAnimCurve.kAnimCurveTA, apiAnim.MFnAnimCurve.kAnimCurveUA):
+            # keys are given in ui units like setKeyframe, angular curves store radians
+            values = [ api.MAngle( v, api.MAngle.uiUnit() ).asRadians() for v in values ]
+        fnCurve.addKeys( timeArray, api.MDoubleArray( values ) )
+        self.callCount += 1
+
+
+class PointCloudWriter(object):
     """
-        Format of a line of tracker data (line#, starting at 1, is frame):
-            xPixelFloat yPixelFloat
+        Takes the place of AnimCurveWriter for the point cloud output: the
+        originalTranslate keys of the trackers are stored in a frames x
+        trackers x 3 array written out as a point cache, no anim curve is
+        created. Keys of other attributes (the normal rotations) are
+        dropped, and so are keys outside of the frame range.
     """
-    with open( path, 'r' ) as f:
-        rawData = f.readlines()
-
-    trackingData = []
 
-    # only one tracker per file
-    markerCount = 1
-    trackingData.append( ['NukeTracker#',[]] )
+    AXES = { 'originalTranslateX': 0, 'originalTranslateY': 1, 'originalTranslateZ': 2 }
 
-    frame = 1
-    for line in rawData:
-        # skip empty lines and comment lines
-        if ((line.strip() == '') or (line[0] == '#')):
-            continue
-        words = re.split( r'\s+', line )
+    def __init__(self, trackerNames, firstFrame, lastFrame):
+        self.names = list( trackerNames )
+        self.trackerIndex = dict( (name, i) for i, name in enumerate( self.names ) )
+        self.firstFrame = firstFrame
+        self.nbrFrames = lastFrame - firstFrame + 1
+        self.positions = emptyPositions( self.nbrFrames, len(self.names) )
+        self.keyCount = 0
 
-        # only one tracker per file, hard coded as [0][1]
-        # we convert from pixel values to center UV in the
-        # range of -1 to 1
-        trackingData[0][1].append( ( frame, (((float(words[0])/float(plateResX)) * 2.0) - 1.0), (((float(words[1])/float(plateResY)) * 2.0) - 1.0) * -1.0 ) )
-        frame += 1
+    def addKey(self, attribute, time, value):
+        name, attr = attribute.rsplit( '.', 1 )
+        axis = self.AXES.get( attr )
+        if axis is None:
+            return
+        f = int( math.floor( time + 0.5 ) ) - self.firstFrame
+        if f < 0 or f >= self.nbrFrames:
+            return
+        self.positions[ ( f * len(self.names) + self.trackerIndex[name] ) * 3 + axis ] = value
+        self.keyCount += 1
 
-    return trackingData
+    def addKeys(self, attribute, times, values):
+        for t, v in zip( times, values ):
+            self.addKey( attribute, t, v )
 
+    def flush(self):
+        print( 'Stored %d keys of %d trackers over %d frames' % ( self.keyCount, len(self.names), self.nbrFrames ) )
 
-def loadSyntheyes2DTrackerPaths( path, offsetX, offsetY, frameOffset ):
-    """
-        Format of a line of tracker data:
-            trackerName frameInt uValue vValue quality
-        Default syntheyes data is centered, so u(x) values should be
-        between -1 and 1. Likewise for v(y).
-    """
-    if not os.path.isfile(path):
-        raise IOError('The following tracking file is invalid: {}'.format(path))
-
-    with open( path, 'r' ) as f:
-        rawData = f.readlines()
-
-    trackingData = []
-    markerCount = 0
-    currentMarker = ''
-
-    for line in rawData:
-        # skip empty lines and comment lines
-        if ((line.strip() == '') or (line[0] == '#')):
-            continue
-        words = re.split( r'\s+', line )
-
-        # test to see if we've advanced to a new marker
-        # words[0] = tracker name
-        if ( words[0] != currentMarker ):
-            currentMarker = words[0]
-            markerCount += 1
-            trackingData.append( [currentMarker,[]] )
-
-        # words[1 to 3] = frame, xpos, ypos
-        trackingData[markerCount-1][1].append(
-            (int(words[1])+frameOffset,
-             float(words[2])-offsetX,
-             float(words[3])-offsetY) )
-
-    return trackingData
-
-def load3deTrackerPaths( path, plateResX, plateResY, offsetX, offsetY, frameOffset ):
-    """
-        Format of a line of tracker data:
-            frameInt uValue vValue
-        3d data is in pixel space, so the uValues(x)
-        would be between 0 and 1920 for an HD plate. Our internal format is expected
-        to be from -1 to 1 so we have convert to this ratio based on the plate resolution.
-        The Y value is inverted so we have to to 1-Y after normalizing but before the -1 to 1 range.
-    """
-    if not os.path.isfile(path):
-        raise IOError('The following tracking file is invalid: {}'.format(path))
+    def write(self, path):
+        writePointCache( path, self.firstFrame, self.nbrFrames, self.names, self.positions )
 
-    with open( path, 'r' ) as f:
-        rawData = f.readlines()
 
-    nbrTrackers = rawData[0].strip()
-    try:
-        nbrTrackers = int(nbrTrackers)
-        rawData = rawData[1:] # remove the number of tracker line
-    except ValueError:
-        raise ValueError('The first line of the tracker file must be an integer representing the number of trackers.')
-
-    trackingData = []
-    # Loop through all trackers
-    for t in range(nbrTrackers):
-        trackerName = rawData[0].strip()
-        if trackerName[0].isdigit(): # Maya does not support a numeric as a first character
-            trackerName = '_{}'.format(trackerName)
-        rawData = rawData[2:] # remove the tracker name and the next line
-        nbrFrames = int(rawData[0].strip()) # extract the number of frames
-        rawData = rawData[1:] # remove the number of frames
-        if nbrFrames > 0:
-            framesData = []
-            for f in range(nbrFrames):
-                lineData = rawData[0].strip().split(' ')
-                frameNumber = float(lineData[0]) + frameOffset
-                x = ((float(lineData[1]) / float(plateResX)) * 2.0) - 1.0 - offsetX
-                y = ((1.0 - (float(lineData[2]) / float(plateResY))) * 2.0) - 1.0 - offsetY
-                # Add the data to the list
-                framesData.append((frameNumber, x, y))
-                rawData = rawData[1:]
-            trackingData.append([trackerName, framesData])
-
-    return trackingData
-
-
-def loadBoujouTracksFile( path, plateResX, plateResY, offsetX, offsetY, frameOffset ):
-    """
-        Format:
-            # comments start with hash
-            trackerName frameInt uValue vValue
-        Default boujou data is in pixel space, so the uValues(x)
-        would be between 0 and 1920 for an HD plate. Synthese would
-        store this as a u value between -1 and 1 by default. Boujou
-        can be setup of output centered data to match syntheyes.
-    """
-    with open( path, 'r' ) as f:
-        rawData = f.readlines()
-
-    trackingData = []
-    markerCount = 0
-    currentMarker = ''
-
-    for line in rawData:
-        # skip empty lines and comment lines
-        if ((line.strip() == '') or (line[0] == '#')):
-            continue
-        words = re.split( r'\s+', line )
-
-        # test to see if we've advanced to a new marker
-        # words[0] = tracker name
-        if ( words[0] != currentMarker ):
-            currentMarker = words[0]
-            markerCount += 1
-            trackingData.append( [currentMarker,[]] )
-
-        # words[1 to 3] = frame, xpos, ypos
-        # trackingData[markerCount-1][1].append(
-        #     (int(words[1])+frameOffset,
-        #      float(words[2])-offsetX,
-        #      float(words[3])-offsetY) )
-        trackingData[markerCount-1][1].append(
-            (int(words[1])+frameOffset,
-             (((float(words[2])/float(plateResX)) * 2.0) - 1.0),
-             (((float(words[3])/float(plateResY)) * 2.0) - 1.0) ) )
-        #((float(words[0])/plateResX) * 2.0) - 1.0
-
-    return trackingData
-
-def createSingleLocator(tracker,
-                        cameraShape,
-                        locatorDisplayScale,
-                        createJoints):
-
-    print( 'Creating tracker: %s' % tracker[0] )
-    loc = mc.spaceLocator( a=True, p=(0,0,0), n=tracker[0] )[0]
-    # Maya will rename the created node in case of conflict with existing name
-    # Set the name back into our data structure to stay consistent
-    # We need to add the root unique identifier | to avoid
-    #conflict with existing locators with the same name in other groups
-    loc = '|%s' % loc
-    tracker[0] = loc
-    # Adjust the locator display scale
-    locShape = mc.listRelatives( loc, s=True, pa=True )[0]
-    mc.setAttr( ('%s.localScaleX' % locShape), locatorDisplayScale )
-    mc.setAttr( ('%s.localScaleY' % locShape), locatorDisplayScale )
-    mc.setAttr( ('%s.localScaleZ' % locShape), locatorDisplayScale )
-    # Adjust the locator color
-    mc.setAttr('%s.overrideEnabled' % locShape, 1)
-    mc.setAttr('%s.overrideRGBColors' % locShape, 1)
-    mc.setAttr('%s.overrideColorR' % locShape, 0.55)
-    mc.setAttr('%s.overrideColorG' % locShape, 0.15)
-    mc.setAttr('%s.overrideColorB' % locShape, 0.05)
-
-    # Add the original translate attribute
-    mc.addAttr(loc, shortName='origt', longName='originalTranslate', attributeType='double3', keyable=True)
-    mc.addAttr(loc, shortName='origtx', longName='originalTranslateX', attributeType='double', parent='originalTranslate', keyable=True)
-    mc.addAttr(loc, shortName='origty', longName='originalTranslateY', attributeType='double', parent='originalTranslate', keyable=True)
-    mc.addAttr(loc, shortName='origtz', longName='originalTranslateZ', attributeType='double', parent='originalTranslate', keyable=True)
-    # Add the offset attribute
-    mc.addAttr(loc, shortName='of', longName='offset', attributeType='double', keyable=True)
-    # Create the expression node and make the connections.
-    exp = mc.createNode('expression', name='%s_exp' % loc)
-    #mc.connectAttr('%s.output[0]' % exp, '%s.translateX' % loc, force=True)
+def offsetExpression( loc, cameraShape ):
+    """ MEL expression pushing a locator along its camera ray by its offset attribute """
     exp_string = '$cam = `firstParentOf %s`;\n' % cameraShape
     exp_string += '$cam_pos = `xform -query -translation -worldSpace $cam`;\n'
     exp_string += '$loc_pos[0] = %s.origtx;\n' % loc
@@ -392,36 +596,222 @@ def createSingleLocator(tracker,
     exp_string += '%s.translateX = $loc_pos[0] + $dir[0];\n' % loc
     exp_string += '%s.translateY = $loc_pos[1] + $dir[1];\n' % loc
     exp_string += '%s.translateZ = $loc_pos[2] + $dir[2];\n' % loc
-    mc.setAttr('%s.expression' % exp, exp_string, type='string')
-
-    # Create a child offset locator
-    locOffset = mc.spaceLocator( a=True, p=(0,0,0), n=('%s_offset' % tracker[0]) )[0]
-    locOffset = '|%s' % locOffset
-    mc.parent( locOffset, loc, relative=True )
-    locOffset = '%s%s' % ( loc, locOffset ) # The pipe character that separates the two is already included in the locOffset name
-    # Adjust the locator display scale
-    locOffsetShape = mc.listRelatives( locOffset, s=True, pa=True )[0]
-    mc.setAttr( ('%s.localScaleX' % locOffsetShape), locatorDisplayScale )
-    mc.setAttr( ('%s.localScaleY' % locOffsetShape), locatorDisplayScale )
-    mc.setAttr( ('%s.localScaleZ' % locOffsetShape), locatorDisplayScale )
-    # Adjust the locator color
-    mc.setAttr('%s.overrideEnabled' % locOffsetShape, 1)
-    mc.setAttr('%s.overrideRGBColors' % locOffsetShape, 1)
-    mc.setAttr('%s.overrideColorR' % locOffsetShape, 0.3)
-    mc.setAttr('%s.overrideColorG' % locOffsetShape, 0.1)
-    mc.setAttr('%s.overrideColorB' % locOffsetShape, 0.8)
-
-    # Create a joint associated with the offset locator
-    if createJoints:
-        mc.select( clear=True )
-        joint_name = loc.replace( 'Tracker', 'Joint')
-        joint = mc.joint( p=(0,0,0), n=joint_name )
-        mc.parentConstraint( locOffset, joint )
-        mc.setAttr( '%s.radius' % joint, locatorDisplayScale * 0.5)
+    return exp_string
+
+
+def createCameraTranslate( modifier, cameraShape, name ):
+    """
+        Queues a decomposeMatrix of the camera world matrix and returns its
+        world translation plug, shared by the offset nodes of all trackers.
+    """
+    if not mc.pluginInfo( 'matrixNodes', q=True, loaded=True ):
+        mc.loadPlugin( 'matrixNodes' )
+    sel = api.MSelectionList()
+    sel.add( cameraShape )
+    dagPath = sel.getDagPath( 0 )
+    dagPath.extendToShape()
+    fnCamera = api.MFnDagNode( dagPath.transform() )
+
+    decompose = modifier.createNode( 'decomposeMatrix' )
+    modifier.renameNode( decompose, '%s_camera_decomposeMatrix' % name )
+    fnDecompose = api.MFnDependencyNode( decompose )
+    modifier.connect( fnCamera.findPlug( 'worldMatrix', False ).elementByLogicalIndex( dagPath.instanceNumber() ),
+                      fnDecompose.findPlug( 'inputMatrix', False ) )
+    return fnDecompose.findPlug( 'outputTranslate', False )
+
+
+def connectOffsetNodes( modifier, loc, cameraTranslate ):
+    """
+        Queues the nodes doing what the offset expression did:
+            translate = originalTranslate + normalize(originalTranslate - camera) * offset
+    """
+    fnLoc = api.MFnDependencyNode( loc )
+    originalTranslate = fnLoc.findPlug( 'originalTranslate', False )
+    offset = fnLoc.findPlug( 'offset', False )
+
+    def createMathNode( nodeType, suffix ):
+        node = modifier.createNode( nodeType )
+        modifier.renameNode( node, '%s_%s' % ( fnLoc.name(), suffix ) )
+        return api.MFnDependencyNode( node )
+
+    # the direction from the camera
+    direction = createMathNode( 'plusMinusAverage', 'offsetDirection' )
+    modifier.newPlugValueInt( direction.findPlug( 'operation', False ), 2 ) # subtract
+    modifier.connect( originalTranslate, direction.findPlug( 'input3D', False ).elementByLogicalIndex( 0 ) )
+    modifier.connect( cameraTranslate, direction.findPlug( 'input3D', False ).elementByLogicalIndex( 1 ) )
+
+    normalize = createMathNode( 'vectorProduct', 'offsetNormalize' )
+    modifier.newPlugValueInt( normalize.findPlug( 'operation', False ), 0 ) # no operation, only normalize
+    modifier.newPlugValueBool( normalize.findPlug( 'normalizeOutput', False ), True )
+    modifier.connect( direction.findPlug( 'output3D', False ), normalize.findPlug( 'input1', False ) )
+
+    scale = createMathNode( 'multiplyDivide', 'offsetScale' )
+    modifier.connect( normalize.findPlug( 'output', False ), scale.findPlug( 'input1', False ) )
+    for axis in 'XYZ':
+        modifier.connect( offset, scale.findPlug( 'input2%s' % axis, False ) )
+
+    result = createMathNode( 'plusMinusAverage', 'offsetTranslate' )
+    modifier.connect( originalTranslate, result.findPlug( 'input3D', False ).elementByLogicalIndex( 0 ) )
+    modifier.connect( scale.findPlug( 'output', False ), result.findPlug( 'input3D', False ).elementByLogicalIndex( 1 ) )
+    modifier.connect( result.findPlug( 'output3D', False ), fnLoc.findPlug( 'translate', False ) )
+
+
+def doubleAttribute( longName, shortName, children=None ):
+    """ A keyable double attribute, or a double3 one when given its three children """
+    fnAttr = api.MFnNumericAttribute()
+    if children:
+        attr = fnAttr.create( longName, shortName, children[0], children[1], children[2] )
     else:
+        attr = fnAttr.create( longName, shortName, api.MFnNumericData.kDouble, 0.0 )
+    fnAttr.keyable = True
+    return attr
+
+
+def setLocatorDisplay( modifier, shape, locatorDisplayScale, color ):
+    """ Queues the display scale and override color of a locator shape """
+    fnShape = api.MFnDependencyNode( shape )
+    for attr in ( 'localScaleX', 'localScaleY', 'localScaleZ' ):
+        modifier.newPlugValueDouble( fnShape.findPlug( attr, False ), locatorDisplayScale )
+    modifier.newPlugValueBool( fnShape.findPlug( 'overrideEnabled', False ), True )
+    modifier.newPlugValueBool( fnShape.findPlug( 'overrideRGBColors', False ), True )
+    for attr, value in zip( ( 'overrideColorR', 'overrideColorG', 'overrideColorB' ), color ):
+        modifier.newPlugValueFloat( fnShape.findPlug( attr, False ), value )
+
+
+def connectParentConstraint( modifier, target, constrained, constraint ):
+    """
+        Queues the connections mc.parentConstraint makes between a target,
+        a constrained joint and the constraint node, without offset.
+    """
+    fnTarget = api.MFnDependencyNode( target )
+    fnConstrained = api.MFnDependencyNode( constrained )
+    fnConstraint = api.MFnDependencyNode( constraint )
+    targetPlug = fnConstraint.findPlug( 'target', False ).elementByLogicalIndex( 0 )
+    def child( name ):
+        return targetPlug.child( fnConstraint.attribute( name ) )
+
+    modifier.connect( fnTarget.findPlug( 'translate', False ), child( 'targetTranslate' ) )
+    modifier.connect( fnTarget.findPlug( 'rotate', False ), child( 'targetRotate' ) )
+    modifier.connect( fnTarget.findPlug( 'scale', False ), child( 'targetScale' ) )
+    modifier.connect( fnTarget.findPlug( 'rotateOrder', False ), child( 'targetRotateOrder' ) )
+    modifier.connect( fnTarget.findPlug( 'rotatePivot', False ), child( 'targetRotatePivot' ) )
+    modifier.connect( fnTarget.findPlug( 'rotatePivotTranslate', False ), child( 'targetRotateTranslate' ) )
+    modifier.connect( fnTarget.findPlug( 'parentMatrix', False ).elementByLogicalIndex( 0 ), child( 'targetParentMatrix' ) )
+    modifier.newPlugValueDouble( child( 'targetWeight' ), 1.0 )
+
+    modifier.connect( fnConstrained.findPlug( 'parentInverseMatrix', False ).elementByLogicalIndex( 0 ),
+                      fnConstraint.findPlug( 'constraintParentInverseMatrix', False ) )
+    modifier.connect( fnConstrained.findPlug( 'rotatePivot', False ), fnConstraint.findPlug( 'constraintRotatePivot', False ) )
+    modifier.connect( fnConstrained.findPlug( 'rotatePivotTranslate', False ), fnConstraint.findPlug( 'constraintRotateTranslate', False ) )
+    modifier.connect( fnConstrained.findPlug( 'rotateOrder', False ), fnConstraint.findPlug( 'constraintRotateOrder', False ) )
+    modifier.connect( fnConstrained.findPlug( 'jointOrient', False ), fnConstraint.findPlug( 'constraintJointOrient', False ) )
+    modifier.connect( fnConstraint.findPlug( 'constraintTranslate', False ), fnConstrained.findPlug( 'translate', False ) )
+    modifier.connect( fnConstraint.findPlug( 'constraintRotate', False ), fnConstrained.findPlug( 'rotate', False ) )
+
+
+@trackerProfile.timed( 'nodes' )
+def createTrackerNodes( trackingData,
+                        cameraShape,
+                        locatorDisplayScale,
+                        createJoints,
+                        trackerGroupName=None,
+                        jointGroupName=None,
+                        offsetRig='nodes' ): # 'nodes' = native math nodes, 'expression' = one MEL expression per tracker
+    """
+        Creates the locator, offset locator and joint of every tracker, and
+        the groups holding them when group names are given, all through one
+        MDagModifier. The nodes are created and named in a first pass, the
+        attributes, expressions and constraints are queued in a second one
+        once Maya has resolved the name conflicts. The modifier is committed
+        as a single undo step.
+        The offset along the camera ray is done by a few native math nodes
+        per tracker all reading the camera position from one shared
+        decomposeMatrix, or by the MEL expressions the importer used to
+        create with offsetRig='expression'.
+        The tracker names in trackingData are set to the locators' full
+        paths. Returns the locator and joint (None without joints) lists.
+    """
+    modifier = api.MDagModifier()
+
+    def createTransform( name, parent, nodeType='transform' ):
+        if parent is None:
+            node = modifier.createNode( nodeType )
+        else:
+            node = modifier.createNode( nodeType, parent )
+        modifier.renameNode( node, name )
+        return node
+
+    def createLocator( name, parent ):
+        transform = createTransform( name, parent )
+        shape = modifier.createNode( 'locator', transform )
+        modifier.renameNode( shape, '%sShape' % name )
+        return transform, shape
+
+    trackerGroup = None
+    if trackerGroupName:
+        trackerGroup = createTransform( trackerGroupName, None )
+    jointGroup = None
+    if createJoints and jointGroupName:
+        jointGroup = createTransform( jointGroupName, None )
+
+    # first pass - the dag nodes
+    nodes = [ ]
+    for tracker in trackingData:
+        print( 'Creating tracker: %s' % tracker[0] )
+        loc, locShape = createLocator( tracker[0], trackerGroup )
+        locOffset, locOffsetShape = createLocator( '%s_offset' % tracker[0], loc )
         joint = None
+        if createJoints:
+            joint = createTransform( tracker[0].replace( 'Tracker', 'Joint' ), jointGroup, 'joint' )
+        nodes.append( ( loc, locShape, locOffset, locOffsetShape, joint ) )
+    modifier.doIt()
+
+    # second pass - the attributes and connections, Maya renamed the nodes
+    # in case of conflict with existing names so read them back
+    result_trackers = [ ]
+    result_joints = [ ]
+    for tracker, ( loc, locShape, locOffset, locOffsetShape, joint ) in zip( trackingData, nodes ):
+        locPath = api.MFnDagNode( loc ).fullPathName()
+        tracker[0] = locPath
+        result_trackers.append( locPath )
+
+        setLocatorDisplay( modifier, locShape, locatorDisplayScale, ( 0.55, 0.15, 0.05 ) )
+        setLocatorDisplay( modifier, locOffsetShape, locatorDisplayScale, ( 0.3, 0.1, 0.8 ) )
+
+        # Add the original translate and offset attributes
+        children = [ doubleAttribute( 'originalTranslate%s' % axis, 'origt%s' % axis.lower() ) for axis in 'XYZ' ]
+        modifier.addAttribute( loc, doubleAttribute( 'originalTranslate', 'origt', children ) )
+        modifier.addAttribute( loc, doubleAttribute( 'offset', 'of' ) )
+
+        # Create a joint associated with the offset locator
+        if joint is not None:
+            fnJoint = api.MFnDagNode( joint )
+            modifier.newPlugValueDouble( fnJoint.findPlug( 'radius', False ), locatorDisplayScale * 0.5 )
+            constraint = modifier.createNode( 'parentConstraint', joint )
+            modifier.renameNode( constraint, '%s_parentConstraint1' % fnJoint.name() )
+            connectParentConstraint( modifier, locOffset, joint, constraint )
+            result_joints.append( fnJoint.fullPathName() )
+        else:
+            result_joints.append( None )
+    modifier.doIt()
+
+    # third pass - push the locators along their camera ray by their
+    # offset, the dynamic attributes exist now
+    if offsetRig == 'expression':
+        for loc, locPath in zip( nodes, result_trackers ):
+            exp = modifier.createNode( 'expression' )
+            modifier.renameNode( exp, '%s_exp' % api.MFnDagNode( loc[0] ).name() )
+            modifier.newPlugValueString( api.MFnDependencyNode( exp ).findPlug( 'expression', False ),
+                                         offsetExpression( locPath, cameraShape ) )
+    else:
+        cameraTranslate = createCameraTranslate( modifier, cameraShape, trackerGroupName or 'tracker' )
+        for loc in nodes:
+            connectOffsetNodes( modifier, loc[0], cameraTranslate )
+    modifier.doIt()
+
+    trackerUndo.commit( modifier )
+    return result_trackers, result_joints
 
-    return loc, joint
 
 def createLocators( trackingData,
                     xmin,
@@ -433,34 +823,40 @@ def createLocators( trackingData,
                     cameraShape,
                     camPosMVector,
                     locatorDisplayScale,
-                    createJoints ):
-    xExtent = abs( xmax - xmin ) * 0.5
-    yExtent = abs( ymax - ymin ) * 0.5
-    xCenter = ( xmax + xmin ) * 0.5 # average of max and min
-    yCenter = ( ymax + ymin ) * 0.5 # average of max and min
-
-    result_trackers = [ ]
-    result_joints = [ ]
-    for tracker in trackingData:
-        loc, joint = createSingleLocator( tracker, cameraShape, locatorDisplayScale, createJoints )
-        result_trackers.append( loc )
-        if createJoints:
-            result_joints.append( joint )
-        for frameData in tracker[1]:
-            fnum = frameData[0]
-            u = frameData[1]
-            v = frameData[2]
-
-            x = ( u * xExtent ) + xCenter
-            y = ( v * -yExtent ) + yCenter
-
-            z = -zmax
-            locPosMVector = asOMVec( (x, y, z) )
-            locPos = asTVec( (locPosMVector * worldMMatrix) + camPosMVector )
-            # set key on current locator for this frame
-            mc.setKeyframe( ('%s.originalTranslateX' % loc), t=fnum, v=locPos[0],  )
-            mc.setKeyframe( ('%s.originalTranslateY' % loc), t=fnum, v=locPos[1] )
-            mc.setKeyframe( ('%s.originalTranslateZ' % loc), t=fnum, v=locPos[2] )
+                    createJoints,
+                    keyWriter=None,
+                    trackerGroupName=None,
+                    jointGroupName=None,
+                    createNodes=True ): # False to only send the positions to the keyWriter (point cloud output)
+    if keyWriter is None:
+        keyWriter = AnimCurveWriter()
+    if not isinstance( trackingData, TrackingData ):
+        trackingData = TrackingData.fromList( trackingData )
+
+    # the camera is static, so every sample of every tracker goes
+    # through the same matrix, convert them all in one go
+    with trackerProfile.phase( 'projection' ):
+        locPosX, locPosY, locPosZ = unprojectSamples( trackingData.u, trackingData.v,
+                                                      xmin, xmax, ymin, ymax, zmax,
+                                                      [ worldMMatrix[i] for i in range(16) ],
+                                                      asTVec( camPosMVector ) )
+
+    if createNodes:
+        result_trackers, result_joints = createTrackerNodes( trackingData, cameraShape, locatorDisplayScale, createJoints,
+                                                            trackerGroupName, jointGroupName )
+    else:
+        result_trackers, result_joints = list( trackingData.names ), [ ]
+    if not createJoints:
+        result_joints = [ ]
+    for t, loc in enumerate( result_trackers ):
+        # key all the frames of the current locator
+        start, end = trackingData.sampleRange( t )
+        frames = trackingData.frames[start:end]
+        keyWriter.addKeys( ('%s.originalTranslateX' % loc), frames, locPosX[start:end] )
+        keyWriter.addKeys( ('%s.originalTranslateY' % loc), frames, locPosY[start:end] )
+        keyWriter.addKeys( ('%s.originalTranslateZ' % loc), frames, locPosZ[start:end] )
+
+    keyWriter.flush()
 
     return result_trackers, result_joints
 
@@ -543,161 +939,287 @@ def createLocatorsAnimProjectCam( trackingData,
                                   targetMesh=None,
                                   stickToLastHit=False,
                                   inheritNormal=False,
-                                  stickMode=1 ): # 1 = Z stays at the last hit but the rest follows the 2D track, 2 = Stick to the geometry last hit
-
-    # projection setup - currently rebuilt per frame bellow
-    # build fnMesh and octree to pass to the closestRayIntersect
-    # function - by only building it once, we save much time
-    #fnMesh = fnMeshFromName( targetMesh )
-    #accelParams = fnMesh.autoUniformGridParams() # octree acceleration structure
-
-
-    # gather frame start, end and current for iterating the timeline
-    timeOrig  = int( mc.currentTime( q=True ) + 0.5 )
+                                  stickMode=1, # 1 = Z stays at the last hit but the rest follows the 2D track, 2 = Stick to the geometry last hit
+                                  keyWriter=None,
+                                  raycastBackend='maya', # 'maya' = MFnMesh.closestIntersection, 'bvh' = trackerProjection.TriangleBVH, 'cache' = a TriangleBVH over a point cache of the mesh
+                                  trackerGroupName=None,
+                                  jointGroupName=None,
+                                  createNodes=True, # False to only send the positions to the keyWriter (point cloud output)
+                                  processes=1 ): # with the cache backend, projects runs of frames in a pool of processes (None = one per cpu)
+
+    if keyWriter is None:
+        keyWriter = AnimCurveWriter()
+
+    # gather frame start and end for iterating the timeline, the frames
+    # are evaluated in a context and the current time is never changed
     timeStart = int( mc.playbackOptions( q=True, minTime=True ) + 0.5 )
     timeEnd   = int( mc.playbackOptions( q=True, maxTime=True ) + 0.5 )
 
-    # TODO
-    # create all trackers at origin
-    # ready for keying
-
-    result_trackers = [ ]
-    result_joints = [ ]
-    previousUvHits = {} # Stores the hit info from the ray tracing.
-    for tracker in trackingData:
-        loc, joint = createSingleLocator( tracker, cameraShape, locatorDisplayScale, createJoints )
-        result_trackers.append( loc )
-        result_joints.append( joint )
-        previousUvHits[ tracker[0] ] = None
-
-    # step through time
-    forwardRange = range( timeStart, timeEnd+1 )
-    reverseRange = list(forwardRange)[:-1]
-    reverseRange.reverse()
-    forwardRange.extend(reverseRange)
-    for f in forwardRange:
-        # set frame
-        print 'Tracking Frame: {}'.format(f)
-        mc.currentTime( f, edit=True )
-        # projection setup - rebuild every frame
-        # build fnMesh and octree to pass to the closestRayIntersect
-        # function - by only building it once, we save much time
+    # projection setup - the intersector keeps the fnMesh and octree
+    # between frames and only rebuilds them when the mesh deforms,
+    # by only building it once, we save much time. The cache backend
+    # evaluates the mesh once per frame up front and never again, the
+    # rays and the stuck hits of a deforming mesh then only read the
+    # cached points
+    intersector = None
+    meshCache = None
+    projectedFrames = None
+    # everything after this point releases the intersector and removes
+    # the mesh cache on the way out, a failed import included
+    try:
         if targetMesh:
-            fnMesh = fnMeshFromName( targetMesh )
-            accelParams = fnMesh.autoUniformGridParams() # octree acceleration structure
-
-        # query the camera attributes
-        focalLength = mc.camera( cameraShape, q=True, fl=True )
-        lensSqueezeRatio = mc.camera( cameraShape, q=True, lsr=True )
-        horizontalFilmAperture = mc.camera( cameraShape, q=True, hfa=True ) * 25.4
-        verticalFilmAperture = mc.camera( cameraShape, q=True, vfa=True ) * 25.4
-        nearClippingPlane = mc.camera( cameraShape, q=True, ncp=True )
-        farClippingPlane = mc.camera( cameraShape, q=True, fcp=True )
-        worldPosition = mc.camera( cameraShape, q=True, p=True )
-        worldCenterOfInterest = mc.camera( cameraShape, q=True, wci=True )
-
-        # calculate FOV along both horizontal and vertical directions
-        horizontalFOV = 2 * math.atan( horizontalFilmAperture / (2 * focalLength) )
-        verticalFOV = 2 * math.atan( verticalFilmAperture / (2 * focalLength) )
-
-        # create the x,y points of the plane with normal -z for
-        # a camera at the origin. we then transform those points
-        # with the camera's transform matrix
-        xmax = zmax * math.tan( horizontalFOV /  2 )
-        xmin = zmax * math.tan( horizontalFOV / -2 )
-        ymax = zmax * math.tan( verticalFOV   /  2 )
-        ymin = zmax * math.tan( verticalFOV   / -2 )
+            if raycastBackend == 'cache':
+                meshCache = meshCachePath( targetMesh )
+                triangles = cacheMeshPoints( targetMesh, range( timeStart, timeEnd+1 ), meshCache )
+                intersector = CachedMeshIntersector( PointCache( meshCache ), *triangles )
+            elif raycastBackend == 'bvh':
+                intersector = BVHMeshIntersector( targetMesh )
+            else:
+                intersector = MeshIntersector( targetMesh )
+
+        # build the frame to sample lookup once, so each tracker's
+        # sample at a frame is found without walking its samples
+        if not isinstance( trackingData, TrackingData ):
+            trackingData = TrackingData.fromList( trackingData )
+        frameIndex = trackingData.frameIndex( timeStart, timeEnd )
+
+        # create all trackers at origin ready for keying
+        if createNodes:
+            result_trackers, result_joints = createTrackerNodes( trackingData, cameraShape, locatorDisplayScale, createJoints,
+                                                                trackerGroupName, jointGroupName )
+        else:
+            result_trackers, result_joints = list( trackingData.names ), [ ]
+
+        # sample the camera over the whole range up front, it is evaluated
+        # in a time context so the current time is left alone
+        cameraTrack = sampleCameraTrack( cameraShape, range( timeStart, timeEnd+1 ) )
+
+        # with stickToLastHit, a tracker without a live hit on a frame sticks
+        # to its closest live hit after that frame, or to its last one when
+        # there is none after it. The range is stepped through once, the
+        # frames without a live hit are set aside until the tracker hits again
+        # and are keyed once all the frames are done. Only this carries over
+        # from a frame to the next, so it is all that stays sequential when
+        # the frames are projected in a process pool.
+        sticking = stickToLastHit and intersector is not None
+        lastHits = { } # tracker -> the hit info (face, triangle, barycentric coordinates) of its last live hit
+        pending = [ [ ] for t in range( len(trackingData) ) ] # tracker -> (frame, locPos) since its last live hit
+        backfill = { } # frame -> (tracker, locPos, hit info) to key on it
+
+        def keyTracker( t, f, locPos, normalHit, frame=None ):
+            """ Keys the position of a tracker, and its orientation from normalHit at frame (None for the current one) """
+            name = trackingData.names[t]
+            keyWriter.addKey( ('%s.originalTranslateX' % name), f, locPos[0] )
+            keyWriter.addKey( ('%s.originalTranslateY' % name), f, locPos[1] )
+            keyWriter.addKey( ('%s.originalTranslateZ' % name), f, locPos[2] )
+
+            # orient the locator along the surface normal where it was hit,
+            # keyed directly instead of constraining it to the mesh
+            if inheritNormal and normalHit:
+                rotation = normalRotation( intersector.hitNormal( normalHit, frame ) )
+                keyWriter.addKey( ('%s.rotateX' % name), f, rotation[0] )
+                keyWriter.addKey( ('%s.rotateY' % name), f, rotation[1] )
+                keyWriter.addKey( ('%s.rotateZ' % name), f, rotation[2] )
+
+        def stickPosition( hitInfo, f, locPos ):
+            """ Position of a tracker without a live hit on frame f sticking to a hit, and the hit of its normal """
+            # where the hit triangle is on the mesh at this frame
+            previousPos = intersector.hitPosition( hitInfo, f )
+
+            if stickMode == 1: # Stick to closest depth found
+                camPosMVector = api.MVector( cameraTrack.position( cameraTrack.index( f ) ) )
+                previousPosMVector = api.MVector(previousPos[0], previousPos[1], previousPos[2])
+                projDirMVector = previousPosMVector - camPosMVector
+                vecLen = projDirMVector.length()
+
+                if locPos:
+                    projDirMVector = api.MVector( locPos[0], locPos[1], locPos[2] ) - camPosMVector
+                    projDirMVector.normalize()
+                    locPos = camPosMVector + (projDirMVector  * vecLen)
+
+            elif stickMode == 2: # Stick to closest geometry location found
+                locPos = previousPos
+
+            return locPos, ( hitInfo if locPos else None )
+
+        def frameSamples():
+            """ (frame, trackers, u, v) of the trackers with data on every frame """
+            for f in range( timeStart, timeEnd+1 ):
+                trackers = [ t for t in range( len(trackingData) ) if frameIndex.sampleAt( t, f ) >= 0 ]
+                samples = [ frameIndex.sampleAt( t, f ) for t in trackers ]
+                yield f, trackers, [ trackingData.u[s] for s in samples ], [ trackingData.v[s] for s in samples ]
+
+        # the samples of each frame are moved onto the image plane and their
+        # rays cast all together. Against a point cache, the frames do not
+        # depend on each other and runs of them can be projected in worker
+        # processes, the results come back in frame order and go through the
+        # same sticking and keying below. In an interactive session the
+        # workers are spawned from mayapy, never forked from the GUI, and
+        # without a way to start them the frames are projected here (see
+        # trackerData.poolContext)
+        if isinstance( intersector, CachedMeshIntersector ) and processes != 1 and poolContext() is not None:
+            projectedFrames = projectFramesInPool( cameraTrack, zmax, frameSamples(), intersector, processes )
+        else:
+            projectedFrames = projectFrames( cameraTrack, zmax, frameSamples(), intersector )
+
+        # step through time
+        for f, rayTrackers, xs, ys, zs, hits in projectedFrames:
+            print( 'Tracking Frame: {}'.format(f) )
+            locPositions = [ None ] * len(trackingData)
+            liveHits = { }
+            for k, t in enumerate( rayTrackers ):
+                locPositions[t] = ( float(xs[k]), float(ys[k]), float(zs[k]) )
+                if hits is not None:
+                    liveHits[t] = hits[k]
+
+            for t in range( len(trackingData) ):
+                locPos = locPositions[t]
+                liveHit, liveHitPos, liveHitInfo = liveHits.get( t, MISS )
+                if liveHit:
+                    keyTracker( t, f, liveHitPos, liveHitInfo, f )
+                    if sticking:
+                        # the frames since the previous live hit stick to this one
+                        for pendingFrame, pendingPos in pending[t]:
+                            backfill.setdefault( pendingFrame, [ ] ).append( ( t, pendingPos, liveHitInfo ) )
+                        pending[t] = [ ]
+                        lastHits[t] = liveHitInfo
+                elif sticking:
+                    pending[t].append( ( f, locPos ) )
+                elif locPos:
+                    keyTracker( t, f, locPos, None )
+
+        if sticking:
+            # the frames after the last live hit of a tracker stick to it, a
+            # tracker that never hit keeps the positions of its samples
+            for t in range( len(trackingData) ):
+                for pendingFrame, pendingPos in pending[t]:
+                    if t in lastHits:
+                        backfill.setdefault( pendingFrame, [ ] ).append( ( t, pendingPos, lastHits[t] ) )
+                    elif pendingPos:
+                        keyTracker( t, pendingFrame, pendingPos, None )
+
+            # key the frames without a live hit, frame by frame so a deforming
+            # mesh is evaluated once per frame
+            with trackerProfile.phase( 'stick' ):
+                for f in sorted( backfill ):
+                    for t, locPos, hitInfo in backfill[f]:
+                        locPos, normalHit = stickPosition( hitInfo, f, locPos )
+                        if locPos:
+                            keyTracker( t, f, locPos, normalHit, f )
+                trackerProfile.count( 'stuckKeys', sum( len(entries) for entries in backfill.values() ) )
+    finally:
+        # the pool workers stop reading the cache before it goes away
+        if projectedFrames is not None:
+            projectedFrames.close()
+        if intersector:
+            intersector.release()
+        if meshCache and os.path.exists( meshCache ):
+            os.remove( meshCache )
+
+    keyWriter.flush()
+
+    # the rotations are computed per frame, remove the euler flips between keys
+    if inheritNormal and intersector and createNodes:
+        curves = mc.keyframe( result_trackers, attribute=('rotateX', 'rotateY', 'rotateZ'), query=True, name=True )
+        if curves:
+            with trackerProfile.phase( 'keying' ):
+                mc.filterCurve( curves, filter='euler' )
 
-        xExtent = abs( xmax - xmin ) * 0.5
-        yExtent = abs( ymax - ymin ) * 0.5
-        xCenter = ( xmax + xmin ) * 0.5 # average of max and min
-        yCenter = ( ymax + ymin ) * 0.5 # average of max and min
+    return result_trackers, result_joints
 
-        # grab the new camera world matrix at this frame
-        worldMatrix = mc.getAttr( ('%s.worldMatrix' % cameraShape) )
-        wm = api.MMatrix( worldMatrix)
-        camPosMVector = api.MVector( wm[12], wm[13], wm[14] )
-
-        # walk through the trackers
-        # print 'Frame number is %s ' % f
-        for tracker in trackingData:
-            # Create a normal constraint with the mesh
-            #tracker_name = '|%s' % tracker[0] # to avoid conflict with another node of the same name inside a group
-            if targetMesh and inheritNormal:
-                mc.normalConstraint( targetMesh, tracker[0], weight=1, aimVector=(0, 0, 1), upVector=(0, 0, 1), worldUpType='scene')
-
-            # see if they have data at this frame
-            hit = False
-            locPos = None
-            for frameData in tracker[1]:
-                fnum = frameData[0]
-                # trackers frame matches current frame
-                if fnum == f:
-                    hasData = True
-
-                    u = frameData[1]
-                    v = frameData[2]
-
-                    x = ( u * xExtent ) + xCenter
-                    y = ( v * -yExtent ) + yCenter
-
-                    z = -zmax
-                    locPosMVector = asOMVec( (x, y, z) )
-                    locPosMVector = (locPosMVector * wm) + camPosMVector
-                    locPos = asTVec( locPosMVector )
-
-                    if targetMesh:
-                        # build a world projection vector
-                        projDirMVector = locPosMVector - camPosMVector
-                        projDirMVector.normalize()
-                        projDir = asTVec( projDirMVector )
-                        camPos  = asTVec( camPosMVector )
-
-                        # Project the 2d tracked position on the geometry
-                        liveHit, liveHitPos, liveHitInfo = closestRayIntersect( fnMesh, accelParams, camPos, projDir, stickToLastHit )
-                        if liveHit:
-                            locPos = liveHitPos
-                            if stickToLastHit:
-                                previousUvHits[ tracker[0] ] = liveHitInfo
-                            break
-
-                # trackers frame is greather than current frame
-                # assuming trackers are sorted, skip to next tracker
-                elif fnum > f:
-                    break
-
-            if stickToLastHit:
-                #if previousUvHits[ tracker[0] ] and locPos == None:
-                if previousUvHits[ tracker[0] ] and not liveHit:
-                    previousHit = previousUvHits[ tracker[0] ]
-                    try:
-                        previousPos = fnMesh.getPointAtUV(previousHit[2], previousHit[0], previousHit[1], api.MSpace.kWorld, UV_SET_NAME)
-                    except RuntimeError as e:
-                        mc.warning('Cannot find world position from uv coordinates: %s %s %s on mesh %s at frame %s' % (previousHit[2], previousHit[0], previousHit[1], fnMesh.fullPathName(), f))
-                        raise e
-
-                    if stickMode == 1: # Stick to closest depth found
-                        previousPosMVector = api.MVector(previousPos[0], previousPos[1], previousPos[2])
-                        projDirMVector = previousPosMVector - camPosMVector
-                        vecLen = projDirMVector.length()
-
-                        projDirMVector = locPosMVector - camPosMVector
-                        if locPos:
-                            locPosMVector = api.MVector(locPos[0], locPos[1], locPos[2])
-                            projDirMVector.normalize()
-                            locPos = camPosMVector + (projDirMVector  * vecLen)
 
-                    elif stickMode == 2: # Stick to closest geometry location found
-                        locPos = previousPos
+def pointCloudCachePath( trackingDataPath, prefix ):
+    """
+        A new point cache path for a tracking file, next to the scene when
+        it is saved, in the tracking data cache directory otherwise.
+    """
+    sceneName = mc.file( query=True, sceneName=True )
+    cacheDir = os.path.dirname( sceneName ) if sceneName else defaultCacheDir()
+    if not os.path.isdir( cacheDir ):
+        os.makedirs( cacheDir )
+    base = os.path.join( cacheDir, '%s%s' % ( prefix, os.path.splitext( os.path.basename( trackingDataPath ) )[0] ) )
+    path = base + POINT_CACHE_EXTENSION
+    count = 1
+    while os.path.exists( path ):
+        path = '%s_%d%s' % ( base, count, POINT_CACHE_EXTENSION )
+        count += 1
+    return path
+
+
+@trackerProfile.timed( 'pointCloud' )
+def createPointCloud( keyWriter, cachePath, name, locatorDisplayScale ):
+    """
+        Writes the positions gathered by a PointCloudWriter to a point
+        cache and creates the mesh showing them, driven by a
+        trackerPointCloud node reading the cache at the current time.
+        The scene only references the cache, so it keeps the same size
+        and draws one mesh whatever the number of trackers.
+        Returns the mesh transform.
+    """
+    keyWriter.write( cachePath )
+    trackerPointCloud.loadPlugin()
+
+    modifier = api.MDagModifier()
+    transform = modifier.createNode( 'transform' )
+    modifier.renameNode( transform, name )
+    shape = modifier.createNode( 'mesh', transform )
+    modifier.renameNode( shape, '%sShape' % name )
+    cloud = modifier.createNode( trackerPointCloud.NODE_NAME )
+    modifier.renameNode( cloud, '%s_pointCloud' % name )
+
+    fnCloud = api.MFnDependencyNode( cloud )
+    modifier.newPlugValueString( fnCloud.findPlug( 'cachePath', False ), cachePath )
+    modifier.newPlugValueDouble( fnCloud.findPlug( 'pointSize', False ), locatorDisplayScale )
+    sel = api.MSelectionList()
+    sel.add( 'time1' )
+    modifier.connect( api.MFnDependencyNode( sel.getDependNode( 0 ) ).findPlug( 'outTime', False ),
+                      fnCloud.findPlug( 'time', False ) )
+    modifier.connect( fnCloud.findPlug( 'outMesh', False ), api.MFnDependencyNode( shape ).findPlug( 'inMesh', False ) )
+    modifier.doIt()
+    trackerUndo.commit( modifier )
 
-            # Set a key frame if a position has been found, either from the trace or the previous trace
-            if locPos:
-                # set key on current locator for this frame
-                mc.setKeyframe( ('%s.originalTranslateX' % tracker[0]), t=f, v=locPos[0],  )
-                mc.setKeyframe( ('%s.originalTranslateY' % tracker[0]), t=f, v=locPos[1] )
-                mc.setKeyframe( ('%s.originalTranslateZ' % tracker[0]), t=f, v=locPos[2] )
+    # shade it like any new mesh
+    mc.sets( api.MFnDagNode( shape ).fullPathName(), edit=True, forceElement='initialShadingGroup' )
+    return api.MFnDagNode( transform ).fullPathName()
 
 
+def extractTrackers( pointCloud, trackerNames, cameraShape, locatorDisplayScale, createJoints,
+                     trackerGroupName=None, jointGroupName=None, keyWriter=None ):
+    """
+        Creates regular trackers, keyed from the point cache, for some of
+        the points of a point cloud created by createPointCloud.
+        pointCloud is the mesh or its trackerPointCloud node and
+        trackerNames the names of the points to extract.
+        Returns the locator and joint lists like createLocators.
+    """
+    if keyWriter is None:
+        keyWriter = AnimCurveWriter()
+    if mc.nodeType( pointCloud ) != trackerPointCloud.NODE_NAME:
+        shapes = mc.listRelatives( pointCloud, s=True, pa=True ) or [ pointCloud ]
+        pointCloud = mc.listConnections( '%s.inMesh' % shapes[0], source=True, destination=False,
+                                         type=trackerPointCloud.NODE_NAME )[0]
+    cache = PointCache( mc.getAttr( '%s.cachePath' % pointCloud ) )
+    try:
+        indices = dict( (name, i) for i, name in enumerate( cache.names ) )
+        trackingData = TrackingData()
+        for name in trackerNames:
+            if name not in indices:
+                raise NameError( 'No tracker {} in {}'.format( name, pointCloud ) )
+            trackingData.addTracker( name )
+
+        result_trackers, result_joints = createTrackerNodes( trackingData, cameraShape, locatorDisplayScale, createJoints,
+                                                            trackerGroupName, jointGroupName )
+        for loc, name in zip( result_trackers, trackerNames ):
+            frames, xs, ys, zs = cache.pointTrack( indices[name] )
+            keyWriter.addKeys( ('%s.originalTranslateX' % loc), frames, xs )
+            keyWriter.addKeys( ('%s.originalTranslateY' % loc), frames, ys )
+            keyWriter.addKeys( ('%s.originalTranslateZ' % loc), frames, zs )
+        keyWriter.flush()
+    finally:
+        cache.close()
+
+    if not createJoints:
+        result_joints = [ ]
     return result_trackers, result_joints
 
 
@@ -735,6 +1257,277 @@ def validate_scene_unit():
         mc.confirmDialog(title='Wrong linear units', message='The current linear unit is set to {}, please change to centimeters'.format(translate[unit]))
         return False
 
+def splitFilePaths( text ):
+    """ The tracking files of the file field, separated by semicolons """
+    return [ path.strip() for path in text.split( ';' ) if path.strip() ]
+
+
+def importTrackers( trackingDataPaths,
+                    cameraShape,
+                    formats=FORMAT_AUTO,
+                    resolutionX=1920,
+                    resolutionY=1080,
+                    z=DEFAULTS['z'],
+                    offsetX=DEFAULTS['offsetX'],
+                    offsetY=DEFAULTS['offsetY'],
+                    frameOffset=DEFAULTS['frameOffset'],
+                    locatorDisplayScale=DEFAULTS['displayScale'],
+                    prefix=DEFAULTS['prefix'],
+                    createJoints=DEFAULTS['createJoints'],
+                    animatedCamera=DEFAULTS['animated'],
+                    projected=DEFAULTS['projected'],
+                    targetMesh=DEFAULTS['targetMesh'],
+                    stickToLastHit=DEFAULTS['stickToLastHit'],
+                    inheritNormal=DEFAULTS['inheritNormal'],
+                    stickMode=DEFAULTS['stickMode'],
+                    pointCloud=False,
+                    minQuality=DEFAULTS['minQuality'],
+                    minLength=DEFAULTS['minLength'],
+                    nameFilter=DEFAULTS['nameFilter'],
+                    debugMode=False,
+                    processes=None,
+                    profilePath=None,
+                    raycastBackend=DEFAULTS['raycastBackend'],
+                    lensDistortion=None ):
+    """
+        Imports one or several tracking files on a camera, what the UI
+        Import button does. With several files, they are parsed in a
+        process pool (see trackerData.loadTrackingFiles), their trackers
+        are prefixed with the file names and all of them are built in the
+        scene at once.
+        formats is one FORMAT_* for all the files or one per file.
+        raycastBackend picks how the rays are cast on the target mesh, see
+        createLocatorsAnimProjectCam, 'cache' suits heavy deforming meshes.
+        processes is the size of the process pools parsing the files and,
+        with the cache backend, projecting runs of frames (None for one
+        process per file or per cpu). Inside Maya the workers are spawned
+        from mayapy, with Python 2 Maya everything runs in this process.
+        lensDistortion, a trackerLens.LensDistortion or a dict of its
+        parameters, undistorts the samples before they are placed.
+        The time spent in each phase of the import is printed at the end,
+        and written as json to profilePath when given.
+        Returns the tracker and joint lists, the point cloud mesh is
+        returned as the only tracker with pointCloud on.
+    """
+    if not isinstance( trackingDataPaths, (list, tuple) ):
+        trackingDataPaths = [ trackingDataPaths ]
+    if pointCloud:
+        createJoints = False
+
+    # time the phases of the import and count the commands they issue
+    profiler = trackerProfile.Profiler()
+    with profiler.active( mc ):
+        # query the camera attributes
+        with trackerProfile.phase( 'camera' ):
+            focalLength = mc.camera( cameraShape, q=True, fl=True )
+            lensSqueezeRatio = mc.camera( cameraShape, q=True, lsr=True )
+            horizontalFilmAperture = mc.camera( cameraShape, q=True, hfa=True ) * 25.4
+            verticalFilmAperture = mc.camera( cameraShape, q=True, vfa=True ) * 25.4
+            nearClippingPlane = mc.camera( cameraShape, q=True, ncp=True )
+            farClippingPlane = mc.camera( cameraShape, q=True, fcp=True )
+            worldPosition = mc.camera( cameraShape, q=True, p=True )
+            worldCenterOfInterest = mc.camera( cameraShape, q=True, wci=True )
+
+        # query the render attributes
+        # renderWidth = mc.getAttr( 'defaultResolution.width' )
+        # renderHeight = mc.getAttr( 'defaultResolution.height' )
+
+        # make sure film gate aspect and render aspect are identical
+        epsilon = 0.0001
+        filmAspect  = horizontalFilmAperture / verticalFilmAperture
+        #pixelAspect = float(renderWidth) / float(renderHeight)
+        pixelAspect = float(resolutionX) / float(resolutionY)
+        # if ( (filmAspect-pixelAspect) > epsilon ):
+        #     errorMsg =  'Camera film gate ascpect ratio does not match render\n'
+        #     errorMsg += 'resolution aspect ratio.\n\n'
+        #     errorMsg += 'Camera: %s\n' % cameraShape
+        #     errorMsg += 'Film Gate (mm): %.3f/%.3f = %.3f \n' % ( horizontalFilmAperture, verticalFilmAperture, filmAspect )
+        #     errorMsg += 'Resolution (pixels): %d/%d = %.3f\n' % ( renderWidth, renderHeight, pixelAspect )
+        #     mc.confirmDialog( title='Error', message=errorMsg, icon='warning', button=['Oh Shit'] )
+        #     return
+
+        # read the data from the files, a repeated import of the same file
+        # and settings is read back from the binary parse cache, several
+        # files are parsed concurrently and merged. The lens distortion of
+        # the plate is removed from all the samples of a file at once,
+        # what is parsed and cached stays as it was in the file
+        if isinstance( lensDistortion, dict ):
+            lensDistortion = LensDistortion.fromDict( lensDistortion )
+        with trackerProfile.phase( 'parse' ):
+            trackingData = loadTrackingFiles( trackingDataPaths, formats, resolutionX, resolutionY, offsetX, offsetY, frameOffset,
+                                              processes=processes, lensDistortion=lensDistortion )
+
+            # only the trackers passing the filters get nodes
+            nbrTrackers = len(trackingData)
+            trackingData = trackingData.filtered( minQuality or None, minLength or None, nameFilter or None )
+        print( 'Importing %d of %d trackers' % ( len(trackingData), nbrTrackers ) )
+
+        trackerProfile.count( 'trackers', len(trackingData) )
+        trackerProfile.count( 'samples', trackingData.sampleCount() )
+
+        # # Add the | suffixe to make sure these don't refer to other tracking points within groups
+        # for tracking in trackingData:
+        #     print 'aaaaaaa', tracking[0]
+        #     tracking[0] = '|' + tracking[0]
+
+        # dubug parsed ascii file data in UV and pixel space
+        if (debugMode):
+            debugPrintTrackers( trackingData, resolutionX, resolutionY )
+
+        # camera aim vectors using OpenMaya
+        aimUp = mc.camera( cameraShape, q=True, wup=True )
+        wc = asOMVec( worldCenterOfInterest )
+        wp = asOMVec( worldPosition )
+        au = asOMVec( aimUp )
+        au.normalize()
+        ad = wc-wp # veiwing direction towards world center of interest
+        ad.normalize()
+        at = ad^au # image x axis vector is the cross between up and direction
+        at.normalize()
+        aimDir = asTVec( ad )
+        aimTan = asTVec( at )
+
+        # calculate FOV along both horizontal and vertical directions
+        horizontalFOV = 2 * math.atan( horizontalFilmAperture / (2 * focalLength) )
+        verticalFOV = 2 * math.atan( verticalFilmAperture / (2 * focalLength) )
+
+        # debug camera attributes
+        if (debugMode):
+            print( 'focalLength: %.3f mm' % focalLength )
+            print( 'lensSqueezeRatio: %.3f' % lensSqueezeRatio )
+            print( 'horizontalFilmAperture: %.3f mm' % horizontalFilmAperture )
+            print( 'verticalFilmAperture: %.3f mm' % verticalFilmAperture )
+            print( 'nearClippingPlane: %.3f' % nearClippingPlane )
+            print( 'farClippingPlane: %.3f' % farClippingPlane )
+            print( 'horizontalFOV: %.3f degrees' % radToDeg(horizontalFOV) )
+            print( 'verticalFOV: %.3f degrees' % radToDeg(verticalFOV) )
+            print( 'worldPosition: %.3f %.3f %.3f' % (worldPosition[0],
+                                                      worldPosition[1],
+                                                      worldPosition[2]) )
+            print( 'worldCenterOfInterest: %.3f %.3f %.3f' % (worldCenterOfInterest[0],
+                                                              worldCenterOfInterest[1],
+                                                              worldCenterOfInterest[2]) )
+            print( 'aimUp: %.3f %.3f %.3f' % (aimUp[0], aimUp[1], aimUp[2]) )
+            print( 'aimDir: %.3f %.3f %.3f' % (aimDir[0], aimDir[1], aimDir[2]) )
+            print( 'aimTan: %.3f %.3f %.3f' % (aimTan[0], aimTan[1], aimTan[2]) )
+            print( 'renderWidth: %d' % resolutionX )
+            print( 'renderHeight: %d' % resolutionY )
+
+
+        # create the x,y points of the plane with normal -z for
+        # a camera at the origin. we then transform those points
+        # with the camera's transform matrix
+        xpos = z * math.tan( horizontalFOV /  2 )
+        xneg = z * math.tan( horizontalFOV / -2 )
+        ypos = z * math.tan( verticalFOV   /  2 )
+        yneg = z * math.tan( verticalFOV   / -2 )
+
+        topRight  = ( xpos, ypos, -z )
+        topLeft   = ( xneg, ypos, -z )
+        downRight = ( xpos, yneg, -z )
+        downLeft  = ( xneg, yneg, -z )
+
+        worldMatrix = mc.getAttr( ('%s.worldMatrix' % cameraShape) )
+        wm = api.MMatrix( worldMatrix )
+        #api.MScriptUtil().createMatrixFromList(worldMatrix, wm)
+        #camWorldPos = api.MVector(wm(3,0), wm(3,1), wm(3,2))
+        camWorldPos = api.MVector( wm[12], wm[13], wm[14] )
+
+        topRight  = asTVec( asOMVec(topRight)  * wm + camWorldPos )
+        topLeft   = asTVec( asOMVec(topLeft)   * wm + camWorldPos )
+        downRight = asTVec( asOMVec(downRight) * wm + camWorldPos )
+        downLeft  = asTVec( asOMVec(downLeft)  * wm + camWorldPos )
+
+        # debug corners
+        if (debugMode):
+            temp = mc.spaceLocator( a=True, p=topRight, n='topRight' )
+            tempShape = mc.listRelatives( temp, s=True, pa=True )[0]
+            mc.setAttr( ('%s.localScaleX' % tempShape), locatorDisplayScale )
+            mc.setAttr( ('%s.localScaleY' % tempShape), locatorDisplayScale )
+            mc.setAttr( ('%s.localScaleZ' % tempShape), locatorDisplayScale )
+
+            temp = mc.spaceLocator( a=True, p=topLeft, n='topLeft' )
+            tempShape = mc.listRelatives( temp, s=True, pa=True )[0]
+            mc.setAttr( ('%s.localScaleX' % tempShape), locatorDisplayScale )
+            mc.setAttr( ('%s.localScaleY' % tempShape), locatorDisplayScale )
+            mc.setAttr( ('%s.localScaleZ' % tempShape), locatorDisplayScale )
+
+            temp = mc.spaceLocator( a=True, p=downRight, n='downRight' )
+            tempShape = mc.listRelatives( temp, s=True, pa=True )[0]
+            mc.setAttr( ('%s.localScaleX' % tempShape), locatorDisplayScale )
+            mc.setAttr( ('%s.localScaleY' % tempShape), locatorDisplayScale )
+            mc.setAttr( ('%s.localScaleZ' % tempShape), locatorDisplayScale )
+
+            temp = mc.spaceLocator( a=True, p=downLeft, n='downLeft' )
+            tempShape = mc.listRelatives( temp, s=True, pa=True )[0]
+            mc.setAttr( ('%s.localScaleX' % tempShape), locatorDisplayScale )
+            mc.setAttr( ('%s.localScaleY' % tempShape), locatorDisplayScale )
+            mc.setAttr( ('%s.localScaleZ' % tempShape), locatorDisplayScale )
+
+
+        # the groups are created with the trackers, in the same modifier
+        if prefix:
+            prefix = '{}_'.format(prefix)
+        trackerGroupName = '{}tracker_group'.format(prefix)
+        jointGroupName = '{}joint_group'.format(prefix)
+
+        # the point cloud output gathers the positions in a point cache
+        # over the frames the trackers are keyed on
+        keyWriter = None
+        if pointCloud:
+            if animatedCamera:
+                firstFrame = int( mc.playbackOptions( q=True, minTime=True ) + 0.5 )
+                lastFrame = int( mc.playbackOptions( q=True, maxTime=True ) + 0.5 )
+            elif trackingData.sampleCount():
+                firstFrame = int( math.floor( min( trackingData.frames ) + 0.5 ) )
+                lastFrame = int( math.floor( max( trackingData.frames ) + 0.5 ) )
+            else:
+                firstFrame = lastFrame = 0
+            keyWriter = PointCloudWriter( trackingData.names, firstFrame, lastFrame )
+
+        # place the tracking locators with keyframes, as one undo step
+        mc.undoInfo( openChunk=True, chunkName='trackerImport' )
+        try:
+            if not animatedCamera:
+                trackers, joints = createLocators( trackingData, xneg, xpos, yneg, ypos, z, wm, cameraShape, camWorldPos, locatorDisplayScale, createJoints,
+                                                   trackerGroupName=trackerGroupName, jointGroupName=jointGroupName,
+                                                   keyWriter=keyWriter, createNodes=not pointCloud )
+            else:
+
+                # Deactivate the image planes
+                states = ConsistentCameraExport.disableCamerasAndImagePlanes()
+
+                if not projected:
+                    trackers, joints = createLocatorsAnimProjectCam( trackingData, z, cameraShape, locatorDisplayScale, createJoints,
+                                                                     trackerGroupName=trackerGroupName, jointGroupName=jointGroupName,
+                                                                     keyWriter=keyWriter, createNodes=not pointCloud )
+                else:
+                    # Hits are kept as a triangle and barycentric coordinates and
+                    # evaluated again on the mesh points, so the mesh needs no uvs
+                    if not targetMesh:
+                        raise NameError('The target mesh is invalid')
+
+                    trackers, joints = createLocatorsAnimProjectCam( trackingData, z, cameraShape, locatorDisplayScale, createJoints, targetMesh, stickToLastHit, inheritNormal, stickMode,
+                                                                     raycastBackend=raycastBackend, processes=processes,
+                                                                     trackerGroupName=trackerGroupName, jointGroupName=jointGroupName,
+                                                                     keyWriter=keyWriter, createNodes=not pointCloud )
+
+                # Reactivate the previous planes
+                ConsistentCameraExport.enableCamerasAndImagePlanes(states)
+
+            if pointCloud:
+                trackers = [ createPointCloud( keyWriter, pointCloudCachePath( trackingDataPaths[0], prefix ), '{}tracker_points'.format(prefix), locatorDisplayScale ) ]
+                joints = [ ]
+        finally:
+            mc.undoInfo( closeChunk=True )
+
+    print( profiler.summary() )
+    if profilePath:
+        profiler.writeJson( profilePath )
+        print( 'Wrote the import profile to %s' % profilePath )
+    return trackers, joints
+
+
 class   TrackerImportUI:
 
     def __init__(self):
@@ -768,7 +1561,8 @@ class   TrackerImportUI:
         mc.menuItem( label='Syntheyes 2D Ascii (multi)' )
         mc.menuItem( label='3DEqualizer 2D Ascii (multi)' )
         mc.menuItem( label='PFTrack 2D Ascii (multi)' )
-        mc.optionMenuGrp(self.format, e=True, sl=3)
+        mc.menuItem( label='Auto Detect' )
+        mc.optionMenuGrp(self.format, e=True, sl=FORMAT_AUTO)
 
         self.z = mc.floatSliderGrp( label='Z Depth: ', field=True, minValue=0.01, maxValue=100.0,
             fieldMinValue=0.001, fieldMaxValue=1000.0, value=DEFAULTS['z'] )
@@ -797,11 +1591,24 @@ class   TrackerImportUI:
         self.frameOffset = mc.intSliderGrp( label='Frame Offset: ', field=True, minValue=-100, maxValue=100,
             fieldMinValue=-100000, fieldMaxValue=100000, value=DEFAULTS['frameOffset'] )
 
+        # filters applied to the trackers before any node is created
+        self.minQuality = mc.floatSliderGrp( label='Min Sample Quality: ', field=True, minValue=0.0, maxValue=1.0,
+            fieldMinValue=0.0, fieldMaxValue=1000.0, precision=3, value=DEFAULTS['minQuality'] )
+        self.minLength = mc.intSliderGrp( label='Min Track Length: ', field=True, minValue=0, maxValue=100,
+            fieldMinValue=0, fieldMaxValue=100000, value=DEFAULTS['minLength'] )
+        self.nameFilter = mc.textFieldGrp( label='Name Filter (regex): ', text=DEFAULTS['nameFilter'] )
+
         self.displayScale = mc.floatSliderGrp( label='Locator Display Scale: ', field=True, minValue=0.1, maxValue=10.0,
             fieldMinValue=0.001, fieldMaxValue=100, precision=3, value=DEFAULTS['displayScale'] )
 
         self.createJoints = mc.checkBoxGrp( numberOfCheckBoxes=1, label='Create Joints: ', v1=DEFAULTS['createJoints'])
 
+        # one point cloud mesh instead of locators for the dense track sets
+        self.output = mc.optionMenuGrp( label='Output: ', columnWidth=(2, 200), changeCommand=self.outputChangeCommand )
+        mc.menuItem( label='Locators' )
+        mc.menuItem( label='Point Cloud' )
+        mc.optionMenuGrp(self.output, e=True, sl=DEFAULTS['output'])
+
         self.prefix = mc.textFieldGrp( label='Group Prefix: ', text=DEFAULTS['prefix'] )
 
         self.animated = mc.checkBoxGrp( numberOfCheckBoxes=1, label='Animated Camera: ', changeCommand=self.animatedChangeCommand, v1=DEFAULTS['animated'], visible=False)
@@ -819,6 +1626,17 @@ class   TrackerImportUI:
         mc.menuItem( label='Stick To Closest Geometry Location Found' )
         mc.optionMenuGrp(self.stickMode, e=True, sl=DEFAULTS['stickMode'])
 
+        # how the rays are cast on the target mesh, the point cache suits heavy deforming meshes
+        self.raycastBackend = mc.optionMenuGrp( label='Raycast Backend: ', columnWidth=(2, 200), enable=False )
+        mc.menuItem( label='Maya (MFnMesh)' )
+        mc.menuItem( label='BVH' )
+        mc.menuItem( label='Point Cache' )
+        mc.optionMenuGrp(self.raycastBackend, e=True, sl=RAYCAST_BACKENDS.index( DEFAULTS['raycastBackend'] ) + 1)
+
+        # the pools parsing several files and projecting with the point cache, 0 for one process per file or per cpu
+        self.processes = mc.intSliderGrp( label='Processes: ', field=True, minValue=0, maxValue=16,
+            fieldMinValue=0, fieldMaxValue=256, value=DEFAULTS['processes'] )
+
         self.debug = mc.checkBoxGrp( numberOfCheckBoxes=1, label='Debug Mode: ' )
 
         self.importTrack = mc.button(label='Import', w=140, c=self.execute)
@@ -828,6 +1646,7 @@ class   TrackerImportUI:
         # Run the enable/disable rules on creation
         self.animatedChangeCommand()
         self.projectedChangeCommand()
+        self.outputChangeCommand()
 
         # Attach elements to form
         mc.formLayout( self.form,
@@ -852,12 +1671,20 @@ class   TrackerImportUI:
                 (self.offsetY, 'right', 2),
                 (self.frameOffset, 'left', 2),
                 (self.frameOffset, 'right', 2),
+                (self.minQuality, 'left', 2),
+                (self.minQuality, 'right', 2),
+                (self.minLength, 'left', 2),
+                (self.minLength, 'right', 2),
+                (self.nameFilter, 'left', 2),
+                (self.nameFilter, 'right', 2),
                 (self.displayScale, 'left', 2),
                 (self.displayScale, 'right', 2),
                 (self.prefix, 'left', 2),
                 (self.prefix, 'right', 2),
                 (self.createJoints, 'left', 2),
                 (self.createJoints, 'right', 2),
+                (self.output, 'left', 2),
+                (self.output, 'right', 2),
                 (self.animated, 'left', 2),
                 (self.animated, 'right', 2),
                 (self.projected, 'left', 2),
@@ -870,6 +1697,10 @@ class   TrackerImportUI:
                 (self.inheritNormal, 'right', 2),
                 (self.stickMode, 'left', 2),
                 (self.stickMode, 'right', 2),
+                (self.raycastBackend, 'left', 2),
+                (self.raycastBackend, 'right', 2),
+                (self.processes, 'left', 2),
+                (self.processes, 'right', 2),
                 (self.debug, 'left', 2),
                 (self.debug, 'right', 2),
                 (self.importTrack, 'left', 2)
@@ -883,16 +1714,22 @@ class   TrackerImportUI:
                 (self.offsetX, 'top', 2, self.filePath),
                 (self.offsetY, 'top', 2, self.offsetX),
                 (self.frameOffset, 'top', 2, self.offsetY),
-                (self.displayScale, 'top', 2, self.frameOffset),
+                (self.minQuality, 'top', 2, self.frameOffset),
+                (self.minLength, 'top', 2, self.minQuality),
+                (self.nameFilter, 'top', 2, self.minLength),
+                (self.displayScale, 'top', 2, self.nameFilter),
                 (self.prefix, 'top', 2, self.displayScale),
                 (self.createJoints, 'top', 2, self.prefix),
-                (self.animated, 'top', 2, self.createJoints),
+                (self.output, 'top', 2, self.createJoints),
+                (self.animated, 'top', 2, self.output),
                 (self.projected, 'top', 2, self.animated),
                 (self.targetMesh, 'top', 2, self.projected),
                 (self.stickToLastHit, 'top', 2, self.targetMesh),
                 (self.inheritNormal, 'top', 2, self.stickToLastHit),
                 (self.stickMode, 'top', 2, self.inheritNormal),
-                (self.debug, 'top', 2, self.stickMode),
+                (self.raycastBackend, 'top', 2, self.stickMode),
+                (self.processes, 'top', 2, self.raycastBackend),
+                (self.debug, 'top', 2, self.processes),
                 (self.importTrack, 'top', 2, self.debug),
                 (self.defaults, 'top', 2, self.debug),
                 (self.defaults, 'left', 2, self.importTrack),
@@ -901,7 +1738,7 @@ class   TrackerImportUI:
             ]
         )
 
-        mc.window(self.window, e=1, w=430, h=352)
+        mc.window(self.window, e=1, w=430, h=496)
         mc.showWindow(self.window)
 
     def loadCamera(self, *args):
@@ -935,12 +1772,14 @@ class   TrackerImportUI:
             mc.checkBoxGrp(self.stickToLastHit, e=True, enable=True)
             mc.checkBoxGrp(self.inheritNormal, e=True, enable=True)
             mc.optionMenuGrp(self.stickMode, e=True, enable=True)
+            mc.optionMenuGrp(self.raycastBackend, e=True, enable=True)
         else:
             """ Project is not ticked, so disable targetMesh. """
             mc.textFieldButtonGrp(self.targetMesh, e=True, enable=False)
             mc.checkBoxGrp(self.stickToLastHit, e=True, enable=False)
             mc.checkBoxGrp(self.inheritNormal, e=True, enable=False)
             mc.optionMenuGrp(self.stickMode, e=True, enable=False)
+            mc.optionMenuGrp(self.raycastBackend, e=True, enable=False)
 
     def animatedChangeCommand(self, *args):
         if mc.checkBoxGrp(self.animated, q=True, v1=True):
@@ -955,12 +1794,21 @@ class   TrackerImportUI:
             mc.checkBoxGrp(self.stickToLastHit, e=True, enable=False)
             mc.checkBoxGrp(self.inheritNormal, e=True, enable=False)
             mc.optionMenuGrp(self.stickMode, e=True, enable=False)
+            mc.optionMenuGrp(self.raycastBackend, e=True, enable=False)
+
+    def outputChangeCommand(self, *args):
+        if mc.optionMenuGrp(self.output, q=True, sl=True) == OUTPUT_POINT_CLOUD:
+            """ Point cloud, no joints are created. """
+            mc.checkBoxGrp(self.createJoints, e=True, enable=False)
+        else:
+            mc.checkBoxGrp(self.createJoints, e=True, enable=True)
 
     def findFilePath(self, *args):
         basicFilter = "*"
-        result = mc.fileDialog2(fileFilter=basicFilter, dialogStyle=2, fileMode=1, dir=self.path_2d)
+        # several files can be picked, they are imported together
+        result = mc.fileDialog2(fileFilter=basicFilter, dialogStyle=2, fileMode=4, dir=self.path_2d)
         if (result):
-            mc.textFieldButtonGrp(self.filePath, e=True, text=result[0])
+            mc.textFieldButtonGrp(self.filePath, e=True, text=';'.join(result))
 
     def defaults(self, *args):
         # print mc.optionMenuGrp(self.format, q=True, v=True)
@@ -971,6 +1819,9 @@ class   TrackerImportUI:
         mc.floatSliderGrp(self.offsetX, e=True, v=DEFAULTS['offsetX'])
         mc.floatSliderGrp(self.offsetY, e=True, v=DEFAULTS['offsetY'])
         mc.intSliderGrp(self.frameOffset, e=True, v=DEFAULTS['frameOffset'])
+        mc.floatSliderGrp(self.minQuality, e=True, v=DEFAULTS['minQuality'])
+        mc.intSliderGrp(self.minLength, e=True, v=DEFAULTS['minLength'])
+        mc.textFieldGrp(self.nameFilter, e=True, text=DEFAULTS['nameFilter'])
         mc.floatSliderGrp(self.displayScale, e=True, v=DEFAULTS['displayScale'])
         mc.textFieldGrp(self.prefix, e=True, text=DEFAULTS['prefix'])
         mc.checkBoxGrp(self.createJoints, e=True, v1=DEFAULTS['createJoints'])
@@ -980,18 +1831,22 @@ class   TrackerImportUI:
         mc.checkBoxGrp(self.stickToLastHit, e=True, enable=False, v1=DEFAULTS['stickToLastHit'])
         mc.checkBoxGrp(self.inheritNormal, e=True, enable=False, v1=DEFAULTS['inheritNormal'])
         mc.optionMenuGrp(self.stickMode, e=True, sl=DEFAULTS['stickMode'])
+        mc.optionMenuGrp(self.raycastBackend, e=True, sl=RAYCAST_BACKENDS.index( DEFAULTS['raycastBackend'] ) + 1)
+        mc.intSliderGrp(self.processes, e=True, v=DEFAULTS['processes'])
+        mc.optionMenuGrp(self.output, e=True, sl=DEFAULTS['output'])
         mc.checkBoxGrp(self.debug, e=True, v1=False)
 
         # Run the enable/disable rules on creation
         self.animatedChangeCommand()
         self.projectedChangeCommand()
+        self.outputChangeCommand()
 
     def close(self, *args):
         mc.deleteUI(self.name)
 
     def execute(self, *args):
         # query the gui
-        format = mc.optionMenuGrp(self.format, q=True, sl=True) #1=nuke, 2=boujou, 3=syntheyes
+        format = mc.optionMenuGrp(self.format, q=True, sl=True) #1=nuke, 2=boujou, 3=syntheyes, 4=3de, 5=pftrack, 6=auto detect
         z = mc.floatSliderGrp(self.z, q=True, v=True)
         resolutionX = mc.intSliderGrp(self.resX, q=True, v=True)
         resolutionY = mc.intSliderGrp(self.resY, q=True, v=True)
@@ -999,10 +1854,13 @@ class   TrackerImportUI:
         # resolutionY = mc.getAttr('defaultResolution.height')
         # print 'res x is: %s' % resolutionX
         cameraShape = mc.textFieldButtonGrp(self.camera, q=True, text=True)
-        trackingDataPath = mc.textFieldButtonGrp(self.filePath, q=True, text=True)
+        trackingDataPaths = splitFilePaths( mc.textFieldButtonGrp(self.filePath, q=True, text=True) )
         offsetX = mc.floatSliderGrp(self.offsetX, q=True, v=True)
         offsetY = mc.floatSliderGrp(self.offsetY, q=True, v=True)
         frameOffset = mc.intSliderGrp(self.frameOffset, q=True, v=True)
+        minQuality = mc.floatSliderGrp(self.minQuality, q=True, v=True)
+        minLength = mc.intSliderGrp(self.minLength, q=True, v=True)
+        nameFilter = mc.textFieldGrp(self.nameFilter, q=True, text=True)
         locatorDisplayScale = mc.floatSliderGrp(self.displayScale, q=True, v=True)
         prefix = mc.textFieldGrp(self.prefix, q=True, text=True)
         createJoints = mc.checkBoxGrp(self.createJoints, q=True, v1=True)
@@ -1012,212 +1870,48 @@ class   TrackerImportUI:
         stickToLastHit = mc.checkBoxGrp(self.stickToLastHit, q=True, v1=True)
         inheritNormal = mc.checkBoxGrp(self.inheritNormal, q=True, v1=True)
         stickMode = mc.optionMenuGrp(self.stickMode, q=True, sl=True)
+        pointCloud = mc.optionMenuGrp(self.output, q=True, sl=True) == OUTPUT_POINT_CLOUD
+        raycastBackend = RAYCAST_BACKENDS[ mc.optionMenuGrp(self.raycastBackend, q=True, sl=True) - 1 ]
+        processes = mc.intSliderGrp(self.processes, q=True, v=True) or None
 
         debugMode = mc.checkBoxGrp(self.debug, q=True, v1=True)
 
-        # query the camera attributes
-        focalLength = mc.camera( cameraShape, q=True, fl=True )
-        lensSqueezeRatio = mc.camera( cameraShape, q=True, lsr=True )
-        horizontalFilmAperture = mc.camera( cameraShape, q=True, hfa=True ) * 25.4
-        verticalFilmAperture = mc.camera( cameraShape, q=True, vfa=True ) * 25.4
-        nearClippingPlane = mc.camera( cameraShape, q=True, ncp=True )
-        farClippingPlane = mc.camera( cameraShape, q=True, fcp=True )
-        worldPosition = mc.camera( cameraShape, q=True, p=True )
-        worldCenterOfInterest = mc.camera( cameraShape, q=True, wci=True )
-
-        # query the render attributes
-        # renderWidth = mc.getAttr( 'defaultResolution.width' )
-        # renderHeight = mc.getAttr( 'defaultResolution.height' )
-
-        # make sure film gate aspect and render aspect are identical
-        epsilon = 0.0001
-        filmAspect  = horizontalFilmAperture / verticalFilmAperture
-        #pixelAspect = float(renderWidth) / float(renderHeight)
-        pixelAspect = float(resolutionX) / float(resolutionY)
-        # if ( (filmAspect-pixelAspect) > epsilon ):
-        #     errorMsg =  'Camera film gate ascpect ratio does not match render\n'
-        #     errorMsg += 'resolution aspect ratio.\n\n'
-        #     errorMsg += 'Camera: %s\n' % cameraShape
-        #     errorMsg += 'Film Gate (mm): %.3f/%.3f = %.3f \n' % ( horizontalFilmAperture, verticalFilmAperture, filmAspect )
-        #     errorMsg += 'Resolution (pixels): %d/%d = %.3f\n' % ( renderWidth, renderHeight, pixelAspect )
-        #     mc.confirmDialog( title='Error', message=errorMsg, icon='warning', button=['Oh Shit'] )
-        #     return
-
-        # read the data from the file
-        if   (format == 1):
-            trackingData = loadNukeASCII2D( trackingDataPath, resolutionX, resolutionY, frameOffset )
-        elif (format == 2):
-            trackingData = loadBoujouTracksFile( trackingDataPath, resolutionX, resolutionY, offsetX, offsetY, frameOffset )
-        elif (format == 3):
-            trackingData = loadSyntheyes2DTrackerPaths( trackingDataPath, offsetX, offsetY, frameOffset )
-        elif (format == 4):
-            trackingData = load3deTrackerPaths( trackingDataPath, resolutionX, resolutionY, offsetX, offsetY, frameOffset )
-        else:
-            trackingData = loadPFTrackAscii2D( trackingDataPath, resolutionX, resolutionY, frameOffset )
-
-        # # Add the | suffixe to make sure these don't refer to other tracking points within groups
-        # for tracking in trackingData:
-        #     print 'aaaaaaa', tracking[0]
-        #     tracking[0] = '|' + tracking[0]
-
-        # dubug parsed ascii file data in UV and pixel space
-        if (debugMode):
-            debugPrintTrackers( trackingData, resolutionX, resolutionY )
-
-        # camera aim vectors using OpenMaya
-        aimUp = mc.camera( cameraShape, q=True, wup=True )
-        wc = asOMVec( worldCenterOfInterest )
-        wp = asOMVec( worldPosition )
-        au = asOMVec( aimUp )
-        au.normalize()
-        ad = wc-wp # veiwing direction towards world center of interest
-        ad.normalize()
-        at = ad^au # image x axis vector is the cross between up and direction
-        at.normalize()
-        aimDir = asTVec( ad )
-        aimTan = asTVec( at )
-
-        # calculate FOV along both horizontal and vertical directions
-        horizontalFOV = 2 * math.atan( horizontalFilmAperture / (2 * focalLength) )
-        verticalFOV = 2 * math.atan( verticalFilmAperture / (2 * focalLength) )
-
-        # debug camera attributes
-        if (debugMode):
-            print( 'focalLength: %.3f mm' % focalLength )
-            print( 'lensSqueezeRatio: %.3f' % lensSqueezeRatio )
-            print( 'horizontalFilmAperture: %.3f mm' % horizontalFilmAperture )
-            print( 'verticalFilmAperture: %.3f mm' % verticalFilmAperture )
-            print( 'nearClippingPlane: %.3f' % nearClippingPlane )
-            print( 'farClippingPlane: %.3f' % farClippingPlane )
-            print( 'horizontalFOV: %.3f degrees' % radToDeg(horizontalFOV) )
-            print( 'verticalFOV: %.3f degrees' % radToDeg(verticalFOV) )
-            print( 'worldPosition: %.3f %.3f %.3f' % (worldPosition[0],
-                                                      worldPosition[1],
-                                                      worldPosition[2]) )
-            print( 'worldCenterOfInterest: %.3f %.3f %.3f' % (worldCenterOfInterest[0],
-                                                              worldCenterOfInterest[1],
-                                                              worldCenterOfInterest[2]) )
-            print( 'aimUp: %.3f %.3f %.3f' % (aimUp[0], aimUp[1], aimUp[2]) )
-            print( 'aimDir: %.3f %.3f %.3f' % (aimDir[0], aimDir[1], aimDir[2]) )
-            print( 'aimTan: %.3f %.3f %.3f' % (aimTan[0], aimTan[1], aimTan[2]) )
-            print( 'renderWidth: %d' % resolutionX )
-            print( 'renderHeight: %d' % resolutionY )
-
-
-        # create the x,y points of the plane with normal -z for
-        # a camera at the origin. we then transform those points
-        # with the camera's transform matrix
-        xpos = z * math.tan( horizontalFOV /  2 )
-        xneg = z * math.tan( horizontalFOV / -2 )
-        ypos = z * math.tan( verticalFOV   /  2 )
-        yneg = z * math.tan( verticalFOV   / -2 )
-
-        topRight  = ( xpos, ypos, -z )
-        topLeft   = ( xneg, ypos, -z )
-        downRight = ( xpos, yneg, -z )
-        downLeft  = ( xneg, yneg, -z )
-
-        worldMatrix = mc.getAttr( ('%s.worldMatrix' % cameraShape) )
-        wm = api.MMatrix( worldMatrix )
-        #api.MScriptUtil().createMatrixFromList(worldMatrix, wm)
-        #camWorldPos = api.MVector(wm(3,0), wm(3,1), wm(3,2))
-        camWorldPos = api.MVector( wm[12], wm[13], wm[14] )
-
-        topRight  = asTVec( asOMVec(topRight)  * wm + camWorldPos )
-        topLeft   = asTVec( asOMVec(topLeft)   * wm + camWorldPos )
-        downRight = asTVec( asOMVec(downRight) * wm + camWorldPos )
-        downLeft  = asTVec( asOMVec(downLeft)  * wm + camWorldPos )
-
-        # debug corners
-        if (debugMode):
-            temp = mc.spaceLocator( a=True, p=topRight, n='topRight' )
-            tempShape = mc.listRelatives( temp, s=True, pa=True )[0]
-            mc.setAttr( ('%s.localScaleX' % tempShape), locatorDisplayScale )
-            mc.setAttr( ('%s.localScaleY' % tempShape), locatorDisplayScale )
-            mc.setAttr( ('%s.localScaleZ' % tempShape), locatorDisplayScale )
-
-            temp = mc.spaceLocator( a=True, p=topLeft, n='topLeft' )
-            tempShape = mc.listRelatives( temp, s=True, pa=True )[0]
-            mc.setAttr( ('%s.localScaleX' % tempShape), locatorDisplayScale )
-            mc.setAttr( ('%s.localScaleY' % tempShape), locatorDisplayScale )
-            mc.setAttr( ('%s.localScaleZ' % tempShape), locatorDisplayScale )
-
-            temp = mc.spaceLocator( a=True, p=downRight, n='downRight' )
-            tempShape = mc.listRelatives( temp, s=True, pa=True )[0]
-            mc.setAttr( ('%s.localScaleX' % tempShape), locatorDisplayScale )
-            mc.setAttr( ('%s.localScaleY' % tempShape), locatorDisplayScale )
-            mc.setAttr( ('%s.localScaleZ' % tempShape), locatorDisplayScale )
-
-            temp = mc.spaceLocator( a=True, p=downLeft, n='downLeft' )
-            tempShape = mc.listRelatives( temp, s=True, pa=True )[0]
-            mc.setAttr( ('%s.localScaleX' % tempShape), locatorDisplayScale )
-            mc.setAttr( ('%s.localScaleY' % tempShape), locatorDisplayScale )
-            mc.setAttr( ('%s.localScaleZ' % tempShape), locatorDisplayScale )
-
-
-        # place the tracking locators with keyframes
-        if not animatedCamera:
-            trackers, joints = createLocators( trackingData, xneg, xpos, yneg, ypos, z, wm, cameraShape, camWorldPos, locatorDisplayScale, createJoints )
-        else:
-
-            # Deactivate the image planes
-            states = ConsistentCameraExport.disableCamerasAndImagePlanes()
-
-            if not projected:
-                trackers, joints = createLocatorsAnimProjectCam( trackingData, z, cameraShape, locatorDisplayScale, createJoints )
-            else:
-                # Create a temporay UV set. Valid UVs must exist for each polygons in order to
-                # keep a reference of the previous location in UV space.
-                # (Maya doesn't seem to have functions to access the position of location on a polygon based on the primitive number and barymetric coordinate)
-                # We have to create a copy of the original geo so the mesh doesn't have any deformation coming
-                # from Alembic for example. From there we create the automatic uv and then transfer them on the animated geo.
-                if not targetMesh:
-                    raise NameError('The target mesh is invalid')
-
-                if stickToLastHit:
-                    uv_geo = mc.duplicate(targetMesh, returnRootsOnly=True, name=TEMP_UV_GEO_NAME)[0]
-                    # Delete the uv set if it already exists
-                    if UV_SET_NAME in mc.polyUVSet(uv_geo, query=True, allUVSets=True):
-                        mc.polyUVSet (uv_geo, delete=True, uvSet=UV_SET_NAME)
-                    mc.polyAutoProjection ( uv_geo, layoutMethod=0, projectBothDirections=0, insertBeforeDeformers=0, createNewMap=True, layout=2, scaleMode=1, optimize=0, planes=12, uvSetName=UV_SET_NAME, percentageSpace=0.2, worldSpace=0)
-                    mc.polyUVSet( uv_geo, currentUVSet=True, uvSet=UV_SET_NAME)
-                    # if mc.pluginInfo ( 'Unfold3D.so', query=True, loaded=True) == False:
-                    #     mc.loadPlugin( 'Unfold3D.so' )
-                    # u3dUnfold( TEMP_UV_GEO_NAME, unfold=True, iterations=1, pack=True, borderintersection=True, triangleflip=True, mapsize=1024, roomspace=2)
-                    #mc.Unfold3D( TEMP_UV_GEO_NAME, unfold=True, iterations=1, pack=True, borderintersection=True, triangleflip=True, mapsize=1024, roomspace=2) # maya 2016
-                    # polyAutoProjection -lm 0 -pb 0 -ibd 1 -cm 0 -l 2 -sc 2 -o 0 -p 6 -ps 0.2 -ws 0
-                    # u3dUnfold -ite 1 -p 0 -bi 1 -tf 1 -ms 1024 -rs 0
-                    #u3dLayout -res 256 -scl 1 -box 0 1 0 1 -ls 3
-
-                    transfer_node = mc.transferAttributes(uv_geo, targetMesh, transferPositions=0, transferNormals=0, transferUVs=1, transferColors=0, sampleSpace=4, sourceUvSet=UV_SET_NAME, targetUvSet=UV_SET_NAME, sourceUvSpace=UV_SET_NAME, targetUvSpace=UV_SET_NAME, searchMethod=3, flipUVs=0, colorBorders=1)
-
-                trackers, joints = createLocatorsAnimProjectCam( trackingData, z, cameraShape, locatorDisplayScale, createJoints, targetMesh, stickToLastHit, inheritNormal, stickMode )
-
-                if stickToLastHit:
-                    # Delete the temporary uv mesh
-                    mc.delete ( uv_geo )
-                    mc.delete ( transfer_node )
-
-            # Reactivate the previous planes
-            ConsistentCameraExport.enableCamerasAndImagePlanes(states)
-
-
-        # Create the trackers group
-        print( 'Creating trackers group' )
-        if prefix:
-            prefix = '{}_'.format(prefix)
-        tracker_group = mc.group( empty=True, name='{}tracker_group'.format(prefix))
-        # Add each tracker to the group
-        for tracker in trackers:
-            mc.parent( tracker, tracker_group, relative=True)
-
-        # Create the joints group
-        if createJoints:
-            print( 'Creating joints group' )
-            joint_group = mc.group( empty=True, name='{}joint_group'.format(prefix))
-            # Add each tracker to the group
-            for joint in joints:
-                mc.parent( joint, joint_group, relative=True)
+        # check the files against the chosen format from their first few
+        # KB, before anything is parsed or created in the scene
+        formats = [ ]
+        for trackingDataPath in trackingDataPaths:
+            try:
+                detectedFormat = sniffFormat( trackingDataPath )
+            except AmbiguousFormatError as e:
+                # fine as long as the chosen format is one it could be
+                if format not in e.formats:
+                    mc.confirmDialog( title='Error', message=str(e), icon='warning', button=['Oh noes!'] )
+                    return
+                formats.append( format )
+                continue
+            except (IOError, ValueError) as e:
+                mc.confirmDialog( title='Error', message=str(e), icon='warning', button=['Oh noes!'] )
+                return
+            if format == FORMAT_AUTO:
+                print( 'Detected tracker format: %s (%s)' % ( FORMAT_NAMES[detectedFormat], trackingDataPath ) )
+                formats.append( detectedFormat )
+                continue
+            if format != detectedFormat:
+                message = 'The file looks like %s data, not %s.\n%s' % ( FORMAT_NAMES[detectedFormat], FORMAT_NAMES[format], trackingDataPath )
+                if mc.confirmDialog( title='Wrong format', message=message, icon='warning',
+                                     button=['Import Anyway', 'Cancel'], defaultButton='Cancel', cancelButton='Cancel' ) != 'Import Anyway':
+                    return
+            formats.append( format )
+
+        importTrackers( trackingDataPaths, cameraShape, formats,
+                        resolutionX=resolutionX, resolutionY=resolutionY, z=z,
+                        offsetX=offsetX, offsetY=offsetY, frameOffset=frameOffset,
+                        locatorDisplayScale=locatorDisplayScale, prefix=prefix, createJoints=createJoints,
+                        animatedCamera=animatedCamera, projected=projected, targetMesh=targetMesh,
+                        stickToLastHit=stickToLastHit, inheritNormal=inheritNormal, stickMode=stickMode,
+                        pointCloud=pointCloud, minQuality=minQuality, minLength=minLength,
+                        nameFilter=nameFilter, debugMode=debugMode, processes=processes,
+                        raycastBackend=raycastBackend )
 
 if __name__ == '__main__':
     TrackerImportUI()
@@ -0,0 +1,175 @@
+#
+# Headless tracker import, for the farm.
+#
+#   mayapy trackerImportBatch.py job.json [job2.yaml ...]
+#
+# A job file holds one job or a list of jobs, each opening a scene,
+# importing tracking files on one of its cameras and saving it:
+#
+#   {
+#       "scene": "/path/shot_track_v01.ma",
+#       "output": "/path/shot_track_v02.ma",    (optional, saves over the scene otherwise)
+#       "camera": "shotCamShape",
+#       "files": ["/path/points.txt"],          (or "file")
+#       "format": "auto",                       (nuke, boujou, syntheyes, 3de, pftrack or auto)
+#       "resolution": [1920, 1080],             (optional, the scene render resolution otherwise)
+#       "z": 10, "offsetX": 0, "offsetY": 0, "frameOffset": 0,
+#       "prefix": "", "displayScale": 0.2, "createJoints": true,
+#       "animated": true, "projected": true, "targetMesh": "", "stickToLastHit": true,
+#       "inheritNormal": true, "stickMode": 2, "pointCloud": false,
+#       "raycastBackend": "maya",               (maya, bvh or cache, cache for heavy deforming meshes)
+#       "lens": {"k1": -0.05, "k2": 0.01, "squeeze": 2.0},  (optional, undistorts the tracks, see trackerLens)
+#       "minQuality": 0, "minLength": 0, "nameFilter": "",
+#       "profile": "/path/shot_track_profile.json"  (optional, phase timings of the import)
+#   }
+#
+# Any setting left out takes its trackerImport.DEFAULTS value. YAML jobs
+# need PyYAML.
+
+import argparse
+import json
+import os
+import sys
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from trackerData import FORMAT_NUKE, FORMAT_BOUJOU, FORMAT_SYNTHEYES, FORMAT_3DE, FORMAT_PFTRACK, FORMAT_AUTO
+from trackerLens import LensDistortion
+
+FORMATS = {
+    'nuke': FORMAT_NUKE,
+    'boujou': FORMAT_BOUJOU,
+    'syntheyes': FORMAT_SYNTHEYES,
+    '3de': FORMAT_3DE,
+    'pftrack': FORMAT_PFTRACK,
+    'auto': FORMAT_AUTO,
+}
+
+# job keys passed through to trackerImport.importTrackers, with the
+# trackerImport.DEFAULTS key of their default value
+SETTINGS = {
+    'z': 'z',
+    'offsetX': 'offsetX',
+    'offsetY': 'offsetY',
+    'frameOffset': 'frameOffset',
+    'locatorDisplayScale': 'displayScale',
+    'prefix': 'prefix',
+    'createJoints': 'createJoints',
+    'animatedCamera': 'animated',
+    'projected': 'projected',
+    'targetMesh': 'targetMesh',
+    'stickToLastHit': 'stickToLastHit',
+    'inheritNormal': 'inheritNormal',
+    'stickMode': 'stickMode',
+    'raycastBackend': 'raycastBackend',
+    'minQuality': 'minQuality',
+    'minLength': 'minLength',
+    'nameFilter': 'nameFilter',
+}
+
+# the other keys a job may have
+JOB_KEYS = ( 'scene', 'output', 'camera', 'file', 'files', 'format', 'resolution', 'pointCloud',
+             'processes', 'lens', 'profile' )
+
+
+def readJobs( path ):
+    """ Returns the list of jobs of a JSON or YAML job file """
+    with open( path, 'r' ) as f:
+        if os.path.splitext( path )[1].lower() in ( '.yaml', '.yml' ):
+            if yaml is None:
+                raise ImportError('PyYAML is needed to read {}'.format(path))
+            jobs = yaml.safe_load( f )
+        else:
+            jobs = json.load( f )
+    if isinstance( jobs, dict ):
+        jobs = [ jobs ]
+    return jobs
+
+
+def jobArguments( job, defaults ):
+    """
+        Checks a job and returns the importTrackers keyword arguments,
+        everything but the camera and tracking files, raising a ValueError
+        on a missing or unknown setting.
+    """
+    for key in ( 'scene', 'camera' ):
+        if not job.get( key ):
+            raise ValueError('The job has no {}'.format(key))
+    if not job.get( 'files' ) and not job.get( 'file' ):
+        raise ValueError('The job has no tracking file')
+    # a misspelled setting would silently take its default
+    unknown = set( job ) - set( SETTINGS.values() ) - set( JOB_KEYS )
+    if unknown:
+        raise ValueError('Unknown job settings {}'.format( ', '.join( sorted(unknown) ) ))
+
+    arguments = { }
+    for argument, key in SETTINGS.items():
+        arguments[argument] = job.get( key, defaults[key] )
+
+    format = str( job.get( 'format', 'auto' ) ).lower()
+    if format not in FORMATS:
+        raise ValueError('Unknown format {}, expected one of {}'.format( format, ', '.join( sorted(FORMATS) ) ))
+    arguments['formats'] = FORMATS[format]
+    arguments['pointCloud'] = bool( job.get( 'pointCloud', False ) )
+    arguments['processes'] = job.get( 'processes' )
+    arguments['profilePath'] = job.get( 'profile' )
+    if job.get( 'lens' ):
+        arguments['lensDistortion'] = LensDistortion.fromDict( job['lens'] )
+    if job.get( 'resolution' ):
+        arguments['resolutionX'], arguments['resolutionY'] = [ int(r) for r in job['resolution'] ]
+    return arguments
+
+
+def runJob( job ):
+    """ Opens the scene of a job, imports the trackers and saves the scene """
+    import maya.cmds as mc
+    import trackerImport
+
+    arguments = jobArguments( job, trackerImport.DEFAULTS )
+    files = job.get( 'files' ) or [ job['file'] ]
+
+    print( 'Opening %s' % job['scene'] )
+    mc.file( job['scene'], open=True, force=True )
+    if mc.currentUnit( query=True, linear=True ) != 'cm':
+        raise ValueError('The linear unit of {} is not centimeters'.format( job['scene'] ))
+    if 'resolutionX' not in arguments:
+        arguments['resolutionX'] = mc.getAttr( 'defaultResolution.width' )
+        arguments['resolutionY'] = mc.getAttr( 'defaultResolution.height' )
+
+    trackers, joints = trackerImport.importTrackers( files, job['camera'], **arguments )
+    print( 'Imported %d trackers' % len(trackers) )
+
+    output = job.get( 'output' )
+    if output:
+        mc.file( rename=output )
+    fileType = 'mayaBinary' if mc.file( query=True, sceneName=True ).endswith( '.mb' ) else 'mayaAscii'
+    mc.file( save=True, force=True, type=fileType )
+    print( 'Saved %s' % mc.file( query=True, sceneName=True ) )
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description='Headless tracker import, run with mayapy' )
+    parser.add_argument( 'jobs', nargs='+', help='JSON or YAML job files' )
+    args = parser.parse_args( argv )
+
+    import maya.standalone
+    maya.standalone.initialize()
+    failures = 0
+    try:
+        for path in args.jobs:
+            for job in readJobs( path ):
+                try:
+                    runJob( job )
+                except Exception as e:
+                    failures += 1
+                    print( 'Job of %s failed: %s' % ( path, e ) )
+    finally:
+        maya.standalone.uninitialize()
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit( 1 if main() else 0 )
@@ -0,0 +1,219 @@
+#
+# Lens distortion removal for trackerImport.
+#
+# 2D tracks are measured on the distorted plate, the camera projection
+# of trackerImport assumes a pinhole lens. An import can be given the
+# distortion of the lens the plate was shot with and its samples are
+# undistorted all at once, over the u, v columns of the TrackingData,
+# before anything is projected:
+#
+#   lens = LensDistortion( k1=-0.05, k2=0.01, squeeze=2.0 )
+#   undistortTrackingData( trackingData, lens, plateResX, plateResY )
+#
+# The model is Brown-Conrady (the OpenCV one): radial k1, k2, k3 and
+# tangential p1, p2 terms applied to the undistorted position x, y
+#
+#   r2 = x*x + y*y
+#   xd = x * (1 + k1*r2 + k2*r2^2 + k3*r2^3) + 2*p1*x*y + p2*(r2 + 2*x*x)
+#   yd = y * (1 + k1*r2 + k2*r2^2 + k3*r2^3) + p1*(r2 + 2*y*y) + 2*p2*x*y
+#
+# x, y are measured from the distortion center, x to the right and y
+# down like u, v, in units of half the plate diagonal, so r = 1 in the
+# corners. The plate is desqueezed first, an anamorphic plate of squeeze
+# 2 is twice as wide on the sensor as its pixels are. Undistortion
+# inverts the model with Newton steps.
+#
+# This module does not import maya.
+
+import math
+import sys
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# undistort stops iterating once no sample moves more than this (in
+# units of half the plate diagonal, about a millionth of a pixel on HD)
+UNDISTORT_TOLERANCE = 1e-9
+UNDISTORT_ITERATIONS = 20
+
+
+class LensDistortion(object):
+    """
+        Distortion of a lens, see the module header for the model:
+            k1, k2, k3 - radial coefficients
+            p1, p2 - tangential (decentering) coefficients
+            squeeze - anamorphic squeeze, the pixel aspect of the plate
+            centerX, centerY - distortion center, in centered u, v
+    """
+
+    PARAMETERS = ( 'k1', 'k2', 'k3', 'p1', 'p2', 'squeeze', 'centerX', 'centerY' )
+
+    def __init__(self, k1=0.0, k2=0.0, k3=0.0, p1=0.0, p2=0.0, squeeze=1.0, centerX=0.0, centerY=0.0):
+        if squeeze <= 0.0:
+            raise ValueError('The squeeze must be positive, got {}'.format(squeeze))
+        self.k1 = float(k1)
+        self.k2 = float(k2)
+        self.k3 = float(k3)
+        self.p1 = float(p1)
+        self.p2 = float(p2)
+        self.squeeze = float(squeeze)
+        self.centerX = float(centerX)
+        self.centerY = float(centerY)
+
+    @classmethod
+    def fromDict(cls, values):
+        """ Builds a LensDistortion from a dict of its parameters (a job file entry), raises a ValueError on an unknown one """
+        unknown = sorted( set( values ) - set( cls.PARAMETERS ) )
+        if unknown:
+            raise ValueError('Unknown lens parameters {}, expected some of {}'.format( ', '.join( unknown ), ', '.join( cls.PARAMETERS ) ))
+        return cls( **values )
+
+    def toDict(self):
+        return dict( ( name, getattr( self, name ) ) for name in self.PARAMETERS )
+
+    def withOffset(self, offsetX, offsetY):
+        """
+            The same lens for samples offsetX, offsetY was subtracted from
+            (the import offsets), its center moves with them
+        """
+        values = self.toDict()
+        values['centerX'] -= offsetX
+        values['centerY'] -= offsetY
+        return LensDistortion( **values )
+
+    def isIdentity(self):
+        """ True when the lens does not distort, whatever its squeeze and center """
+        return not ( self.k1 or self.k2 or self.k3 or self.p1 or self.p2 )
+
+    def scales(self, plateResX, plateResY):
+        """ The factors from centered u, v to the x, y of the model """
+        width = self.squeeze * float(plateResX) / float(plateResY)
+        halfDiagonal = math.sqrt( width * width + 1.0 )
+        return width / halfDiagonal, 1.0 / halfDiagonal
+
+    def offsets(self, x, y):
+        """ Radial factor and tangential offsets at undistorted x, y, numpy arrays or floats """
+        xx = x * x
+        yy = y * y
+        xy = x * y
+        r2 = xx + yy
+        radial = 1.0 + r2 * ( self.k1 + r2 * ( self.k2 + r2 * self.k3 ) )
+        dx = 2.0 * self.p1 * xy + self.p2 * ( r2 + 2.0 * xx )
+        dy = self.p1 * ( r2 + 2.0 * yy ) + 2.0 * self.p2 * xy
+        return radial, dx, dy
+
+    def newtonStep(self, x, y, xd, yd):
+        """
+            The change of undistorted x, y moving their distorted position
+            towards xd, yd, a Newton step with the jacobian of the model.
+            numpy arrays or floats.
+        """
+        xx = x * x
+        yy = y * y
+        xy = x * y
+        r2 = xx + yy
+        radial = 1.0 + r2 * ( self.k1 + r2 * ( self.k2 + r2 * self.k3 ) )
+        slope = 2.0 * ( self.k1 + r2 * ( 2.0 * self.k2 + r2 * 3.0 * self.k3 ) ) # d radial / d r2, times 2
+        ex = x * radial + 2.0 * self.p1 * xy + self.p2 * ( r2 + 2.0 * xx ) - xd
+        ey = y * radial + self.p1 * ( r2 + 2.0 * yy ) + 2.0 * self.p2 * xy - yd
+        a = radial + xx * slope + 2.0 * self.p1 * y + 6.0 * self.p2 * x
+        b = xy * slope + 2.0 * self.p1 * x + 2.0 * self.p2 * y
+        d = radial + yy * slope + 6.0 * self.p1 * y + 2.0 * self.p2 * x
+        det = a * d - b * b
+        return ( b * ey - d * ex ) / det, ( b * ex - a * ey ) / det
+
+    def distort(self, u, v, plateResX, plateResY):
+        """
+            Moves undistorted centered u, v samples (sequences of the same
+            length) to where the lens puts them. Returns the u and v arrays,
+            numpy arrays when numpy is available, array('d') otherwise.
+        """
+        sx, sy = self.scales( plateResX, plateResY )
+        if numpy is not None:
+            x = ( numpy.asarray( u, dtype=numpy.float64 ) - self.centerX ) * sx
+            y = ( numpy.asarray( v, dtype=numpy.float64 ) - self.centerY ) * sy
+            radial, dx, dy = self.offsets( x, y )
+            return ( x * radial + dx ) / sx + self.centerX, ( y * radial + dy ) / sy + self.centerY
+
+        du = array('d', [0.0]) * len(u)
+        dv = array('d', [0.0]) * len(u)
+        for i in range( len(u) ):
+            x = ( u[i] - self.centerX ) * sx
+            y = ( v[i] - self.centerY ) * sy
+            radial, dx, dy = self.offsets( x, y )
+            du[i] = ( x * radial + dx ) / sx + self.centerX
+            dv[i] = ( y * radial + dy ) / sy + self.centerY
+        return du, dv
+
+    def undistort(self, u, v, plateResX, plateResY, tolerance=UNDISTORT_TOLERANCE, iterations=UNDISTORT_ITERATIONS):
+        """
+            Moves centered u, v samples measured on the distorted plate to
+            where a pinhole lens would have put them, the inverse of
+            distort. All the samples take Newton steps together until none
+            moves more than tolerance, three or four steps for real lenses. Returns the u
+            and v arrays, numpy arrays when numpy is available, array('d')
+            otherwise.
+        """
+        sx, sy = self.scales( plateResX, plateResY )
+        if numpy is not None:
+            xd = ( numpy.asarray( u, dtype=numpy.float64 ) - self.centerX ) * sx
+            yd = ( numpy.asarray( v, dtype=numpy.float64 ) - self.centerY ) * sy
+            # start from the model run backwards once, a step ahead of xd, yd
+            radial, dx, dy = self.offsets( xd, yd )
+            x = ( xd - dx ) / radial
+            y = ( yd - dy ) / radial
+            for i in range( iterations if len(x) else 0 ):
+                stepX, stepY = self.newtonStep( x, y, xd, yd )
+                x += stepX
+                y += stepY
+                if max( numpy.abs( stepX ).max(), numpy.abs( stepY ).max() ) <= tolerance:
+                    break
+            return x / sx + self.centerX, y / sy + self.centerY
+
+        uu = array('d', [0.0]) * len(u)
+        uv = array('d', [0.0]) * len(u)
+        for i in range( len(u) ):
+            xd = ( u[i] - self.centerX ) * sx
+            yd = ( v[i] - self.centerY ) * sy
+            radial, dx, dy = self.offsets( xd, yd )
+            x = ( xd - dx ) / radial
+            y = ( yd - dy ) / radial
+            for j in range( iterations ):
+                stepX, stepY = self.newtonStep( x, y, xd, yd )
+                x += stepX
+                y += stepY
+                if max( abs( stepX ), abs( stepY ) ) <= tolerance:
+                    break
+            uu[i] = x / sx + self.centerX
+            uv[i] = y / sy + self.centerY
+        return uu, uv
+
+
+def asDoubleArray( values ):
+    """ array('d') of a numpy array or a sequence of floats """
+    if numpy is not None and isinstance( values, numpy.ndarray ):
+        # both hold native doubles, the bytes are copied as they are
+        result = array('d')
+        data = numpy.ascontiguousarray( values, dtype=numpy.float64 )
+        if sys.version_info[0] < 3:
+            result.fromstring( data.tostring() )
+        else:
+            result.frombytes( data.tobytes() )
+        return result
+    return array( 'd', values )
+
+
+def undistortTrackingData( trackingData, lens, plateResX, plateResY ):
+    """
+        Undistorts all the samples of a TrackingData in place, u and v stay
+        array('d') columns. Nothing is done for a lens without distortion.
+    """
+    if lens is None or lens.isIdentity() or not trackingData.sampleCount():
+        return trackingData
+    u, v = lens.undistort( trackingData.u, trackingData.v, plateResX, plateResY )
+    trackingData.u = asDoubleArray( u )
+    trackingData.v = asDoubleArray( v )
+    return trackingData
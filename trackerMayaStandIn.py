@@ -0,0 +1,489 @@
+#
+# Stand-in maya modules, to run the projection of trackerImport without
+# Maya.
+#
+# StandInScene describes what the importer reads from a scene: the
+# playback range, cameras and triangle meshes, animated through functions
+# of the frame. installed() puts stand-in maya, maya.cmds, maya.api.OpenMaya
+# ... modules in sys.modules for the time of a with block, and trackerImport
+# imported inside of it runs against the scene:
+#
+#   scene = StandInScene( 1, 100 )
+#   scene.addCamera( 'cameraShape1', cameraAttributes )
+#   scene.addMesh( 'groundShape', points, triangles )
+#   with installed( scene ) as mc:
+#       import trackerImport
+#       trackerImport.createLocatorsAnimProjectCam( ..., raycastBackend='bvh', createNodes=False )
+#
+# Only what sampleCameraTrack, BVHMeshIntersector and the frame loop need is
+# implemented. The other maya.cmds commands do nothing and return None, they
+# are counted in StandInCommands.calls. Nodes can not be created, so the
+# importer has to run with createNodes=False and a PointCloudWriter, and
+# the 'maya' raycast backend (MFnMesh.closestIntersection) is not there.
+# ConsistentCameraExport, only used around the interactive import and
+# written for the Python 2 of Maya, is stood in for too.
+#
+# This is for trackerBenchmark, so the cost of the Python side of the
+# import can be measured on a machine without Maya.
+
+import sys
+import types
+
+# the scene the stand-in modules read, set by installed()
+_scene = None
+
+# modules replaced while installed, the importer modules are imported again
+# so they pick up the stand-ins
+MAYA_MODULES = ( 'maya', 'maya.cmds', 'maya.mel', 'maya.OpenMaya', 'maya.standalone',
+                 'maya.api', 'maya.api.OpenMaya', 'maya.api.OpenMayaAnim', 'ConsistentCameraExport' )
+IMPORTER_MODULES = ( 'trackerImport', 'trackerUndo', 'trackerPointCloud' )
+
+IDENTITY = ( 1.0, 0.0, 0.0, 0.0,
+             0.0, 1.0, 0.0, 0.0,
+             0.0, 0.0, 1.0, 0.0,
+             0.0, 0.0, 0.0, 1.0 )
+
+
+class StandInMesh(object):
+    """
+        A triangle mesh of the scene:
+            points - flat x, y, z object space positions, or a function of
+                     the frame returning them for a deforming mesh
+            triangles - flat sequence of 3 vertex ids per triangle, every
+                        triangle is a polygon of its own
+            worldMatrix - 16 floats, or a function of the frame
+    """
+
+    def __init__(self, points, triangles, worldMatrix=IDENTITY):
+        self.points = points
+        self.triangles = list( triangles )
+        self.worldMatrix = worldMatrix
+        self.deforming = callable( points )
+
+
+class StandInScene(object):
+    """
+        Playback range, current time, cameras and meshes seen by the
+        stand-in modules. A camera is a function of the frame returning a
+        dict of focalLength, horizontalFilmAperture, verticalFilmAperture
+        (in inches like the Maya attributes), lensSqueezeRatio and
+        worldMatrix (16 floats).
+    """
+
+    def __init__(self, minTime=1, maxTime=100):
+        self.minTime = minTime
+        self.maxTime = maxTime
+        self.currentTime = minTime
+        self.cameras = { }
+        self.meshes = { }
+        self.contextFrames = [ ] # frames of the MDGContextGuards entered
+
+    def addCamera(self, name, attributes):
+        self.cameras[name] = attributes
+
+    def addMesh(self, name, points, triangles, worldMatrix=IDENTITY):
+        self.meshes[name] = StandInMesh( points, triangles, worldMatrix )
+
+    def node(self, name):
+        if name not in self.cameras and name not in self.meshes:
+            raise RuntimeError('No object matches name: {}'.format(name))
+        return name
+
+    def evaluationFrame(self):
+        """ Frame plugs are evaluated at, the innermost context or the current time """
+        return self.contextFrames[-1] if self.contextFrames else self.currentTime
+
+    def plugValue(self, node, attribute):
+        frame = self.evaluationFrame()
+        if node in self.cameras:
+            value = self.cameras[node]( frame )[attribute]
+            return MMatrix( value ) if attribute == 'worldMatrix' else value
+        mesh = self.meshes[node]
+        if attribute == 'worldMatrix':
+            return MMatrix( mesh.worldMatrix( frame ) if callable( mesh.worldMatrix ) else mesh.worldMatrix )
+        if attribute == 'outMesh':
+            return StandInMeshData( mesh.points( frame ) if mesh.deforming else mesh.points, mesh.triangles )
+        raise RuntimeError('No stand-in attribute {}.{}'.format( node, attribute ))
+
+
+class StandInCommands(types.ModuleType):
+    """
+        maya.cmds: the few commands the projection queries read the scene,
+        any other command is counted and returns None.
+    """
+
+    def __init__(self):
+        types.ModuleType.__init__(self, 'maya.cmds')
+        self.calls = { }
+
+    def _record(self, name):
+        self.calls[name] = self.calls.get( name, 0 ) + 1
+
+    def currentTime(self, *args, **kwargs):
+        self._record( 'currentTime' )
+        if kwargs.get( 'q' ) or kwargs.get( 'query' ):
+            return float( _scene.currentTime )
+        _scene.currentTime = args[0]
+        return float( _scene.currentTime )
+
+    def playbackOptions(self, **kwargs):
+        self._record( 'playbackOptions' )
+        if kwargs.get( 'minTime' ) or kwargs.get( 'min' ):
+            return float( _scene.minTime )
+        if kwargs.get( 'maxTime' ) or kwargs.get( 'max' ):
+            return float( _scene.maxTime )
+        return None
+
+    def listConnections(self, plug=None, **kwargs):
+        """ A deforming mesh has something connected to its inMesh """
+        self._record( 'listConnections' )
+        node, attribute = plug.split( '.', 1 )
+        mesh = _scene.meshes.get( node )
+        if attribute == 'inMesh' and mesh is not None and mesh.deforming:
+            return [ 'standInDeformer' ]
+        return None
+
+    def __getattr__(self, name):
+        if name.startswith( '_' ):
+            raise AttributeError( name )
+
+        def command( *args, **kwargs ):
+            self._record( name )
+            return None
+        command.__name__ = name
+        return command
+
+
+# maya.api.OpenMaya stand-ins
+
+class MSpace(object):
+    kObject = 2
+    kWorld = 4
+
+
+class MTime(object):
+
+    def __init__(self, value=0.0, unit=None):
+        self.value = float( value )
+
+    def asUnits(self, unit):
+        return self.value
+
+    @staticmethod
+    def uiUnit():
+        return 'film'
+
+
+class MDGContext(object):
+
+    def __init__(self, time=None):
+        self.time = time
+
+
+class MDGContextGuard(object):
+    """ Evaluates the plugs at the frame of a context inside of a with block """
+
+    def __init__(self, context):
+        self.context = context
+
+    def __enter__(self):
+        frame = self.context.time.value if self.context.time is not None else _scene.currentTime
+        _scene.contextFrames.append( frame )
+        return self
+
+    def __exit__(self, *args):
+        _scene.contextFrames.pop()
+        return False
+
+
+class MMatrix(object):
+    """ 4x4 matrix, the 16 floats row major like Maya """
+
+    def __init__(self, values=IDENTITY):
+        self.values = [ float(values[i]) for i in range(16) ]
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def __len__(self):
+        return 16
+
+    def inverse(self):
+        """ Gauss-Jordan elimination with partial pivoting """
+        m = [ self.values[r*4:r*4+4] + [ 1.0 if c == r else 0.0 for c in range(4) ] for r in range(4) ]
+        for c in range(4):
+            pivot = max( range( c, 4 ), key=lambda r: abs( m[r][c] ) )
+            if m[pivot][c] == 0.0:
+                raise ValueError('Singular matrix')
+            m[c], m[pivot] = m[pivot], m[c]
+            scale = 1.0 / m[c][c]
+            m[c] = [ x * scale for x in m[c] ]
+            for r in range(4):
+                if r != c and m[r][c] != 0.0:
+                    factor = m[r][c]
+                    m[r] = [ x - factor * y for x, y in zip( m[r], m[c] ) ]
+        return MMatrix( [ m[r][4+c] for r in range(4) for c in range(4) ] )
+
+
+class MVector(object):
+
+    def __init__(self, x=0.0, y=None, z=None):
+        if y is None:
+            x, y, z = x[0], x[1], x[2]
+        self.x = float( x )
+        self.y = float( y )
+        self.z = float( z )
+
+    def __getitem__(self, i):
+        return ( self.x, self.y, self.z )[i]
+
+    def __len__(self):
+        return 3
+
+    def __add__(self, other):
+        return MVector( self.x + other[0], self.y + other[1], self.z + other[2] )
+
+    def __sub__(self, other):
+        return MVector( self.x - other[0], self.y - other[1], self.z - other[2] )
+
+    def __mul__(self, other):
+        if isinstance( other, MMatrix ):
+            # a direction, the translation does not apply
+            m = other.values
+            return MVector( self.x * m[0] + self.y * m[4] + self.z * m[8],
+                            self.x * m[1] + self.y * m[5] + self.z * m[9],
+                            self.x * m[2] + self.y * m[6] + self.z * m[10] )
+        return MVector( self.x * other, self.y * other, self.z * other )
+
+    def length(self):
+        return ( self.x * self.x + self.y * self.y + self.z * self.z ) ** 0.5
+
+    def normalize(self):
+        length = self.length()
+        if length:
+            self.x /= length
+            self.y /= length
+            self.z /= length
+        return self
+
+
+class MPoint(MVector):
+
+    def __init__(self, x=0.0, y=None, z=None, w=1.0):
+        MVector.__init__(self, x, y, z)
+
+    def __mul__(self, other):
+        if isinstance( other, MMatrix ):
+            m = other.values
+            return MPoint( self.x * m[0] + self.y * m[4] + self.z * m[8] + m[12],
+                           self.x * m[1] + self.y * m[5] + self.z * m[9] + m[13],
+                           self.x * m[2] + self.y * m[6] + self.z * m[10] + m[14] )
+        return MPoint( self.x * other, self.y * other, self.z * other )
+
+
+class MDagPath(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def extendToShape(self):
+        pass
+
+    def instanceNumber(self):
+        return 0
+
+    def fullPathName(self):
+        return self.name
+
+
+class MPlug(object):
+
+    def __init__(self, node, attribute):
+        self.node = node
+        self.attribute = attribute
+
+    def elementByLogicalIndex(self, index):
+        return self
+
+    def asDouble(self):
+        return _scene.plugValue( self.node, self.attribute )
+
+    def asMObject(self):
+        return _scene.plugValue( self.node, self.attribute )
+
+
+class MSelectionList(object):
+
+    def __init__(self):
+        self.items = [ ]
+
+    def add(self, name):
+        self.items.append( name )
+
+    def getDagPath(self, i):
+        return MDagPath( _scene.node( self.items[i].split( '.' )[0] ) )
+
+    def getDependNode(self, i):
+        return _scene.node( self.items[i].split( '.' )[0] )
+
+    def getPlug(self, i):
+        node, attribute = self.items[i].split( '.', 1 )
+        return MPlug( _scene.node( node ), attribute )
+
+
+class MFnDependencyNode(object):
+
+    def __init__(self, node):
+        self.nodeName = node.fullPathName() if isinstance( node, MDagPath ) else node
+
+    def findPlug(self, attribute, wantNetworkedPlug=False):
+        return MPlug( self.nodeName, attribute )
+
+    def name(self):
+        return self.nodeName
+
+
+class MFnDagNode(MFnDependencyNode):
+
+    def fullPathName(self):
+        return self.nodeName
+
+
+class MFnMatrixData(object):
+
+    def __init__(self, data):
+        self.data = data
+
+    def matrix(self):
+        return self.data
+
+
+class StandInMeshData(object):
+    """ What the outMesh plug of a mesh gives, its points on a frame """
+
+    def __init__(self, points, triangles):
+        self.points = points
+        self.triangles = triangles
+
+
+class MFnMesh(object):
+    """ A mesh of the scene by dag path, or mesh data read from its outMesh """
+
+    def __init__(self, mesh):
+        if isinstance( mesh, MDagPath ):
+            self.path = mesh
+            mesh = _scene.plugValue( mesh.fullPathName(), 'outMesh' )
+        else:
+            self.path = None
+        self.points = mesh.points
+        self.triangles = mesh.triangles
+
+    def dagPath(self):
+        return self.path
+
+    @property
+    def numVertices(self):
+        return len(self.points) // 3
+
+    @property
+    def numPolygons(self):
+        return len(self.triangles) // 3
+
+    @property
+    def numFaceVertices(self):
+        return len(self.triangles)
+
+    def getTriangles(self):
+        return [ 1 ] * self.numPolygons, self.triangles
+
+    def getPoint(self, vertex, space=MSpace.kObject):
+        return MPoint( self.points[vertex*3], self.points[vertex*3+1], self.points[vertex*3+2] )
+
+    def getPoints(self, space=MSpace.kObject):
+        return [ self.getPoint( v ) for v in range( self.numVertices ) ]
+
+    getFloatPoints = getPoints
+
+    def getPolygonTriangleVertices(self, face, triangle):
+        return self.triangles[face*3:face*3+3]
+
+    def autoUniformGridParams(self):
+        return None
+
+    def freeCachedIntersectionAccelerator(self):
+        pass
+
+
+class MTypeId(object):
+
+    def __init__(self, id):
+        self.id = id
+
+
+class MPxNode(object):
+    pass
+
+
+class MPxCommand(object):
+    pass
+
+
+class MFnAnimCurve(object):
+    kAnimCurveTA = 0
+    kAnimCurveUA = 1
+
+
+def standInModules():
+    """ The stand-in maya modules by name, maya.cmds is a StandInCommands """
+    modules = dict( ( name, types.ModuleType( name ) ) for name in MAYA_MODULES )
+    modules['maya.cmds'] = StandInCommands()
+
+    api = modules['maya.api.OpenMaya']
+    for cls in ( MSpace, MTime, MDGContext, MDGContextGuard, MMatrix, MVector, MPoint, MDagPath, MPlug,
+                 MSelectionList, MFnDependencyNode, MFnDagNode, MFnMatrixData, MFnMesh, MTypeId,
+                 MPxNode, MPxCommand ):
+        setattr( api, cls.__name__, cls )
+    modules['maya.api.OpenMayaAnim'].MFnAnimCurve = MFnAnimCurve
+    modules['maya.mel'].eval = lambda command: None
+    modules['maya.standalone'].initialize = lambda *args, **kwargs: None
+    modules['maya.standalone'].uninitialize = lambda *args, **kwargs: None
+    modules['ConsistentCameraExport'].disableCamerasAndImagePlanes = lambda: { }
+    modules['ConsistentCameraExport'].enableCamerasAndImagePlanes = lambda states: None
+
+    # submodules are attributes of their package
+    for name, module in modules.items():
+        if '.' in name:
+            package, attribute = name.rsplit( '.', 1 )
+            setattr( modules[package], attribute, module )
+    return modules
+
+
+class installed(object):
+    """
+        Context manager putting the stand-in maya modules in sys.modules
+        for a scene, gives the maya.cmds stand-in. The maya and importer
+        modules there before are put back on exit.
+    """
+
+    def __init__(self, scene):
+        self.scene = scene
+        self.saved = { }
+
+    def __enter__(self):
+        global _scene
+        _scene = self.scene
+        modules = standInModules()
+        for name in MAYA_MODULES + IMPORTER_MODULES:
+            self.saved[name] = sys.modules.pop( name, None )
+        sys.modules.update( modules )
+        return modules['maya.cmds']
+
+    def __exit__(self, *args):
+        global _scene
+        for name, module in self.saved.items():
+            if module is None:
+                sys.modules.pop( name, None )
+            else:
+                sys.modules[name] = module
+        _scene = None
+        return False
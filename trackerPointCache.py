@@ -0,0 +1,212 @@
+#
+# Point caches of trackerImport.
+#
+# A point cache holds the world positions of a set of points over a range
+# of frames as float32, frame after frame:
+#
+#   header, point names (utf-8, newline separated),
+#   then nbrFrames * nbrPoints * 3 floats
+#
+# The file is memory mapped when read, so looking up the points of one
+# frame only touches that frame's bytes whatever the size of the cache.
+# Points without a position on a frame are stored as NaN.
+# Caches of the vertices of a mesh have no point names, they are written
+# a frame at a time by PointCacheWriter as the mesh is evaluated.
+#
+# This module does not import maya.
+
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+POINT_CACHE_EXTENSION = '.trkpts'
+POINT_CACHE_MAGIC = b'TRKP'
+POINT_CACHE_VERSION = 1
+# magic, version, first frame, number of frames, number of points, names size
+POINT_CACHE_HEADER = struct.Struct('<4sIiIII')
+
+NAN = float('nan')
+
+
+def emptyPositions( nbrFrames, nbrPoints ):
+    """ float32 positions for a cache, all NaN """
+    return array( 'f', [NAN] ) * ( nbrFrames * nbrPoints * 3 )
+
+
+def floatBytes( positions ):
+    """ Little endian float32 bytes of an array('f'), a sequence of floats or a numpy array """
+    if numpy is not None and isinstance( positions, numpy.ndarray ):
+        return positions.astype( '<f4' ).tobytes()
+    data = array( 'f', positions )
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tostring() if sys.version_info[0] < 3 else data.tobytes()
+
+
+class PointCacheWriter(object):
+    """
+        Writes a point cache one frame at a time, so a cache larger than
+        the memory can be made:
+            writer = PointCacheWriter( path, firstFrame, nbrFrames, nbrPoints=nbrVertices )
+            for f in frames:
+                writer.writeFrame( points )
+            writer.close()
+        The file is written under a temporary name and renamed by close,
+        so a scene reading the cache never sees a partial file. names can
+        be left out (mesh caches), nbrPoints is then needed.
+    """
+
+    def __init__(self, path, firstFrame, nbrFrames, names=None, nbrPoints=None):
+        names = list( names or [ ] )
+        if nbrPoints is None:
+            nbrPoints = len(names)
+        if names and len(names) != nbrPoints:
+            raise ValueError('Expected {} point names, got {}'.format( nbrPoints, len(names) ))
+        self.path = path
+        self.nbrFrames = nbrFrames
+        self.nbrPoints = nbrPoints
+        self.framesWritten = 0
+        self.tempPath = '{}.{}.tmp'.format( path, os.getpid() )
+        encodedNames = '\n'.join( names ).encode('utf-8')
+        self.file = open( self.tempPath, 'wb' )
+        self.file.write( POINT_CACHE_HEADER.pack( POINT_CACHE_MAGIC, POINT_CACHE_VERSION, int(firstFrame), nbrFrames, nbrPoints, len(encodedNames) ) )
+        self.file.write( encodedNames )
+
+    def writeFrames(self, positions, nbrFrames=1):
+        """ Appends the positions of the next frames, nbrFrames * nbrPoints * 3 floats of any shape """
+        size = positions.size if numpy is not None and isinstance( positions, numpy.ndarray ) else len(positions)
+        if size != nbrFrames * self.nbrPoints * 3:
+            raise ValueError('Expected {} floats, got {}'.format( nbrFrames * self.nbrPoints * 3, size ))
+        if self.framesWritten + nbrFrames > self.nbrFrames:
+            raise ValueError('The cache only holds {} frames'.format( self.nbrFrames ))
+        self.file.write( floatBytes( positions ) )
+        self.framesWritten += nbrFrames
+
+    def writeFrame(self, positions):
+        """ Appends the positions of the next frame, nbrPoints * 3 floats """
+        self.writeFrames( positions, 1 )
+
+    def close(self):
+        """ Renames the cache to its path once every frame is written """
+        self.file.close()
+        if self.framesWritten != self.nbrFrames:
+            os.remove( self.tempPath )
+            raise ValueError('Only {} of the {} frames of {} were written'.format( self.framesWritten, self.nbrFrames, self.path ))
+        if os.path.exists( self.path ):
+            os.remove( self.path )
+        os.rename( self.tempPath, self.path )
+
+    def abort(self):
+        """ Drops a cache left unfinished """
+        self.file.close()
+        if os.path.exists( self.tempPath ):
+            os.remove( self.tempPath )
+
+
+def writePointCache( path, firstFrame, nbrFrames, names, positions ):
+    """
+        Writes a point cache. positions holds nbrFrames * len(names) * 3
+        floats, an array('f') or a numpy array.
+    """
+    writer = PointCacheWriter( path, firstFrame, nbrFrames, names )
+    try:
+        writer.writeFrames( positions, nbrFrames )
+    except Exception:
+        writer.abort()
+        raise
+    writer.close()
+
+
+class PointCache(object):
+    """
+        Read access to a point cache file through a memory map:
+            names - the point names, empty for a mesh cache
+            firstFrame, nbrFrames, nbrPoints
+        Frames outside of the cache are clamped to its first or last frame.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open( path, 'rb' )
+        try:
+            header = self.file.read( POINT_CACHE_HEADER.size )
+            magic, version, self.firstFrame, self.nbrFrames, self.nbrPoints, namesSize = POINT_CACHE_HEADER.unpack( header )
+            if magic != POINT_CACHE_MAGIC or version != POINT_CACHE_VERSION:
+                raise ValueError('Not a point cache file: {}'.format(path))
+            names = self.file.read( namesSize ).decode('utf-8')
+            self.names = names.split('\n') if namesSize else [ ]
+            self.dataOffset = POINT_CACHE_HEADER.size + namesSize
+            self.map = None
+            if self.nbrFrames * self.nbrPoints:
+                self.map = mmap.mmap( self.file.fileno(), 0, access=mmap.ACCESS_READ )
+        except Exception:
+            self.file.close()
+            raise
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def frameNumber(self, frame):
+        """ Index in the cache of the frame closest to a scene frame """
+        i = int( math.floor( frame + 0.5 ) ) - self.firstFrame
+        return min( max( i, 0 ), self.nbrFrames - 1 )
+
+    def framePoints(self, frame):
+        """
+            Positions of all the points at a frame as nbrPoints * 3 floats,
+            a numpy view of the map when numpy is available, an array('f')
+            otherwise.
+        """
+        size = self.nbrPoints * 3
+        if self.map is None:
+            return array( 'f' )
+        start = self.dataOffset + self.frameNumber( frame ) * size * 4
+        if numpy is not None:
+            return numpy.frombuffer( self.map, dtype='<f4', count=size, offset=start )
+        points = array( 'f' )
+        chunk = self.map[start:start + size * 4]
+        if sys.version_info[0] < 3:
+            points.fromstring( chunk )
+        else:
+            points.frombytes( chunk )
+        if sys.byteorder != 'little':
+            points.byteswap()
+        return points
+
+    def framesArray(self):
+        """
+            The whole cache as a read only nbrFrames x nbrPoints x 3 numpy
+            view of the map, nothing is read until it is indexed. Needs numpy.
+        """
+        if self.map is None:
+            return numpy.zeros( ( self.nbrFrames, self.nbrPoints, 3 ), dtype='<f4' )
+        return numpy.frombuffer( self.map, dtype='<f4', count=self.nbrFrames * self.nbrPoints * 3,
+                                 offset=self.dataOffset ).reshape( self.nbrFrames, self.nbrPoints, 3 )
+
+    def pointTrack(self, point):
+        """
+            Returns the frames, x, y and z arrays of one point, leaving
+            out the frames where it has no position.
+        """
+        frames, xs, ys, zs = array('d'), array('d'), array('d'), array('d')
+        for i in range( self.nbrFrames ):
+            points = self.framePoints( self.firstFrame + i )
+            x, y, z = float( points[point*3] ), float( points[point*3+1] ), float( points[point*3+2] )
+            if x != x: # NaN, no position on this frame
+                continue
+            frames.append( self.firstFrame + i )
+            xs.append( x )
+            ys.append( y )
+            zs.append( z )
+        return frames, xs, ys, zs
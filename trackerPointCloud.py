@@ -0,0 +1,133 @@
+#
+# Point cloud output of trackerImport.
+#
+# Instead of locators, dense track sets can be imported as one mesh whose
+# points are read from a point cache (see trackerPointCache) at the
+# current time. This module is a plugin registering the trackerPointCloud
+# node: it reads the cache file and outputs a mesh with one small
+# triangle per tracker with a position on the frame. Nothing but the
+# cache path is saved with the scene.
+#
+# Maya loads the plugin as a module of its own, trackerImport loads it
+# with loadPlugin().
+
+import os
+
+import maya.api.OpenMaya as api
+import maya.cmds as mc
+
+from trackerPointCache import PointCache
+
+NODE_NAME = 'trackerPointCloud'
+# Id in the range reserved for local, in house nodes
+NODE_ID = api.MTypeId( 0x0007F3A0 )
+
+# Use the Maya Python API 2.0 for the plugin
+maya_useNewAPI = True
+
+
+def loadPlugin():
+    """ Loads this module as a plugin if it is not already """
+    pluginPath = os.path.splitext( os.path.abspath( __file__ ) )[0] + '.py'
+    if not mc.pluginInfo( pluginPath, q=True, loaded=True ):
+        mc.loadPlugin( pluginPath, quiet=True )
+
+
+def triangleMesh( points, pointSize, parent ):
+    """
+        Creates mesh data with a triangle centered on every point of a
+        flat x, y, z sequence, skipping the NaN points.
+    """
+    half = pointSize * 0.5
+    vertices = api.MPointArray()
+    for i in range( 0, len(points), 3 ):
+        x, y, z = float( points[i] ), float( points[i+1] ), float( points[i+2] )
+        if x != x: # NaN, no position on this frame
+            continue
+        vertices.append( api.MPoint( x - pointSize, y - half, z ) )
+        vertices.append( api.MPoint( x + pointSize, y - half, z ) )
+        vertices.append( api.MPoint( x, y + pointSize, z ) )
+    nbrTriangles = len(vertices) // 3
+    if nbrTriangles:
+        api.MFnMesh().create( vertices, [3] * nbrTriangles, list( range( len(vertices) ) ), parent=parent )
+    return parent
+
+
+class TrackerPointCloudNode( api.MPxNode ):
+    """
+        Inputs:
+            cachePath - the point cache file
+            time - connected to time1.outTime
+            pointSize - size of the triangle drawn for each point
+        Outputs:
+            outMesh
+    """
+
+    cachePath = None
+    time = None
+    pointSize = None
+    outMesh = None
+
+    def __init__(self):
+        api.MPxNode.__init__(self)
+        self.cache = None
+
+    def pointCache(self, path):
+        """ The open cache of a path, reopened when the path changes """
+        if self.cache is not None and self.cache.path != path:
+            self.cache.close()
+            self.cache = None
+        if self.cache is None and path and os.path.isfile( path ):
+            self.cache = PointCache( path )
+        return self.cache
+
+    def compute(self, plug, dataBlock):
+        if plug != TrackerPointCloudNode.outMesh:
+            return None # let Maya handle the unknown plugs
+
+        path = dataBlock.inputValue( TrackerPointCloudNode.cachePath ).asString()
+        frame = dataBlock.inputValue( TrackerPointCloudNode.time ).asTime().asUnits( api.MTime.uiUnit() )
+        pointSize = dataBlock.inputValue( TrackerPointCloudNode.pointSize ).asDouble()
+
+        meshData = api.MFnMeshData().create()
+        cache = self.pointCache( path )
+        points = cache.framePoints( frame ) if cache is not None else [ ]
+        triangleMesh( points, pointSize, meshData )
+
+        output = dataBlock.outputValue( TrackerPointCloudNode.outMesh )
+        output.setMObject( meshData )
+        output.setClean()
+
+    @staticmethod
+    def creator():
+        return TrackerPointCloudNode()
+
+    @staticmethod
+    def initialize():
+        fnTyped = api.MFnTypedAttribute()
+        fnUnit = api.MFnUnitAttribute()
+        fnNumeric = api.MFnNumericAttribute()
+
+        TrackerPointCloudNode.cachePath = fnTyped.create( 'cachePath', 'cp', api.MFnData.kString )
+        fnTyped.usedAsFilename = True
+        TrackerPointCloudNode.time = fnUnit.create( 'time', 'tm', api.MFnUnitAttribute.kTime, 0.0 )
+        TrackerPointCloudNode.pointSize = fnNumeric.create( 'pointSize', 'ps', api.MFnNumericData.kDouble, 0.2 )
+        fnNumeric.setMin( 0.0 )
+        TrackerPointCloudNode.outMesh = fnTyped.create( 'outMesh', 'om', api.MFnData.kMesh )
+        fnTyped.writable = False
+        fnTyped.storable = False
+
+        for attr in ( TrackerPointCloudNode.cachePath, TrackerPointCloudNode.time,
+                      TrackerPointCloudNode.pointSize, TrackerPointCloudNode.outMesh ):
+            TrackerPointCloudNode.addAttribute( attr )
+        for attr in ( TrackerPointCloudNode.cachePath, TrackerPointCloudNode.time, TrackerPointCloudNode.pointSize ):
+            TrackerPointCloudNode.attributeAffects( attr, TrackerPointCloudNode.outMesh )
+
+
+def initializePlugin( plugin ):
+    api.MFnPlugin( plugin ).registerNode( NODE_NAME, NODE_ID, TrackerPointCloudNode.creator,
+                                          TrackerPointCloudNode.initialize )
+
+
+def uninitializePlugin( plugin ):
+    api.MFnPlugin( plugin ).deregisterNode( NODE_ID )
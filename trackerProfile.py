@@ -0,0 +1,189 @@
+#
+# Phase timings of a tracker import.
+#
+# The import code marks its phases with
+#
+#   with trackerProfile.phase( 'raycast' ):
+#       ...
+#
+# or the @trackerProfile.timed( 'raycast' ) decorator,
+# which costs next to nothing when no profiler is running. A Profiler
+# made active around an import adds up the time spent in every phase and,
+# given the maya.cmds module, counts the commands each phase issues:
+#
+#   profiler = Profiler()
+#   with profiler.active( mc ):
+#       importTrackers( ... )
+#   print( profiler.summary() )
+#   profiler.writeJson( path )
+#
+# This module does not import maya.
+
+import functools
+import json
+from contextlib import contextmanager
+from timeit import default_timer
+
+# the profiler collecting the phases, None when not profiling
+_active = None
+
+
+class NullPhase(object):
+    """ Context doing nothing, used when no profiler is running """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+
+def phase( name ):
+    """ Times a phase of the import on the active profiler, if any """
+    if _active is None:
+        return NULL_PHASE
+    return _active.phase( name )
+
+
+def count( name, value=1 ):
+    """ Adds to a counter of the current phase of the active profiler, if any """
+    if _active is not None:
+        _active.count( name, value )
+
+
+def timed( name ):
+    """ Decorator timing every call of a function as a phase """
+    def decorator( function ):
+        @functools.wraps( function )
+        def wrapper( *args, **kwargs ):
+            with phase( name ):
+                return function( *args, **kwargs )
+        return wrapper
+    return decorator
+
+
+class Phase(object):
+    """ Context timing one entry in a phase """
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.profiler.stats( self.name )
+        self.profiler.stack.append( self.name )
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = default_timer() - self.start
+        self.profiler.stack.pop()
+        stats = self.profiler.stats( self.name )
+        stats['seconds'] += elapsed
+        stats['entries'] += 1
+        return False
+
+
+class Profiler(object):
+    """
+        Time and counters of the phases of a run. Phases can be nested, the
+        time of an inner phase is also part of the time of the outer one.
+        Commands and counters go to the innermost phase, or to 'other'
+        outside of any phase ('other' is not timed).
+    """
+
+    def __init__(self):
+        self.phases = [ ] # in the order they were first entered
+        self.phaseStats = { }
+        self.stack = [ ]
+        self.totalSeconds = 0.0
+
+    def stats(self, name):
+        if name not in self.phaseStats:
+            self.phases.append( name )
+            self.phaseStats[name] = { 'seconds': 0.0, 'entries': 0, 'commands': { }, 'counters': { } }
+        return self.phaseStats[name]
+
+    def phase(self, name):
+        return Phase( self, name )
+
+    def currentPhase(self):
+        return self.stack[-1] if self.stack else 'other'
+
+    def count(self, name, value=1):
+        counters = self.stats( self.currentPhase() )['counters']
+        counters[name] = counters.get( name, 0 ) + value
+
+    def countCommand(self, name):
+        commands = self.stats( self.currentPhase() )['commands']
+        commands[name] = commands.get( name, 0 ) + 1
+
+    @contextmanager
+    def active(self, commandsModule=None):
+        """
+            Makes this profiler the one phase() reports to. When given the
+            maya.cmds module, its functions are wrapped for the duration to
+            count the calls, and restored afterwards.
+        """
+        global _active
+        previous = _active
+        _active = self
+        originals = { }
+        if commandsModule is not None:
+            for name in dir( commandsModule ):
+                function = getattr( commandsModule, name )
+                if name.startswith( '_' ) or not callable( function ):
+                    continue
+                originals[name] = function
+                setattr( commandsModule, name, self.countingCommand( name, function ) )
+        start = default_timer()
+        try:
+            yield self
+        finally:
+            self.totalSeconds += default_timer() - start
+            for name, function in originals.items():
+                setattr( commandsModule, name, function )
+            _active = previous
+
+    def countingCommand(self, name, function):
+        def command( *args, **kwargs ):
+            self.countCommand( name )
+            return function( *args, **kwargs )
+        command.__name__ = name
+        command.__doc__ = function.__doc__
+        return command
+
+    def report(self):
+        """ The timings as a dict, ready for json """
+        phases = [ ]
+        for name in self.phases:
+            stats = self.phaseStats[name]
+            phases.append( {
+                'phase': name,
+                'seconds': stats['seconds'],
+                'entries': stats['entries'],
+                'commandCount': sum( stats['commands'].values() ),
+                'commands': dict( stats['commands'] ),
+                'counters': dict( stats['counters'] ),
+            } )
+        return { 'totalSeconds': self.totalSeconds, 'phases': phases }
+
+    def writeJson(self, path):
+        with open( path, 'w' ) as f:
+            json.dump( self.report(), f, indent=4, sort_keys=True )
+
+    def summary(self):
+        """ The timings as a text table, one line per phase """
+        lines = [ '%-16s %10s %7s %9s  %s' % ( 'phase', 'seconds', '%', 'commands', 'top commands' ) ]
+        total = self.totalSeconds or 1.0
+        for entry in self.report()['phases']:
+            top = sorted( entry['commands'].items(), key=lambda item: -item[1] )[:3]
+            lines.append( '%-16s %10.3f %6.1f%% %9d  %s' % (
+                entry['phase'], entry['seconds'], 100.0 * entry['seconds'] / total, entry['commandCount'],
+                ', '.join( '%s x%d' % item for item in top ) ) )
+        lines.append( '%-16s %10.3f' % ( 'total', self.totalSeconds ) )
+        return '\n'.join( lines )
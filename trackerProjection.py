@@ -0,0 +1,1005 @@
+#
+# Camera projection math for trackerImport.
+#
+# This module does not import maya, matrices are passed as the 16 floats
+# of a Maya MMatrix (row major, translation in 12, 13, 14) and points are
+# multiplied as row vectors like MVector * MMatrix. Everything here can be
+# run and checked outside of Maya.
+#
+# numpy is used when it is available to process all the samples at once,
+# otherwise the same math runs sample by sample on the arrays.
+
+import math
+import multiprocessing
+from array import array
+
+import trackerProfile
+from trackerData import poolContext, processPool
+from trackerPointCache import PointCache
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def frustumExtents( xmin, xmax, ymin, ymax ):
+    """
+        Returns xExtent, yExtent, xCenter, yCenter of the image plane
+        rectangle at depth zmax, used to go from centered uv to camera space.
+    """
+    xExtent = abs( xmax - xmin ) * 0.5
+    yExtent = abs( ymax - ymin ) * 0.5
+    xCenter = ( xmax + xmin ) * 0.5 # average of max and min
+    yCenter = ( ymax + ymin ) * 0.5 # average of max and min
+    return xExtent, yExtent, xCenter, yCenter
+
+
+class CameraTrack(object):
+    """
+        Camera attributes sampled over a range of frames:
+            frames - the sampled frames
+            focalLength - in mm
+            horizontalFilmAperture, verticalFilmAperture - in mm
+            lensSqueezeRatio
+            matrices - the 16 floats of the camera world matrix per frame
+        It is filled in Maya by trackerImport.sampleCameraTrack and only
+        holds plain arrays, so it can be pickled or used without Maya.
+    """
+
+    def __init__(self):
+        self.frames = array('d')
+        self.focalLength = array('d')
+        self.horizontalFilmAperture = array('d')
+        self.verticalFilmAperture = array('d')
+        self.lensSqueezeRatio = array('d')
+        self.matrices = array('d')
+        self.frameLookup = { }
+
+    def addSample(self, frame, focalLength, horizontalFilmAperture, verticalFilmAperture, lensSqueezeRatio, matrix):
+        self.frameLookup[frame] = len(self.frames)
+        self.frames.append( frame )
+        self.focalLength.append( focalLength )
+        self.horizontalFilmAperture.append( horizontalFilmAperture )
+        self.verticalFilmAperture.append( verticalFilmAperture )
+        self.lensSqueezeRatio.append( lensSqueezeRatio )
+        self.matrices.extend( [ matrix[i] for i in range(16) ] )
+
+    def index(self, frame):
+        """ Index of the sample of a frame """
+        return self.frameLookup[frame]
+
+    def matrix(self, i):
+        """ World matrix of sample i as 16 floats """
+        return self.matrices[i*16:i*16+16]
+
+    def position(self, i):
+        """ World position of the camera at sample i """
+        return ( self.matrices[i*16+12], self.matrices[i*16+13], self.matrices[i*16+14] )
+
+    def planeBounds(self, i, zmax):
+        """
+            Returns xmin, xmax, ymin, ymax of the image plane at depth zmax
+            for a camera at the origin looking down -z, at sample i.
+        """
+        # calculate FOV along both horizontal and vertical directions
+        horizontalFOV = 2 * math.atan( self.horizontalFilmAperture[i] / (2 * self.focalLength[i]) )
+        verticalFOV = 2 * math.atan( self.verticalFilmAperture[i] / (2 * self.focalLength[i]) )
+
+        xmax = zmax * math.tan( horizontalFOV /  2 )
+        xmin = zmax * math.tan( horizontalFOV / -2 )
+        ymax = zmax * math.tan( verticalFOV   /  2 )
+        ymin = zmax * math.tan( verticalFOV   / -2 )
+        return xmin, xmax, ymin, ymax
+
+
+def unprojectSamples( u, v, xmin, xmax, ymin, ymax, zmax, matrix, camPos ):
+    """
+        Converts centered u, v samples (sequences of the same length) to
+        world space positions on the plane at depth zmax in front of the
+        camera. matrix is the camera world matrix as 16 floats and camPos
+        the camera world position.
+        Returns the x, y, z world positions as three arrays (numpy arrays
+        when numpy is available, array('d') otherwise).
+    """
+    xExtent, yExtent, xCenter, yCenter = frustumExtents( xmin, xmax, ymin, ymax )
+    z = -zmax
+
+    if numpy is not None:
+        u = numpy.asarray( u, dtype=numpy.float64 )
+        v = numpy.asarray( v, dtype=numpy.float64 )
+        local = numpy.empty( (len(u), 3) )
+        local[:, 0] = ( u * xExtent ) + xCenter
+        local[:, 1] = ( v * -yExtent ) + yCenter
+        local[:, 2] = z
+        rotation = numpy.array( [ matrix[i] for i in range(16) ], dtype=numpy.float64 ).reshape( 4, 4 )[:3, :3]
+        world = local.dot( rotation ) + numpy.array( camPos[:3], dtype=numpy.float64 )
+        return world[:, 0], world[:, 1], world[:, 2]
+
+    m = [ matrix[i] for i in range(16) ]
+    xs = array('d', [0.0]) * len(u)
+    ys = array('d', [0.0]) * len(u)
+    zs = array('d', [0.0]) * len(u)
+    for i in range(len(u)):
+        x = ( u[i] * xExtent ) + xCenter
+        y = ( v[i] * -yExtent ) + yCenter
+        xs[i] = ( x * m[0] + y * m[4] + z * m[8] ) + camPos[0]
+        ys[i] = ( x * m[1] + y * m[5] + z * m[9] ) + camPos[1]
+        zs[i] = ( x * m[2] + y * m[6] + z * m[10] ) + camPos[2]
+    return xs, ys, zs
+
+
+def transformPoints( points, matrix ):
+    """
+        Moves points, a flat x, y, z sequence, by a matrix of 16 floats
+        (object to world space). Returns a float32 numpy array of
+        nbrPoints x 3 when numpy is available, a flat array('f') otherwise,
+        ready for a point cache.
+    """
+    m = [ matrix[i] for i in range(16) ]
+    if numpy is not None:
+        local = numpy.asarray( points, dtype=numpy.float64 ).reshape( -1, 3 )
+        world = local.dot( numpy.array( m, dtype=numpy.float64 ).reshape( 4, 4 )[:3, :3] ) + m[12:15]
+        return world.astype( numpy.float32 )
+
+    world = array('f', [0.0]) * len(points)
+    for i in range( 0, len(points), 3 ):
+        x, y, z = points[i], points[i+1], points[i+2]
+        world[i] = x * m[0] + y * m[4] + z * m[8] + m[12]
+        world[i+1] = x * m[1] + y * m[5] + z * m[9] + m[13]
+        world[i+2] = x * m[2] + y * m[6] + z * m[10] + m[14]
+    return world
+
+
+def barycentricPoint( p0, p1, p2, bary1, bary2 ):
+    """
+        Position of a hit from its barycentric coordinates, with the same
+        convention as MFnMesh.closestIntersection: bary1 weights the first
+        vertex of the triangle, bary2 the second.
+    """
+    bary3 = 1.0 - bary1 - bary2
+    return ( bary1 * p0[0] + bary2 * p1[0] + bary3 * p2[0],
+             bary1 * p0[1] + bary2 * p1[1] + bary3 * p2[1],
+             bary1 * p0[2] + bary2 * p1[2] + bary3 * p2[2] )
+
+
+def triangleNormal( p0, p1, p2 ):
+    """ Unit normal of a triangle, following the winding of its vertices """
+    e1 = ( p1[0]-p0[0], p1[1]-p0[1], p1[2]-p0[2] )
+    e2 = ( p2[0]-p0[0], p2[1]-p0[1], p2[2]-p0[2] )
+    n = ( e1[1]*e2[2] - e1[2]*e2[1], e1[2]*e2[0] - e1[0]*e2[2], e1[0]*e2[1] - e1[1]*e2[0] )
+    length = math.sqrt( n[0]*n[0] + n[1]*n[1] + n[2]*n[2] )
+    if length == 0.0:
+        return ( 0.0, 0.0, 1.0 )
+    return ( n[0]/length, n[1]/length, n[2]/length )
+
+
+def normalRotation( normal, up=(0.0, 1.0, 0.0) ):
+    """
+        Returns the xyz rotation in degrees that aims the local z axis along
+        normal, keeping the local y axis as close to up as possible (the
+        x axis is used as up when the normal is parallel to it). This is
+        the orientation the normalConstraint of the importer used to give.
+    """
+    z = normal
+    x = ( up[1]*z[2] - up[2]*z[1], up[2]*z[0] - up[0]*z[2], up[0]*z[1] - up[1]*z[0] )
+    length = math.sqrt( x[0]*x[0] + x[1]*x[1] + x[2]*x[2] )
+    if length < 1e-9:
+        return normalRotation( normal, (1.0, 0.0, 0.0) )
+    x = ( x[0]/length, x[1]/length, x[2]/length )
+    y = ( z[1]*x[2] - z[2]*x[1], z[2]*x[0] - z[0]*x[2], z[0]*x[1] - z[1]*x[0] )
+
+    # rows of a Maya rotation matrix are the local axes, with rotate
+    # order xyz the matrix is Rx * Ry * Rz
+    sy = max( -1.0, min( 1.0, -x[2] ) )
+    ry = math.asin( sy )
+    if abs( math.cos( ry ) ) > 1e-9:
+        rx = math.atan2( y[2], z[2] )
+        rz = math.atan2( x[1], x[0] )
+    else:
+        rx = math.atan2( -z[1], y[1] )
+        rz = 0.0
+    return ( math.degrees(rx), math.degrees(ry), math.degrees(rz) )
+
+
+# same defaults as closestRayIntersect
+MAX_PARAM = 999999
+TOLERANCE = 0.0001
+
+MISS = (False, (0,0,0), (0,0,0,0))
+
+
+class TriangleBVH(object):
+    """
+        Bounding volume hierarchy over the triangles of a mesh, used to
+        intersect rays without going through MFnMesh.closestIntersection.
+            points    - flat x, y, z sequence of the vertex positions
+            triangles - flat sequence of 3 vertex ids per triangle
+            triangleFaces   - the polygon id of each triangle
+            triangleIndices - the index of each triangle inside its polygon
+        The two last ones are what MFnMesh.getTriangles describes, they
+        default to one polygon per triangle.
+        Hits are returned in the same shape as closestRayIntersect:
+            (True, (x,y,z), (hitFace, hitTriangle, hitBary1, hitBary2))
+        where the hit position is
+            hitBary1 * p0 + hitBary2 * p1 + (1 - hitBary1 - hitBary2) * p2
+        for the three vertices p0, p1, p2 of the triangle.
+        A ray can be given a hint, the triangle its tracker hit on the
+        previous frame. That triangle is tested first, then when it is
+        missed the ones sharing a vertex with it. A hit there bounds the
+        search, so the tree walk only visits the boxes in front of it
+        instead of every box along the ray, through the back of the mesh.
+        The result is the same as without the hint. stats counts the hinted
+        rays, the hints that hit, the rays searched in full, the node and
+        triangle tests.
+    """
+
+    LEAF_SIZE = 4
+
+    def __init__(self, points, triangles, triangleFaces=None, triangleIndices=None):
+        nbrTriangles = len(triangles) // 3
+        if triangleFaces is None:
+            triangleFaces = range( nbrTriangles )
+        if triangleIndices is None:
+            triangleIndices = [0] * nbrTriangles
+
+        if numpy is not None:
+            self.points = numpy.asarray( points, dtype=numpy.float64 ).reshape( -1, 3 )
+            self.triangles = numpy.asarray( triangles, dtype=numpy.int64 ).reshape( -1, 3 )
+            self.triangleFaces = numpy.asarray( triangleFaces, dtype=numpy.int64 )
+            self.triangleIndices = numpy.asarray( triangleIndices, dtype=numpy.int64 )
+        else:
+            self.points = array( 'd', points )
+            self.triangles = array( 'l', triangles )
+            self.triangleFaces = array( 'l', triangleFaces )
+            self.triangleIndices = array( 'l', triangleIndices )
+
+        self.vertexTriangles = None
+        self.stats = dict( ( name, 0 ) for name in ( 'hintedRays', 'hintHits', 'fullSearches', 'nodeTests', 'triangleTests' ) )
+        self.build()
+
+    def countStat(self, name, value):
+        """ Adds to one of the stats, and to the counters of the current profiled phase """
+        self.stats[name] += int( value )
+        trackerProfile.count( name, value )
+
+    def statsSummary(self):
+        """ The stats as a line of text """
+        stats = self.stats
+        return '%d rays, %d with the previous hit as a hint, %d of them hit near it, %d full searches, %d node and %d triangle tests' % (
+            stats['hintHits'] + stats['fullSearches'], stats['hintedRays'], stats['hintHits'], stats['fullSearches'],
+            stats['nodeTests'], stats['triangleTests'] )
+
+    def triangleCount(self):
+        return len(self.triangleFaces)
+
+    def trianglePoints(self, tri):
+        """ Returns the three vertex positions of a triangle as tuples """
+        if numpy is not None:
+            return [ tuple( self.points[vid] ) for vid in self.triangles[tri] ]
+        p = self.points
+        result = [ ]
+        for vid in self.triangles[tri*3:tri*3+3]:
+            result.append( ( p[vid*3], p[vid*3+1], p[vid*3+2] ) )
+        return result
+
+    def triangleBounds(self):
+        """ Returns the min and max corner of every triangle as lists of tuples """
+        bmin = [ ]
+        bmax = [ ]
+        for tri in range( self.triangleCount() ):
+            p0, p1, p2 = self.trianglePoints( tri )
+            bmin.append( ( min(p0[0], p1[0], p2[0]), min(p0[1], p1[1], p2[1]), min(p0[2], p1[2], p2[2]) ) )
+            bmax.append( ( max(p0[0], p1[0], p2[0]), max(p0[1], p1[1], p2[1]), max(p0[2], p1[2], p2[2]) ) )
+        return bmin, bmax
+
+    def build(self):
+        """
+            Top down build, splitting the triangles at the median of their
+            centers along the longest axis until LEAF_SIZE triangles remain.
+            Nodes are stored in flat arrays, a node with nodeLeft -1 is a
+            leaf holding order[nodeStart:nodeStart+nodeCount].
+        """
+        nbrTriangles = self.triangleCount()
+        if numpy is not None:
+            corners = self.points[ self.triangles ]
+            triMin = corners.min( axis=1 )
+            triMax = corners.max( axis=1 )
+            centers = ( triMin + triMax ) * 0.5
+            order = numpy.arange( nbrTriangles )
+        else:
+            triMin, triMax = self.triangleBounds()
+            centers = [ ( (a[0]+b[0])*0.5, (a[1]+b[1])*0.5, (a[2]+b[2])*0.5 ) for a, b in zip(triMin, triMax) ]
+            order = list( range( nbrTriangles ) )
+
+        nodeMin = [ ]
+        nodeMax = [ ]
+        nodeLeft = [ ]
+        nodeRight = [ ]
+        nodeStart = [ ]
+        nodeCount = [ ]
+
+        def addNode():
+            nodeMin.append( None )
+            nodeMax.append( None )
+            nodeLeft.append( -1 )
+            nodeRight.append( -1 )
+            nodeStart.append( 0 )
+            nodeCount.append( 0 )
+            return len(nodeLeft) - 1
+
+        stack = [ ( addNode(), 0, nbrTriangles ) ]
+        while stack:
+            node, start, end = stack.pop()
+            if numpy is not None:
+                subset = order[start:end]
+                nodeMin[node] = tuple( triMin[subset].min( axis=0 ) ) if end > start else (0.0, 0.0, 0.0)
+                nodeMax[node] = tuple( triMax[subset].max( axis=0 ) ) if end > start else (0.0, 0.0, 0.0)
+            else:
+                subset = order[start:end]
+                nodeMin[node] = tuple( min( triMin[i][a] for i in subset ) for a in range(3) ) if subset else (0.0, 0.0, 0.0)
+                nodeMax[node] = tuple( max( triMax[i][a] for i in subset ) for a in range(3) ) if subset else (0.0, 0.0, 0.0)
+
+            if end - start <= self.LEAF_SIZE:
+                nodeStart[node] = start
+                nodeCount[node] = end - start
+                continue
+
+            # split along the longest axis of the triangle centers
+            if numpy is not None:
+                c = centers[subset]
+                axis = int( numpy.argmax( c.max( axis=0 ) - c.min( axis=0 ) ) )
+                mid = ( end - start ) // 2
+                order[start:end] = subset[ numpy.argpartition( c[:, axis], mid ) ]
+            else:
+                extent = [ max( centers[i][a] for i in subset ) - min( centers[i][a] for i in subset ) for a in range(3) ]
+                axis = extent.index( max(extent) )
+                order[start:end] = sorted( subset, key=lambda i: centers[i][axis] )
+                mid = ( end - start ) // 2
+
+            left = addNode()
+            right = addNode()
+            nodeLeft[node] = left
+            nodeRight[node] = right
+            stack.append( ( left, start, start + mid ) )
+            stack.append( ( right, start + mid, end ) )
+
+        if numpy is not None:
+            self.order = order
+            self.nodeMin = numpy.array( nodeMin, dtype=numpy.float64 )
+            self.nodeMax = numpy.array( nodeMax, dtype=numpy.float64 )
+            self.nodeLeft = numpy.array( nodeLeft, dtype=numpy.int64 )
+            self.nodeRight = numpy.array( nodeRight, dtype=numpy.int64 )
+            self.nodeStart = numpy.array( nodeStart, dtype=numpy.int64 )
+            self.nodeCount = numpy.array( nodeCount, dtype=numpy.int64 )
+        else:
+            self.order = array( 'l', order )
+            self.nodeMin = nodeMin
+            self.nodeMax = nodeMax
+            self.nodeLeft = array( 'l', nodeLeft )
+            self.nodeRight = array( 'l', nodeRight )
+            self.nodeStart = array( 'l', nodeStart )
+            self.nodeCount = array( 'l', nodeCount )
+
+    def refit(self, points):
+        """
+            Moves the vertices of the mesh to new positions, same topology,
+            and updates the boxes of the nodes bottom up instead of building
+            the tree again. The tree keeps the splits of the points it was
+            built on, it gets looser as the mesh deforms but every box still
+            holds its triangles, so the hits are the same as after a build.
+        """
+        nbrTriangles = self.triangleCount()
+        if numpy is not None:
+            self.points = numpy.asarray( points, dtype=numpy.float64 ).reshape( -1, 3 )
+            if not nbrTriangles:
+                return
+            if getattr( self, 'refitLevels', None ) is None:
+                self.buildRefitLevels()
+            corners = self.points[ self.triangles[ self.order ] ]
+            # the leaves hold consecutive runs of order, reduced in one go
+            self.nodeMin[self.refitLeaves] = numpy.minimum.reduceat( corners.min( axis=1 ), self.nodeStart[self.refitLeaves] )
+            self.nodeMax[self.refitLeaves] = numpy.maximum.reduceat( corners.max( axis=1 ), self.nodeStart[self.refitLeaves] )
+            for nodes in self.refitLevels:
+                self.nodeMin[nodes] = numpy.minimum( self.nodeMin[ self.nodeLeft[nodes] ], self.nodeMin[ self.nodeRight[nodes] ] )
+                self.nodeMax[nodes] = numpy.maximum( self.nodeMax[ self.nodeLeft[nodes] ], self.nodeMax[ self.nodeRight[nodes] ] )
+            return
+
+        self.points = array( 'd', points )
+        if not nbrTriangles:
+            return
+        triMin, triMax = self.triangleBounds()
+        # children are always stored after their parent
+        for node in range( len(self.nodeLeft) - 1, -1, -1 ):
+            left = self.nodeLeft[node]
+            if left < 0:
+                subset = self.order[ self.nodeStart[node]:self.nodeStart[node] + self.nodeCount[node] ]
+                self.nodeMin[node] = tuple( min( triMin[i][a] for i in subset ) for a in range(3) )
+                self.nodeMax[node] = tuple( max( triMax[i][a] for i in subset ) for a in range(3) )
+            else:
+                right = self.nodeRight[node]
+                self.nodeMin[node] = tuple( min( self.nodeMin[left][a], self.nodeMin[right][a] ) for a in range(3) )
+                self.nodeMax[node] = tuple( max( self.nodeMax[left][a], self.nodeMax[right][a] ) for a in range(3) )
+
+    def buildRefitLevels(self):
+        """
+            The leaves sorted by their start in order, and the inner nodes
+            grouped by depth, deepest first, for refit.
+        """
+        leaves = numpy.flatnonzero( self.nodeLeft < 0 )
+        self.refitLeaves = leaves[ numpy.argsort( self.nodeStart[leaves] ) ]
+        levels = [ ]
+        nodes = numpy.zeros( 1, dtype=numpy.int64 )
+        while len(nodes):
+            nodes = nodes[ self.nodeLeft[nodes] >= 0 ]
+            if len(nodes):
+                levels.append( nodes )
+            nodes = numpy.concatenate( ( self.nodeLeft[nodes], self.nodeRight[nodes] ) )
+        self.refitLevels = levels[::-1]
+
+    def triangleId(self, face, triangle):
+        """ Returns the triangle of the bvh for a polygon id and its triangle index """
+        if getattr(self, 'faceTriangles', None) is None:
+            self.faceTriangles = { }
+            for tri in range( self.triangleCount() ):
+                self.faceTriangles[ ( int(self.triangleFaces[tri]), int(self.triangleIndices[tri]) ) ] = tri
+        return self.faceTriangles[ ( int(face), int(triangle) ) ]
+
+    def hintTriangle(self, hitInfo):
+        """ The triangle of a previous (hitFace, hitTriangle, ...) hit as a ray hint, -1 when there is none """
+        if not hitInfo:
+            return -1
+        try:
+            return self.triangleId( hitInfo[0], hitInfo[1] )
+        except KeyError:
+            return -1 # the topology changed
+
+    def buildVertexTriangles(self):
+        """
+            The triangles of every vertex, vertexTriangles[vertexStart[v]:vertexStart[v+1]]
+            are the triangles using vertex v.
+        """
+        nbrVertices = len(self.points) if numpy is not None else len(self.points) // 3
+        if numpy is not None:
+            vertices = self.triangles.ravel()
+            order = numpy.argsort( vertices, kind='mergesort' )
+            self.vertexTriangles = order // 3
+            self.vertexStart = numpy.searchsorted( vertices[order], numpy.arange( nbrVertices + 1 ) )
+        else:
+            lists = [ [ ] for v in range( nbrVertices ) ]
+            for i, vertex in enumerate( self.triangles ):
+                lists[vertex].append( i // 3 )
+            self.vertexTriangles = array( 'l' )
+            self.vertexStart = array( 'l', [ 0 ] )
+            for triangles in lists:
+                self.vertexTriangles.extend( triangles )
+                self.vertexStart.append( len(self.vertexTriangles) )
+
+    def neighbourTriangles(self, tri):
+        """ A triangle and the triangles sharing a vertex with it, some of them more than once """
+        if self.vertexTriangles is None:
+            self.buildVertexTriangles()
+        if numpy is not None:
+            vertices = self.triangles[tri]
+        else:
+            vertices = self.triangles[tri*3:tri*3+3]
+        result = [ ]
+        for vertex in vertices:
+            result.extend( self.vertexTriangles[ self.vertexStart[vertex]:self.vertexStart[vertex+1] ] )
+        return result
+
+    def hitPosition(self, hitInfo):
+        """ Returns where a (hitFace, hitTriangle, hitBary1, hitBary2) hit is on the current points """
+        face, triangle, bary1, bary2 = hitInfo
+        p0, p1, p2 = self.trianglePoints( self.triangleId( face, triangle ) )
+        return barycentricPoint( p0, p1, p2, bary1, bary2 )
+
+    def hitResult(self, origin, direction, t, tri, u, v):
+        """ Formats a hit like closestRayIntersect """
+        tri = int(tri)
+        position = ( origin[0] + direction[0] * t,
+                     origin[1] + direction[1] * t,
+                     origin[2] + direction[2] * t )
+        return ( True, position, ( int(self.triangleFaces[tri]), int(self.triangleIndices[tri]), 1.0 - u - v, u ) )
+
+    def intersectTriangle(self, origin, direction, tri, maxParam, tolerance=TOLERANCE):
+        """
+            Moller-Trumbore test of one ray against one triangle, both sides
+            of the triangle are hit. Returns (t, u, v) or None on a miss.
+        """
+        p0, p1, p2 = self.trianglePoints( tri )
+        e1 = ( p1[0]-p0[0], p1[1]-p0[1], p1[2]-p0[2] )
+        e2 = ( p2[0]-p0[0], p2[1]-p0[1], p2[2]-p0[2] )
+        d = direction
+        pvec = ( d[1]*e2[2] - d[2]*e2[1], d[2]*e2[0] - d[0]*e2[2], d[0]*e2[1] - d[1]*e2[0] )
+        det = e1[0]*pvec[0] + e1[1]*pvec[1] + e1[2]*pvec[2]
+        if abs(det) < 1e-12:
+            return None
+        invDet = 1.0 / det
+        tvec = ( origin[0]-p0[0], origin[1]-p0[1], origin[2]-p0[2] )
+        u = ( tvec[0]*pvec[0] + tvec[1]*pvec[1] + tvec[2]*pvec[2] ) * invDet
+        if u < -tolerance or u > 1.0 + tolerance:
+            return None
+        qvec = ( tvec[1]*e1[2] - tvec[2]*e1[1], tvec[2]*e1[0] - tvec[0]*e1[2], tvec[0]*e1[1] - tvec[1]*e1[0] )
+        v = ( d[0]*qvec[0] + d[1]*qvec[1] + d[2]*qvec[2] ) * invDet
+        if v < -tolerance or u + v > 1.0 + tolerance:
+            return None
+        t = ( e2[0]*qvec[0] + e2[1]*qvec[1] + e2[2]*qvec[2] ) * invDet
+        if t < 0.0 or t > maxParam:
+            return None
+        return ( t, u, v )
+
+    def intersect(self, origin, direction, maxParam=MAX_PARAM, tolerance=TOLERANCE, hint=-1):
+        """ Closest hit of a single ray, see the class docstring for the result and the hint """
+        inverse = [ ( 1.0 / c ) if c != 0.0 else 1e300 for c in direction ]
+        best = None
+        bestParam = maxParam
+        if hint >= 0:
+            self.countStat( 'hintedRays', 1 )
+            hit = self.intersectTriangle( origin, direction, hint, bestParam, tolerance )
+            if hit is not None:
+                self.countStat( 'triangleTests', 1 )
+                bestParam = hit[0]
+                best = ( hit[0], hint, hit[1], hit[2] )
+            else:
+                neighbours = self.neighbourTriangles( hint )
+                self.countStat( 'triangleTests', 1 + len(neighbours) )
+                for tri in neighbours:
+                    hit = self.intersectTriangle( origin, direction, tri, bestParam, tolerance )
+                    if hit is not None:
+                        bestParam = hit[0]
+                        best = ( hit[0], tri, hit[1], hit[2] )
+        if best is not None:
+            self.countStat( 'hintHits', 1 )
+        else:
+            self.countStat( 'fullSearches', 1 )
+
+        nodeTests = 0
+        triangleTests = 0
+        stack = [ 0 ]
+        while stack:
+            node = stack.pop()
+            nodeTests += 1
+            bmin = self.nodeMin[node]
+            bmax = self.nodeMax[node]
+            tnear = 0.0
+            tfar = bestParam
+            for a in range(3):
+                t1 = ( bmin[a] - origin[a] ) * inverse[a]
+                t2 = ( bmax[a] - origin[a] ) * inverse[a]
+                if t1 > t2:
+                    t1, t2 = t2, t1
+                tnear = max( tnear, t1 )
+                tfar = min( tfar, t2 )
+            if tnear > tfar:
+                continue
+
+            if self.nodeLeft[node] < 0:
+                start = self.nodeStart[node]
+                triangleTests += self.nodeCount[node]
+                for i in range( start, start + self.nodeCount[node] ):
+                    tri = self.order[i]
+                    hit = self.intersectTriangle( origin, direction, tri, bestParam, tolerance )
+                    if hit is not None:
+                        bestParam = hit[0]
+                        best = ( hit[0], tri, hit[1], hit[2] )
+            else:
+                stack.append( self.nodeLeft[node] )
+                stack.append( self.nodeRight[node] )
+        self.countStat( 'nodeTests', nodeTests )
+        self.countStat( 'triangleTests', triangleTests )
+
+        if best is None:
+            return MISS
+        return self.hitResult( origin, direction, *best )
+
+    def intersectMany(self, origins, directions, maxParam=MAX_PARAM, tolerance=TOLERANCE, hints=None):
+        """
+            Closest hits of a batch of rays (sequences of x, y, z triples),
+            for example all the trackers of a frame. With numpy all the rays
+            walk the tree together, one level at a time. hints holds a
+            triangle per ray (-1 for none), see the class docstring.
+            Returns one closestRayIntersect style tuple per ray.
+        """
+        if hints is None:
+            hints = [ -1 ] * len(origins)
+        if numpy is None:
+            return [ self.intersect( o, d, maxParam, tolerance, h ) for o, d, h in zip( origins, directions, hints ) ]
+
+        origins = numpy.asarray( origins, dtype=numpy.float64 ).reshape( -1, 3 )
+        directions = numpy.asarray( directions, dtype=numpy.float64 ).reshape( -1, 3 )
+        nbrRays = len(origins)
+        with numpy.errstate( divide='ignore', invalid='ignore' ):
+            inverse = numpy.where( directions != 0.0, 1.0 / directions, 1e300 )
+
+        bestParam = numpy.full( nbrRays, float(maxParam) )
+        bestTri = numpy.full( nbrRays, -1, dtype=numpy.int64 )
+        bestU = numpy.zeros( nbrRays )
+        bestV = numpy.zeros( nbrRays )
+
+        # hinted rays: their previous triangle first, then its neighbours
+        # for the ones that missed it
+        hints = numpy.asarray( hints, dtype=numpy.int64 ).reshape( -1 )
+        hinted = numpy.flatnonzero( hints >= 0 )
+        if len(hinted):
+            self.intersectPairs( origins, directions, hinted, hints[hinted], bestParam, bestTri, bestU, bestV, tolerance )
+            self.countStat( 'hintedRays', len(hinted) )
+            self.countStat( 'triangleTests', len(hinted) )
+            missed = hinted[ bestTri[hinted] < 0 ]
+        if len(hinted) and len(missed):
+            if self.vertexTriangles is None:
+                self.buildVertexTriangles()
+            vertices = self.triangles[ hints[missed] ].ravel()
+            counts = self.vertexStart[vertices+1] - self.vertexStart[vertices]
+            pairRays = numpy.repeat( numpy.repeat( missed, 3 ), counts )
+            firsts = numpy.repeat( self.vertexStart[vertices] - numpy.cumsum( counts ) + counts, counts )
+            tris = self.vertexTriangles[ firsts + numpy.arange( len(pairRays) ) ]
+            self.intersectPairs( origins, directions, pairRays, tris, bestParam, bestTri, bestU, bestV, tolerance )
+            self.countStat( 'triangleTests', len(pairRays) )
+        hintHits = int( ( bestTri >= 0 ).sum() )
+        self.countStat( 'hintHits', hintHits )
+        self.countStat( 'fullSearches', nbrRays - hintHits )
+
+        nodeTests = 0
+        triangleTests = 0
+        rays = numpy.arange( nbrRays )
+        nodes = numpy.zeros( nbrRays, dtype=numpy.int64 )
+        while len(rays) and self.triangleCount():
+            nodeTests += len(rays)
+            # slab test of every (ray, node) pair of the frontier
+            o = origins[rays]
+            inv = inverse[rays]
+            t1 = ( self.nodeMin[nodes] - o ) * inv
+            t2 = ( self.nodeMax[nodes] - o ) * inv
+            tnear = numpy.maximum( numpy.minimum( t1, t2 ).max( axis=1 ), 0.0 )
+            tfar = numpy.minimum( numpy.maximum( t1, t2 ).min( axis=1 ), bestParam[rays] )
+            keep = tnear <= tfar
+            rays = rays[keep]
+            nodes = nodes[keep]
+
+            # leaves: test their triangles
+            leaf = self.nodeLeft[nodes] < 0
+            if leaf.any():
+                leafRays = rays[leaf]
+                leafNodes = nodes[leaf]
+                counts = self.nodeCount[leafNodes]
+                pairRays = numpy.repeat( leafRays, counts )
+                firsts = numpy.repeat( self.nodeStart[leafNodes] - numpy.cumsum( counts ) + counts, counts )
+                tris = self.order[ firsts + numpy.arange( len(pairRays) ) ]
+                triangleTests += len(pairRays)
+                self.intersectPairs( origins, directions, pairRays, tris, bestParam, bestTri, bestU, bestV, tolerance )
+
+            # inner nodes: continue with both children
+            inner = ~leaf
+            rays = numpy.concatenate( ( rays[inner], rays[inner] ) )
+            nodes = numpy.concatenate( ( self.nodeLeft[nodes[inner]], self.nodeRight[nodes[inner]] ) )
+        self.countStat( 'nodeTests', nodeTests )
+        self.countStat( 'triangleTests', triangleTests )
+
+        results = [ ]
+        for r in range(nbrRays):
+            if bestTri[r] < 0:
+                results.append( MISS )
+            else:
+                results.append( self.hitResult( tuple(origins[r]), tuple(directions[r]), bestParam[r], bestTri[r], bestU[r], bestV[r] ) )
+        return results
+
+    def intersectPairs(self, origins, directions, rays, tris, bestParam, bestTri, bestU, bestV, tolerance):
+        """ Vectorized Moller-Trumbore over (ray, triangle) pairs, keeps the closest hit per ray """
+        corners = self.points[ self.triangles[tris] ]
+        p0 = corners[:, 0]
+        e1 = corners[:, 1] - p0
+        e2 = corners[:, 2] - p0
+        d = directions[rays]
+        pvec = numpy.cross( d, e2 )
+        det = ( e1 * pvec ).sum( axis=1 )
+        valid = numpy.abs( det ) >= 1e-12
+        invDet = numpy.where( valid, 1.0 / numpy.where( valid, det, 1.0 ), 0.0 )
+        tvec = origins[rays] - p0
+        u = ( tvec * pvec ).sum( axis=1 ) * invDet
+        qvec = numpy.cross( tvec, e1 )
+        v = ( d * qvec ).sum( axis=1 ) * invDet
+        t = ( e2 * qvec ).sum( axis=1 ) * invDet
+        valid &= ( u >= -tolerance ) & ( u <= 1.0 + tolerance ) & ( v >= -tolerance ) & ( u + v <= 1.0 + tolerance )
+        valid &= ( t >= 0.0 ) & ( t <= bestParam[rays] )
+        if not valid.any():
+            return
+        rays = rays[valid]
+        t = t[valid]
+        # closest first, so for each ray the first entry is its best hit
+        order = numpy.lexsort( ( t, rays ) )
+        rays = rays[order]
+        first = numpy.ones( len(rays), dtype=bool )
+        first[1:] = rays[1:] != rays[:-1]
+        picked = numpy.flatnonzero( valid )[ order[first] ]
+        rays = rays[first]
+        bestParam[rays] = t[ order[first] ]
+        bestTri[rays] = tris[picked]
+        bestU[rays] = u[picked]
+        bestV[rays] = v[picked]
+
+
+class CachedMeshIntersector(object):
+    """
+        Casts the rays against a point cache of the target mesh, a
+        trackerPointCache.PointCache of its world space vertices over the
+        frame range, instead of the mesh itself. The TriangleBVH is built
+        on the first frame and refit to the cached points of the next ones,
+        and the stuck hits are looked up on the cached points of their
+        frame, so nothing is evaluated in Maya once the cache is written.
+        It has the interface of trackerImport.MeshIntersector and no maya
+        dependency, it can run in worker processes.
+            cache - the PointCache, frames outside of it are clamped
+            triangles, triangleFaces, triangleIndices - as TriangleBVH
+            bvh - or a TriangleBVH of the mesh, built in another process
+    """
+
+    def __init__(self, cache, triangles=None, triangleFaces=None, triangleIndices=None, bvh=None):
+        self.cache = cache
+        self.triangles = triangles
+        self.triangleFaces = triangleFaces
+        self.triangleIndices = triangleIndices
+        self.bvh = bvh # a TriangleBVH of the mesh given instead of the triangles is refit from the first frame
+        self.frame = None
+        self.cacheFrame = None # the frame of the cache the bvh is fit to
+        self.frameCount = 0
+        self.refitCount = 0
+
+    @trackerProfile.timed( 'raycast' )
+    def update(self, frame):
+        """ Call once per frame, with the frame to project on """
+        self.frameCount += 1
+        self.fit( frame )
+
+    def fit(self, frame):
+        """ Builds or refits the bvh to the points of a frame """
+        self.frame = frame
+        cacheFrame = self.cache.frameNumber( frame )
+        if cacheFrame == self.cacheFrame:
+            return
+        points = self.cache.framePoints( frame )
+        if self.bvh is None:
+            self.bvh = TriangleBVH( points, self.triangles, self.triangleFaces, self.triangleIndices )
+        else:
+            self.bvh.refit( points )
+            self.refitCount += 1
+        self.cacheFrame = cacheFrame
+
+    def intersectMany(self, points, directions, hints=None):
+        """
+            Closest hits of a batch of world space rays, one result per ray.
+            hints are the previous hits of the rays (hitInfo or None).
+        """
+        if hints is not None:
+            hints = [ self.bvh.hintTriangle( hint ) for hint in hints ]
+        return self.bvh.intersectMany( points, directions, hints=hints )
+
+    def intersect(self, point, direction):
+        return self.intersectMany( [point], [direction] )[0]
+
+    def hitTrianglePoints(self, hitInfo, frame=None):
+        """ Returns the world positions at a frame (None for the current one) of the three vertices of the triangle of a hit """
+        tri = self.bvh.triangleId( hitInfo[0], hitInfo[1] )
+        if frame is None or self.cache.frameNumber( frame ) == self.cacheFrame:
+            return self.bvh.trianglePoints( tri )
+        points = self.cache.framePoints( frame )
+        if numpy is not None:
+            vertices = self.bvh.triangles[tri]
+        else:
+            vertices = self.bvh.triangles[tri*3:tri*3+3]
+        return [ ( float( points[v*3] ), float( points[v*3+1] ), float( points[v*3+2] ) ) for v in vertices ]
+
+    def hitPosition(self, hitInfo, frame=None):
+        """ Returns the world position of a previous (hitFace, hitTriangle, hitBary1, hitBary2) hit at a frame, None for the current one """
+        p0, p1, p2 = self.hitTrianglePoints( hitInfo, frame )
+        return barycentricPoint( p0, p1, p2, hitInfo[2], hitInfo[3] )
+
+    def hitNormal(self, hitInfo, frame=None):
+        """ Returns the world normal of the triangle of a hit at a frame, None for the current one """
+        p0, p1, p2 = self.hitTrianglePoints( hitInfo, frame )
+        return triangleNormal( p0, p1, p2 )
+
+    def release(self):
+        """ Drops the bvh, closes the cache and prints the stats """
+        print( 'Target mesh BVH built once and refit %d times for %d frames' % (self.refitCount, self.frameCount) )
+        if self.bvh is not None:
+            print( self.bvh.statsSummary() )
+        self.bvh = None
+        self.cache.close()
+
+
+def projectFrames( cameraTrack, zmax, frameSamples, intersector=None ):
+    """
+        Projects the 2D samples of a run of frames. frameSamples yields
+        (frame, trackers, u, v) per frame, the trackers with a sample on
+        the frame and their centered coordinates. Yields per frame
+        (frame, trackers, xs, ys, zs, hits): the world positions of the
+        samples on the image plane at depth zmax, and with an intersector
+        the closest hit of the ray from the camera through each of them
+        (None without). The intersector is updated to every frame and the
+        ray of a tracker is hinted with its previous hit.
+    """
+    rayHints = { } # the last live hit of each tracker, where its next ray is looked for first
+    for f, trackers, u, v in frameSamples:
+        # projection setup - pick up the mesh at this frame
+        if intersector is not None:
+            intersector.update( f )
+        if not len(trackers):
+            yield f, trackers, ( ), ( ), ( ), None
+            continue
+
+        # move the samples onto the image plane all together
+        i = cameraTrack.index( f )
+        camPos = cameraTrack.position( i )
+        with trackerProfile.phase( 'projection' ):
+            xmin, xmax, ymin, ymax = cameraTrack.planeBounds( i, zmax )
+            xs, ys, zs = unprojectSamples( u, v, xmin, xmax, ymin, ymax, zmax, cameraTrack.matrix( i ), camPos )
+        if intersector is None:
+            yield f, trackers, xs, ys, zs, None
+            continue
+
+        # cast the rays from the camera through them all together
+        directions = [ ]
+        for k in range( len(trackers) ):
+            d = ( xs[k] - camPos[0], ys[k] - camPos[1], zs[k] - camPos[2] )
+            length = math.sqrt( d[0]*d[0] + d[1]*d[1] + d[2]*d[2] )
+            directions.append( ( float( d[0] / length ), float( d[1] / length ), float( d[2] / length ) ) )
+        with trackerProfile.phase( 'raycast' ):
+            hits = intersector.intersectMany( [ camPos ] * len(trackers), directions, [ rayHints.get( t ) for t in trackers ] )
+        trackerProfile.count( 'rays', len(trackers) )
+        for t, hit in zip( trackers, hits ):
+            if hit[0]:
+                rayHints[t] = hit[2]
+        yield f, trackers, xs, ys, zs, hits
+
+
+def frameChunks( items, nbrChunks ):
+    """ Splits a list into nbrChunks runs of consecutive items of about the same length, never empty ones """
+    nbrChunks = max( 1, min( nbrChunks, len(items) ) )
+    size, extra = divmod( len(items), nbrChunks )
+    chunks = [ ]
+    start = 0
+    for c in range( nbrChunks ):
+        end = start + size + ( 1 if c < extra else 0 )
+        chunks.append( items[start:end] )
+        start = end
+    return chunks
+
+
+class RayChunk(object):
+    """
+        The samples of a run of frames sent to a worker process, and the
+        projection results coming back, as flat columns:
+            frames - the frames of the run, samples or not
+            frameStarts - the samples of frames[i] are frameStarts[i]:frameStarts[i+1]
+            trackers, u, v - the samples
+            xs, ys, zs - where the samples are on the image plane
+            hits - 1 when the ray of the sample hit the mesh, then
+            hitPositions - x, y, z of the hit
+            hitInfos - hitFace, hitTriangle, hitBary1, hitBary2 of the hit
+            frameCount, refitCount, stats - the intersector counts of the run
+    """
+
+    def __init__(self):
+        self.frames = array('l')
+        self.frameStarts = array('l', [ 0 ])
+        self.trackers = array('l')
+        self.u = array('d')
+        self.v = array('d')
+        self.xs = array('d')
+        self.ys = array('d')
+        self.zs = array('d')
+        self.hits = array('b')
+        self.hitPositions = array('d')
+        self.hitInfos = array('d')
+        self.frameCount = 0
+        self.refitCount = 0
+        self.stats = { }
+
+    def addFrame(self, frame, trackers, u, v):
+        self.frames.append( frame )
+        self.trackers.extend( trackers )
+        self.u.extend( u )
+        self.v.extend( v )
+        self.frameStarts.append( len(self.trackers) )
+
+    def frameSamples(self):
+        """ The samples as projectFrames takes them """
+        for i, f in enumerate( self.frames ):
+            start, end = self.frameStarts[i], self.frameStarts[i+1]
+            yield f, self.trackers[start:end], self.u[start:end], self.v[start:end]
+
+    def addResults(self, xs, ys, zs, hits):
+        """ Appends the projectFrames results of a frame """
+        self.xs.extend( float(x) for x in xs )
+        self.ys.extend( float(y) for y in ys )
+        self.zs.extend( float(z) for z in zs )
+        for hit, hitPos, hitInfo in hits or ( ):
+            self.hits.append( 1 if hit else 0 )
+            self.hitPositions.extend( hitPos )
+            self.hitInfos.extend( hitInfo )
+
+    def projectedFrames(self):
+        """ The results as projectFrames yields them """
+        for i, f in enumerate( self.frames ):
+            start, end = self.frameStarts[i], self.frameStarts[i+1]
+            hits = [ ]
+            for s in range( start, end ):
+                if self.hits[s]:
+                    hitInfo = self.hitInfos[s*4:s*4+4]
+                    hits.append( ( True, tuple( self.hitPositions[s*3:s*3+3] ),
+                                   ( int(hitInfo[0]), int(hitInfo[1]), hitInfo[2], hitInfo[3] ) ) )
+                else:
+                    hits.append( MISS )
+            yield f, self.trackers[start:end], self.xs[start:end], self.ys[start:end], self.zs[start:end], hits
+
+
+def projectChunk( job ):
+    """ projectFrames on a RayChunk against a mesh point cache, run in the worker processes """
+    chunk, cameraTrack, zmax, cachePath, bvh = job
+    intersector = CachedMeshIntersector( PointCache( cachePath ), bvh=bvh )
+    try:
+        for f, trackers, xs, ys, zs, hits in projectFrames( cameraTrack, zmax, chunk.frameSamples(), intersector ):
+            chunk.addResults( xs, ys, zs, hits )
+    finally:
+        intersector.cache.close()
+    chunk.frameCount = intersector.frameCount
+    chunk.refitCount = intersector.refitCount
+    chunk.stats = intersector.bvh.stats
+    chunk.u = chunk.v = None # no need to send them back
+    return chunk
+
+
+def projectFramesInPool( cameraTrack, zmax, frameSamples, intersector, processes=None ):
+    """
+        projectFrames with a CachedMeshIntersector, split over a process
+        pool: the frames are cut into one run per process, each run is
+        projected in a worker against the point cache, starting from the
+        TriangleBVH of the first frame built here. A run has no hint for
+        the first ray of each tracker, the hits are the same otherwise.
+        Yields the same as projectFrames in frame order, a run as soon
+        as it and the ones before it are done. The counts of the workers
+        are added to the intersector, the stick to last hit carry over
+        from one run to the next is left to the caller, going through the
+        frames in order.
+            processes - size of the pool, by default one per cpu
+        The frames are projected in this process when workers cannot be
+        started safely (see trackerData.poolContext).
+    """
+    frameSamples = list( frameSamples )
+    if not frameSamples:
+        return
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if poolContext() is None:
+        # no safe way to start workers here, see trackerData.poolContext
+        for projected in projectFrames( cameraTrack, zmax, frameSamples, intersector ):
+            yield projected
+        return
+    chunks = [ ]
+    for samples in frameChunks( frameSamples, processes ):
+        chunk = RayChunk()
+        for f, trackers, u, v in samples:
+            chunk.addFrame( f, trackers, u, v )
+        chunks.append( chunk )
+
+    # the workers refit the bvh of the first frame instead of building their own
+    intersector.fit( frameSamples[0][0] )
+    jobs = [ ( chunk, cameraTrack, zmax, intersector.cache.path, intersector.bvh ) for chunk in chunks ]
+
+    pool = processPool( len(jobs) )
+    try:
+        results = pool.imap( projectChunk, jobs )
+        for j in range( len(jobs) ):
+            with trackerProfile.phase( 'raycast' ):
+                chunk = next( results )
+                intersector.frameCount += chunk.frameCount
+                intersector.refitCount += chunk.refitCount
+                for name, value in chunk.stats.items():
+                    intersector.bvh.countStat( name, value )
+            trackerProfile.count( 'rays', len(chunk.trackers) )
+            for projected in chunk.projectedFrames():
+                yield projected
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,181 @@
+#
+# Synthetic tracking data for the tracker import benchmarks.
+#
+# Makes up trackers drifting slowly across the plate, like 2D tracks do,
+# with a choice of gap patterns, and writes them in the five file formats
+# the importer reads:
+#
+#   python trackerSynthetic.py /tmp/tracks --trackers 500 --frames 2000 --gaps spans
+#
+# Gap patterns:
+#   none   - every tracker has a sample on every frame
+#   random - samples dropped at random, one out of ten
+#   spans  - every tracker lives on a single span of frames, coming in
+#            and out of the plate
+#   holes  - trackers cover the whole range but lose a few runs of frames
+#            (occlusions)
+#
+# This module does not import maya.
+
+import argparse
+import os
+import random
+
+from trackerData import TrackingData, FORMAT_NUKE, FORMAT_BOUJOU, FORMAT_SYNTHEYES, FORMAT_3DE, FORMAT_PFTRACK, FORMAT_NAMES
+
+GAP_PATTERNS = ( 'none', 'random', 'spans', 'holes' )
+
+FORMATS = ( FORMAT_PFTRACK, FORMAT_NUKE, FORMAT_SYNTHEYES, FORMAT_3DE, FORMAT_BOUJOU )
+
+# file names of writeSyntheticFiles
+FILE_NAMES = {
+    FORMAT_PFTRACK: 'synthetic_pftrack.txt',
+    FORMAT_NUKE: 'synthetic_nuke.txt',
+    FORMAT_SYNTHEYES: 'synthetic_syntheyes.txt',
+    FORMAT_3DE: 'synthetic_3de.txt',
+    FORMAT_BOUJOU: 'synthetic_boujou.txt',
+}
+
+# fraction of the samples dropped by the random pattern
+RANDOM_GAP_RATE = 0.1
+# u, v stay inside of this, away from the plate edges
+PLATE_LIMIT = 0.95
+
+
+def trackerFrames( r, firstFrame, lastFrame, gaps ):
+    """ The frames a tracker has samples on for a gap pattern, never empty """
+    frames = list( range( firstFrame, lastFrame+1 ) )
+    if gaps == 'random':
+        frames = [ f for f in frames if r.random() >= RANDOM_GAP_RATE ] or frames[:1]
+    elif gaps == 'spans':
+        length = max( 1, int( len(frames) * r.uniform( 0.1, 1.0 ) ) )
+        start = r.randint( 0, len(frames) - length )
+        frames = frames[start:start+length]
+    elif gaps == 'holes':
+        hidden = set()
+        for h in range( r.randint( 1, 4 ) ):
+            start = r.randint( 0, len(frames) - 1 )
+            hidden.update( range( start, start + r.randint( 1, max( 1, len(frames) // 20 ) ) ) )
+        frames = [ f for i, f in enumerate( frames ) if i not in hidden ] or frames[:1]
+    elif gaps != 'none':
+        raise ValueError('Unknown gap pattern {}, expected one of {}'.format( gaps, ', '.join( GAP_PATTERNS ) ))
+    return frames
+
+
+def syntheticTrackingData( nbrTrackers, nbrFrames, gaps='none', firstFrame=1, seed=0 ):
+    """
+        Returns TrackingData of trackers named Tracker0, Tracker1... moving
+        a few pixels per frame over an HD plate, with a random quality,
+        sampled on the frames of a gap pattern.
+    """
+    r = random.Random( seed )
+    lastFrame = firstFrame + nbrFrames - 1
+    trackingData = TrackingData()
+    for t in range( nbrTrackers ):
+        trackingData.addTracker( 'Tracker%d' % t )
+        u, v = r.uniform( -0.8, 0.8 ), r.uniform( -0.8, 0.8 )
+        du, dv = r.uniform( -0.002, 0.002 ), r.uniform( -0.002, 0.002 )
+        quality = r.uniform( 0.5, 1.0 )
+        frames = set( trackerFrames( r, firstFrame, lastFrame, gaps ) )
+        for f in range( firstFrame, lastFrame+1 ):
+            # bounce off the plate limits so the trackers stay on the plate
+            if abs( u + du ) > PLATE_LIMIT:
+                du = -du
+            if abs( v + dv ) > PLATE_LIMIT:
+                dv = -dv
+            u += du + r.gauss( 0.0, 0.0002 )
+            v += dv + r.gauss( 0.0, 0.0002 )
+            if f in frames:
+                trackingData.addSample( f, u, v, quality )
+    return trackingData
+
+
+def centeredToPixel( value, resolution ):
+    """ Inverse of trackerData.pixelToCentered """
+    return ( value + 1.0 ) * 0.5 * resolution
+
+
+def writeTrackingFile( trackingData, path, format, plateResX=1920, plateResY=1080 ):
+    """
+        Writes tracking data in one of the FORMAT_* file formats, so that
+        the trackerData loader of the format reads it back. Nuke files
+        hold a single tracker with one line per frame, only the first
+        tracker is written and its gaps are closed up.
+    """
+    with open( path, 'w' ) as f:
+        if format == FORMAT_PFTRACK:
+            f.write( '# synthetic PFTrack 2D tracks\n\n' )
+            for t, name in enumerate( trackingData.names ):
+                start, end = trackingData.sampleRange( t )
+                f.write( '"%s"\n1\n%d\n' % ( name, end - start ) )
+                for s in range( start, end ):
+                    f.write( '%d %.4f %.4f %.6f\n' % ( trackingData.frames[s],
+                                                      centeredToPixel( trackingData.u[s], plateResX ),
+                                                      centeredToPixel( -trackingData.v[s], plateResY ),
+                                                      trackingData.quality[s] ) )
+                f.write( '\n' )
+
+        elif format == FORMAT_NUKE:
+            start, end = trackingData.sampleRange( 0 ) if len(trackingData) else ( 0, 0 )
+            for s in range( start, end ):
+                f.write( '%.4f %.4f\n' % ( centeredToPixel( trackingData.u[s], plateResX ),
+                                           centeredToPixel( -trackingData.v[s], plateResY ) ) )
+
+        elif format == FORMAT_SYNTHEYES:
+            for t, name in enumerate( trackingData.names ):
+                start, end = trackingData.sampleRange( t )
+                for s in range( start, end ):
+                    f.write( '%s %d %.6f %.6f %.6f\n' % ( name, trackingData.frames[s],
+                                                         trackingData.u[s], trackingData.v[s], trackingData.quality[s] ) )
+
+        elif format == FORMAT_3DE:
+            f.write( '%d\n' % len(trackingData) )
+            for t, name in enumerate( trackingData.names ):
+                start, end = trackingData.sampleRange( t )
+                f.write( '%s\n0\n%d\n' % ( name, end - start ) )
+                for s in range( start, end ):
+                    f.write( '%d %.4f %.4f\n' % ( trackingData.frames[s],
+                                                  centeredToPixel( trackingData.u[s], plateResX ),
+                                                  plateResY - centeredToPixel( trackingData.v[s], plateResY ) ) )
+
+        elif format == FORMAT_BOUJOU:
+            f.write( '# synthetic boujou tracks\n' )
+            for t, name in enumerate( trackingData.names ):
+                start, end = trackingData.sampleRange( t )
+                for s in range( start, end ):
+                    f.write( '%s %d %.4f %.4f\n' % ( name, trackingData.frames[s],
+                                                     centeredToPixel( trackingData.u[s], plateResX ),
+                                                     centeredToPixel( trackingData.v[s], plateResY ) ) )
+
+        else:
+            raise ValueError('Unknown tracking file format {}'.format(format))
+
+
+def writeSyntheticFiles( directory, trackingData, formats=FORMATS, plateResX=1920, plateResY=1080 ):
+    """ Writes tracking data in several formats to a directory, returns the path of each format """
+    if not os.path.isdir( directory ):
+        os.makedirs( directory )
+    paths = { }
+    for format in formats:
+        paths[format] = os.path.join( directory, FILE_NAMES[format] )
+        writeTrackingFile( trackingData, paths[format], format, plateResX, plateResY )
+    return paths
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description='Writes synthetic tracking files in every format' )
+    parser.add_argument( 'directory' )
+    parser.add_argument( '--trackers', type=int, default=100 )
+    parser.add_argument( '--frames', type=int, default=200 )
+    parser.add_argument( '--gaps', choices=GAP_PATTERNS, default='none' )
+    parser.add_argument( '--seed', type=int, default=0 )
+    args = parser.parse_args( argv )
+
+    trackingData = syntheticTrackingData( args.trackers, args.frames, args.gaps, seed=args.seed )
+    paths = writeSyntheticFiles( args.directory, trackingData )
+    for format in FORMATS:
+        print( '%-10s %s' % ( FORMAT_NAMES[format], paths[format] ) )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#
+# Puts API modifier work on the Maya undo queue.
+#
+# Changes made through an MDGModifier/MDagModifier from a script are not
+# undoable, only commands are. This module is also a tiny plugin that
+# registers the trackerImportUndo command: commit() hands the modifier to
+# the command, so undo/redo in Maya call the modifier's undoIt/doIt.
+#
+#   modifier.doIt()
+#   trackerUndo.commit( modifier )
+#
+
+import os
+
+import maya.api.OpenMaya as api
+import maya.cmds as mc
+
+COMMAND_NAME = 'trackerImportUndo'
+
+# Use the Maya Python API 2.0 for the plugin
+maya_useNewAPI = True
+
+# Modifiers waiting for the command to pick them up. Maya loads the plugin
+# as a module of its own, the command reads the list of the regular import.
+_pending = [ ]
+
+
+def commit( modifier ):
+    """ Registers an executed modifier as one step of the Maya undo queue """
+    pluginPath = os.path.splitext( os.path.abspath( __file__ ) )[0] + '.py'
+    if not mc.pluginInfo( pluginPath, q=True, loaded=True ):
+        mc.loadPlugin( pluginPath, quiet=True )
+    _pending.append( modifier )
+    getattr( mc, COMMAND_NAME )()
+
+
+class TrackerImportUndoCommand( api.MPxCommand ):
+
+    def __init__(self):
+        api.MPxCommand.__init__(self)
+        self.modifier = None
+
+    def doIt(self, args):
+        import trackerUndo
+        self.modifier = trackerUndo._pending.pop()
+
+    def redoIt(self):
+        self.modifier.doIt()
+
+    def undoIt(self):
+        self.modifier.undoIt()
+
+    def isUndoable(self):
+        return True
+
+    @staticmethod
+    def creator():
+        return TrackerImportUndoCommand()
+
+
+def initializePlugin( plugin ):
+    api.MFnPlugin( plugin ).registerCommand( COMMAND_NAME, TrackerImportUndoCommand.creator )
+
+
+def uninitializePlugin( plugin ):
+    api.MFnPlugin( plugin ).deregisterCommand( COMMAND_NAME )